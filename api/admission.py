@@ -0,0 +1,265 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import suppress
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import Settings
+from monitoring.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED, route_template
+
+_READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Never shed: load balancers and scrapers must see the service under load.
+EXEMPT_PATHS = ("/health", "/metrics", "/cache/stats")
+
+# Long-lived streams, limited by ANSWER_FEED_MAX_SUBSCRIBERS once started.
+STREAM_ROUTES = ("GET /question/{id}/stream",)
+
+
+class ConcurrencyLimit:
+    """At most limit holders at a time, with at most max_queue callers
+    waiting for a turn in arrival order.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_use = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """Take a slot, waiting up to timeout seconds. Returns None once
+        acquired, or why not: "queue_full" or "timeout".
+        """
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return None
+        if len(self._waiters) >= self.max_queue or timeout <= 0:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            with suppress(ValueError):
+                self._waiters.remove(waiter)
+            return "timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller went away.
+                self.release()
+            else:
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+            raise
+        return None
+
+    def release(self) -> None:
+        # The slot passes straight to the next waiter, if any.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_use -= 1
+
+
+class TokenBuckets:
+    """Per-client token buckets holding up to burst tokens and refilled at
+    rate tokens per second. Only the max_clients most recently seen clients
+    are remembered; a forgotten client starts again with a full bucket.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_clients: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """Take a token for client. Returns 0 if there was one, otherwise the
+        seconds until there will be.
+        """
+        now = self._clock()
+        tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionControl:
+    """ASGI middleware shedding load before it queues on the database pool.
+
+    Reads and writes have separate concurrency limits, so a flood of writes
+    cannot take the slots GET /question/{id} needs and the other way round.
+    A request over its limit waits in a bounded queue for up to
+    queue_timeout seconds; when the queue is full or the wait runs out it is
+    answered at once with 503 and Retry-After instead of waiting
+    DB_POOL_TIMEOUT for a connection. With a token bucket rate limit, a
+    client over its rate gets 429 before taking a slot.
+
+    A request holds its slot until the response body has been sent, so the
+    database work of streamed responses, such as the export, counts against
+    the limit. Routes in stream_routes serve streams a client may listen to
+    for hours: they hold their slot only until the first chunk of the body,
+    which comes after the reads that start the stream, and are bounded by
+    their own subscriber limit instead.
+
+    Limits are per worker. Paths in exempt_paths (health checks, metrics)
+    are never limited.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        read_limit: Optional[ConcurrencyLimit],
+        write_limit: Optional[ConcurrencyLimit],
+        queue_timeout: float,
+        retry_after: int,
+        rate_limit: Optional[TokenBuckets] = None,
+        rate_limit_key: str = "ip",
+        exempt_paths: Iterable[str] = (),
+        stream_routes: Iterable[str] = (),
+    ):
+        self.app = app
+        self.limits: Dict[str, Optional[ConcurrencyLimit]] = {
+            "read": read_limit,
+            "write": write_limit,
+        }
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.rate_limit_key = rate_limit_key
+        self.exempt_paths = frozenset(exempt_paths)
+        self.stream_routes = frozenset(stream_routes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        route_class = "read" if request.method in _READ_METHODS else "write"
+
+        if self.rate_limit is not None:
+            wait = self.rate_limit.take(self._client(request))
+            if wait > 0:
+                ADMISSION_REJECTED.labels(route_class, "rate_limited").inc()
+                response = _reject(429, "Too many requests", math.ceil(wait))
+                await response(scope, receive, send)
+                return
+
+        limit = self.limits[route_class]
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        refused = await limit.acquire(self.queue_timeout)
+        ADMISSION_QUEUE_WAIT.labels(route_class).observe(time.perf_counter() - start)
+        if refused is not None:
+            ADMISSION_REJECTED.labels(route_class, refused).inc()
+            response = _reject(503, "Server is busy", self.retry_after)
+            await response(scope, receive, send)
+            return
+
+        held = True
+
+        def release() -> None:
+            nonlocal held
+            if held:
+                held = False
+                limit.release()
+
+        stream = f"{request.method} {route_template(scope)}" in self.stream_routes
+
+        async def send_response(message: Message) -> None:
+            await send(message)
+            if stream and message["type"] == "http.response.body":
+                release()
+
+        try:
+            await self.app(scope, receive, send_response)
+        finally:
+            release()
+
+    def _client(self, request: Request) -> str:
+        if self.rate_limit_key == "user_id":
+            user_id = request.query_params.get("user_id")
+            if user_id:
+                return f"user:{user_id}"
+        return f"ip:{request.client.host if request.client else ''}"
+
+
+def _reject(status_code: int, detail: str, retry_after: int) -> Response:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(retry_after, 1))},
+    )
+
+
+def admission_control_options(settings: Settings) -> Optional[Dict[str, Any]]:
+    """Options for the AdmissionControl middleware configured by the
+    ADMISSION_* settings, or None if it is not needed.
+    """
+    rate_limited = settings.ADMISSION_RATE_LIMIT_PER_SECOND > 0
+    if not settings.ADMISSION_ENABLED and not rate_limited:
+        return None
+
+    read_limit = write_limit = None
+    if settings.ADMISSION_ENABLED:
+        # Requests beyond the connections the pool can hand out would only
+        # wait for one, so the pool size is the natural limit.
+        connections = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        writes = settings.ADMISSION_WRITE_CONCURRENCY or max(
+            math.ceil(connections * settings.ADMISSION_WRITE_SHARE), 1
+        )
+        reads = settings.ADMISSION_READ_CONCURRENCY or max(connections - writes, 1)
+        read_limit = ConcurrencyLimit(reads, settings.ADMISSION_MAX_QUEUE or reads)
+        write_limit = ConcurrencyLimit(writes, settings.ADMISSION_MAX_QUEUE or writes)
+
+    rate_limit = None
+    if rate_limited:
+        rate_limit = TokenBuckets(
+            rate=settings.ADMISSION_RATE_LIMIT_PER_SECOND,
+            burst=settings.ADMISSION_RATE_LIMIT_BURST,
+            max_clients=settings.ADMISSION_RATE_LIMIT_MAX_CLIENTS,
+        )
+
+    return dict(
+        read_limit=read_limit,
+        write_limit=write_limit,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+        rate_limit=rate_limit,
+        rate_limit_key=settings.ADMISSION_RATE_LIMIT_KEY,
+        exempt_paths=EXEMPT_PATHS,
+        stream_routes=STREAM_ROUTES,
+    )
@@ -1,26 +1,34 @@
-from typing import Optional
-
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.connection import get_db
+from api.conditional import is_not_modified, json_response, make_etag, not_modified
+from database.connection import get_db, get_read_db, reads_from_primary
 from database.storage import Storage
 from models.qa import Answer
 
 router = APIRouter(prefix="/answers", tags=["answers"])
 
 
-def get_storage(db: AsyncSession = Depends(get_db)) -> Storage:
-    return Storage(db)
+def get_storage(request: Request, db: AsyncSession = Depends(get_db)) -> Storage:
+    return Storage(db, cache=request.app.state.cache, flights=request.app.state.flights)
+
+
+def get_read_storage(
+    request: Request, db: AsyncSession = Depends(get_read_db)
+) -> Storage:
+    # The cache may hold what a lagging replica returned after this client's
+    # write was invalidated, so a client pinned to the primary skips it.
+    cache = None if reads_from_primary(request) else request.app.state.cache
+    return Storage(db, cache=cache, flights=request.app.state.flights)
 
 
 @router.get("/{id}", response_model=Answer)
 async def get_exact_answer(
-    id: int, storage: Storage = Depends(get_storage)
-) -> Optional[Answer]:
+    id: int, request: Request, storage: Storage = Depends(get_read_storage)
+):
     try:
-        answer: Optional[Answer] = await storage.get_answer_by_id(id)
+        answer = await storage.get_answer_by_id_json(id)
     except Exception as e:
         logger.error(f"Failed to get answer: {e}")
         raise HTTPException(status_code=500, detail="Failed to get answer")
@@ -28,7 +36,12 @@ async def get_exact_answer(
     if not answer:
         raise HTTPException(status_code=404, detail="Answer not found")
 
-    return answer
+    version, body = answer
+    etag = make_etag(version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    return json_response(body, etag)
 
 
 @router.delete("/{id}", status_code=204)
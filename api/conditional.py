@@ -0,0 +1,46 @@
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from config import settings
+
+
+def make_etag(version: str) -> str:
+    """Strong ETag for a representation version."""
+    return f'"{version}"'
+
+
+def make_body_etag(body: bytes) -> str:
+    """Strong ETag derived from the response bytes themselves."""
+    return make_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names etag."""
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison function.
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"max-age={settings.HTTP_CACHE_MAX_AGE}, must-revalidate",
+    }
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def json_response(body: bytes, etag: str) -> Response:
+    return Response(
+        content=body, media_type="application/json", headers=cache_headers(etag)
+    )
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from loguru import logger
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database.deadline import reset_deadline, set_deadline
+from monitoring.metrics import route_template
+
+# Seconds the client is prepared to wait, overriding the route's default.
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# Status recorded for requests whose client went away, as nginx does.
+CLIENT_CLOSED_REQUEST = 499
+
+# Postgres cancels statements at the deadline; the handler is only cancelled
+# this much later, so that a query in flight ends cleanly on the server side.
+_CANCEL_GRACE_SECONDS = 0.1
+
+
+class RequestDeadlines:
+    """ASGI middleware bounding how long a request may run.
+
+    Each request gets a deadline from its route's default, or from the
+    X-Request-Timeout header, capped at max_timeout. Sessions from get_db and
+    get_read_db turn the time left into SET LOCAL statement_timeout, so
+    Postgres cancels queries that would overrun it. The handler itself is
+    cancelled when the deadline passes or the client disconnects, which
+    releases its pooled connection instead of finishing work nobody waits
+    for. A request that fails or is cancelled after its deadline is answered
+    with 504.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_timeout: float,
+        route_timeouts: Dict[str, float],
+        max_timeout: float,
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.route_timeouts = route_timeouts
+        self.max_timeout = max_timeout
+
+    def timeout(self, scope: Scope) -> Optional[float]:
+        """Seconds the request may take, or None if it is not limited."""
+        timeout = self.route_timeouts.get(
+            f"{scope['method']} {route_template(scope)}", self.default_timeout
+        )
+        requested = Headers(scope=scope).get(DEADLINE_HEADER)
+        if requested:
+            try:
+                seconds = float(requested)
+            except ValueError:
+                seconds = 0
+            if seconds > 0:
+                timeout = min(seconds, self.max_timeout)
+        return timeout or None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = self.timeout(scope)
+        deadline = time.monotonic() + timeout if timeout else None
+        started = completed = replaced = disconnected = False
+
+        async def send_response(message: Message) -> None:
+            nonlocal started, completed, replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                if message["status"] >= 500 and _passed(deadline):
+                    # Most likely the statement timeout, caught by the handler.
+                    replaced = True
+                    await _send_timeout(send)
+                    return
+                started = True
+            elif message["type"] == "http.response.body":
+                completed = not message.get("more_body", False)
+            await send(message)
+
+        messages: "asyncio.Queue[Message]" = asyncio.Queue()
+
+        async def watch_disconnect() -> None:
+            # Forwards the request body to the handler, then keeps reading
+            # so that a disconnect is noticed while the handler runs.
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not completed:
+                        disconnected = True
+                        handler.cancel()
+                    return
+
+        token = set_deadline(deadline)
+        try:
+            handler = asyncio.ensure_future(
+                self.app(scope, messages.get, send_response)
+            )
+        finally:
+            reset_deadline(token)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            wait = None if timeout is None else timeout + _CANCEL_GRACE_SECONDS
+            await asyncio.wait({handler}, timeout=wait)
+            if not handler.done():
+                handler.cancel()
+                await asyncio.wait({handler})
+        finally:
+            watcher.cancel()
+            handler.cancel()
+
+        method, path = scope["method"], scope["path"]
+        if disconnected:
+            logger.info(f"Client disconnected, cancelled {method} {path}")
+            if not started and not replaced:
+                await send_response(_client_closed())
+                await send_response({"type": "http.response.body", "body": b""})
+            return
+
+        if not replaced:
+            if not handler.cancelled() and handler.exception() is None:
+                return
+            if not _passed(deadline):
+                handler.result()  # Not ours to handle: re-raises the error.
+
+        logger.warning(f"Deadline of {timeout:.2f}s exceeded: {method} {path}")
+        if not started and not replaced:
+            await _send_timeout(send)
+
+
+def _passed(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _client_closed() -> Message:
+    return {
+        "type": "http.response.start",
+        "status": CLIENT_CLOSED_REQUEST,
+        "headers": [],
+    }
+
+
+async def _send_timeout(send: Send) -> None:
+    body = json.dumps({"detail": "Request deadline exceeded"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,34 @@
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from config import settings
+from database.connection import get_read_db_context
+from database.storage import Storage
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+async def _question_lines(batch_size: int) -> AsyncIterator[str]:
+    # The response body is produced after the endpoint returns, so the
+    # session has to live inside the generator rather than come from a
+    # dependency.
+    try:
+        async with get_read_db_context() as session:
+            storage = Storage(session)
+            async for question in storage.stream_questions_with_answers(batch_size):
+                yield question.model_dump_json() + "\n"
+    except Exception as e:
+        logger.error(f"Failed to export questions: {e}")
+        raise
+
+
+@router.get("/questions.ndjson")
+async def export_questions(
+    batch_size: int = Query(settings.EXPORT_BATCH_SIZE, ge=1, le=100_000),
+) -> StreamingResponse:
+    return StreamingResponse(
+        _question_lines(batch_size), media_type="application/x-ndjson"
+    )
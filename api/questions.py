@@ -1,18 +1,133 @@
-from typing import Optional
+import json
+from typing import Any, List, Literal, Optional, Tuple, Type, TypeVar
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from loguru import logger
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.connection import get_db
+from api.conditional import (
+    is_not_modified,
+    json_response,
+    make_body_etag,
+    make_etag,
+    not_modified,
+)
+from config import settings
+from database.connection import get_db, get_read_db, reads_from_primary
+from database.feed import AnswerFeed
+from database.group_commit import AnswerBatcher
+from database.projection import (
+    ANSWER_FIELDS,
+    QUESTION_DETAIL_FIELDS,
+    QUESTION_FIELDS,
+    parse_fields,
+)
 from database.storage import Storage
-from models.qa import Answer, Question, QuestionWithAnswers
+from models.qa import (
+    Answer,
+    AnswerBulkResult,
+    AnswerCreate,
+    BulkItemError,
+    Question,
+    QuestionBatch,
+    QuestionBulkResult,
+    QuestionCreate,
+    QuestionWithAnswers,
+)
+
+ItemT = TypeVar("ItemT", bound=BaseModel)
 
 router = APIRouter(prefix="/question", tags=["question"])
 
 
-def get_storage(db: AsyncSession = Depends(get_db)) -> Storage:
-    return Storage(db)
+def get_storage(request: Request, db: AsyncSession = Depends(get_db)) -> Storage:
+    return Storage(db, cache=request.app.state.cache, flights=request.app.state.flights)
+
+
+def get_read_storage(
+    request: Request, db: AsyncSession = Depends(get_read_db)
+) -> Storage:
+    # The cache may hold what a lagging replica returned after this client's
+    # write was invalidated, so a client pinned to the primary skips it.
+    cache = None if reads_from_primary(request) else request.app.state.cache
+    return Storage(db, cache=cache, flights=request.app.state.flights)
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        (
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+            if err["loc"]
+            else err["msg"]
+        )
+        for err in e.errors()
+    )
+
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+    """The request body, refused with 413 as soon as it is known to exceed
+    max_bytes: from Content-Length, or else once that much has been read.
+    """
+    too_large = HTTPException(
+        status_code=413, detail=f"Body is larger than {max_bytes} bytes"
+    )
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _read_bulk_items(
+    request: Request, model: Type[ItemT]
+) -> Tuple[List[ItemT], List[BulkItemError]]:
+    """Parse a JSON array or NDJSON body into validated items.
+
+    Returns the valid items and an error, keyed by position in the body, for
+    every item that failed to parse or validate. Bodies over
+    BULK_MAX_BODY_BYTES or BULK_MAX_ITEMS items are refused with 413.
+    """
+    body = await _read_body(request, settings.BULK_MAX_BODY_BYTES)
+    raw_items: List[Any]
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        raw_items = [line for line in body.splitlines() if line.strip()]
+    else:
+        try:
+            raw_items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        if not isinstance(raw_items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array")
+    if len(raw_items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.BULK_MAX_ITEMS} items per request",
+        )
+
+    items: List[ItemT] = []
+    errors: List[BulkItemError] = []
+    for index, raw in enumerate(raw_items):
+        try:
+            if isinstance(raw, bytes):
+                item = model.model_validate_json(raw)
+            else:
+                item = model.model_validate(raw)
+        except ValidationError as e:
+            errors.append(BulkItemError(index=index, error=_format_validation_error(e)))
+            continue
+        items.append(item)
+
+    return items, errors
 
 
 @router.post("/", response_model=Question)
@@ -26,23 +141,135 @@ async def create_question(text: str, storage: Storage = Depends(get_storage)):
     return created_question
 
 
+@router.post("/bulk", response_model=QuestionBulkResult)
+async def create_questions_bulk(
+    request: Request, storage: Storage = Depends(get_storage)
+):
+    questions, errors = await _read_bulk_items(request, QuestionCreate)
+
+    try:
+        created = await storage.create_questions(questions)
+    except Exception as e:
+        logger.error(f"Failed to bulk create questions: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create questions")
+
+    return QuestionBulkResult(created=created, errors=errors)
+
+
 @router.get("/", response_model=list[Question])
 async def get_questions(
-    limit: Optional[int] = None, storage: Storage = Depends(get_storage)
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=settings.QUESTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["created", "activity", "answers"] = "created",
+    with_total: bool = False,
+    fields: Optional[str] = None,
+    preview_chars: Optional[int] = Query(None, ge=1),
+    storage: Storage = Depends(get_read_storage),
 ):
     try:
-        all_questions = await storage.get_questions(limit=limit)
+        body, next_cursor = await storage.get_questions_json(
+            limit=limit,
+            cursor=cursor,
+            sort=sort,
+            fields=parse_fields(fields, QUESTION_FIELDS),
+            preview_chars=preview_chars,
+        )
+        total_estimate = (
+            await storage.estimate_questions_count() if with_total else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Failed to create question: {e}")
+        logger.error(f"Failed to get questions: {e}")
         raise HTTPException(status_code=500, detail="Failed to get questions")
 
-    return all_questions
+    etag = make_body_etag(body + (next_cursor or "").encode())
+    if is_not_modified(request, etag):
+        response = not_modified(etag)
+    else:
+        response = json_response(body, etag)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if total_estimate is not None:
+        response.headers["X-Total-Count-Estimate"] = str(total_estimate)
+
+    return response
+
+
+def _parse_ids(ids: str) -> List[int]:
+    try:
+        parsed = [int(id) for id in ids.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="ids must be comma-separated integers"
+        )
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(parsed) > settings.BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_MAX_IDS} ids per request",
+        )
+    return parsed
+
+
+# Declared before /{id}, which would otherwise match "batch".
+@router.get("/batch", response_model=QuestionBatch)
+async def get_question_answers_batch(
+    request: Request,
+    ids: str,
+    answers_limit: Optional[int] = Query(
+        None, ge=1, le=settings.BATCH_ANSWERS_MAX_PAGE_SIZE
+    ),
+    storage: Storage = Depends(get_read_storage),
+):
+    question_ids = _parse_ids(ids)
+
+    try:
+        body = await storage.get_question_answers_batch_json(
+            question_ids, answers_limit=answers_limit
+        )
+    except Exception as e:
+        logger.error(f"Failed to get question batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get questions")
+
+    etag = make_body_etag(body)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    return json_response(body, etag)
 
 
 @router.get("/{id}", response_model=QuestionWithAnswers)
-async def get_question_answers(id: int, storage: Storage = Depends(get_storage)):
+async def get_question_answers(
+    id: int,
+    request: Request,
+    answers_limit: Optional[int] = Query(None, ge=1, le=settings.ANSWERS_MAX_PAGE_SIZE),
+    answers_cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    answer_fields: Optional[str] = None,
+    preview_chars: Optional[int] = Query(None, ge=1),
+    storage: Storage = Depends(get_read_storage),
+):
     try:
-        question_answers = await storage.get_question_answers(id)
+        projection = dict(
+            answers_limit=answers_limit,
+            answers_cursor=answers_cursor,
+            fields=parse_fields(fields, QUESTION_DETAIL_FIELDS),
+            answer_fields=parse_fields(answer_fields, ANSWER_FIELDS),
+            preview_chars=preview_chars,
+        )
+        if request.headers.get("if-none-match"):
+            # Revalidation only needs the question's version, not its answers.
+            version = await storage.get_question_answers_version(id, **projection)
+            if version is not None and is_not_modified(request, make_etag(version)):
+                return not_modified(make_etag(version))
+
+        question_answers = await storage.get_question_answers_json(id, **projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get question answers: {e}")
         raise HTTPException(status_code=500, detail="Failed to get question answers")
@@ -50,7 +277,54 @@ async def get_question_answers(id: int, storage: Storage = Depends(get_storage))
     if not question_answers:
         raise HTTPException(status_code=404, detail="Question not found")
 
-    return question_answers
+    version, body = question_answers
+    return json_response(body, make_etag(version))
+
+
+@router.get("/{id}/stream")
+async def stream_answers(
+    id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    storage: Storage = Depends(get_read_storage),
+):
+    """Server-sent events for answers created and deleted from now on, or
+    after the version in Last-Event-ID when resuming.
+    """
+    feed: Optional[AnswerFeed] = request.app.state.answer_feed
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Answer feed is disabled")
+    if feed.full:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many subscribers",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+
+    try:
+        version = await storage.get_question_version(id)
+        if version is not None:
+            await feed.start()
+    except Exception as e:
+        logger.error(f"Failed to subscribe to answers: {e}")
+        raise HTTPException(status_code=503, detail="Answer feed unavailable")
+
+    if version is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    last_version = None
+    if last_event_id:
+        try:
+            last_version = int(last_event_id)
+        except ValueError:
+            # Unknown position: resume from a snapshot.
+            last_version = 0
+
+    return StreamingResponse(
+        feed.stream(id, last_version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.delete("/{id}", status_code=204)
@@ -67,10 +341,17 @@ async def add_answer(
     id: int,
     text: str,
     user_id: str,
+    request: Request,
     storage: Storage = Depends(get_storage),
 ):
+    batcher: Optional[AnswerBatcher] = request.app.state.answer_batcher
     try:
-        answer = await storage.add_answer(question_id=id, text=text, user_id=user_id)
+        if batcher is not None:
+            answer = await batcher.add(question_id=id, user_id=user_id, text=text)
+        else:
+            answer = await storage.add_answer(
+                question_id=id, text=text, user_id=user_id
+            )
     except Exception as e:
         logger.error(f"Failed to add answer: {e}")
         raise HTTPException(status_code=500, detail="Failed to add answer")
@@ -79,3 +360,21 @@ async def add_answer(
         raise HTTPException(status_code=404, detail="Question not found")
 
     return answer
+
+
+@router.post("/{id}/answers/bulk", response_model=AnswerBulkResult)
+async def add_answers_bulk(
+    id: int, request: Request, storage: Storage = Depends(get_storage)
+):
+    answers, errors = await _read_bulk_items(request, AnswerCreate)
+
+    try:
+        created = await storage.add_answers(question_id=id, answers=answers)
+    except Exception as e:
+        logger.error(f"Failed to bulk add answers: {e}")
+        raise HTTPException(status_code=500, detail="Failed to add answers")
+
+    if created is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    return AnswerBulkResult(created=created, errors=errors)
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from loguru import logger
+
+from api.conditional import is_not_modified, json_response, make_body_etag, not_modified
+from api.questions import get_read_storage
+from config import settings
+from database.storage import Storage
+from models.qa import SearchResult
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+@router.get("", response_model=list[SearchResult])
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    include_answers: bool = False,
+    limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = None,
+    storage: Storage = Depends(get_read_storage),
+):
+    try:
+        body, next_cursor = await storage.search_json(
+            q, limit=limit, cursor=cursor, include_answers=include_answers
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to search: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search")
+
+    etag = make_body_etag(body + (next_cursor or "").encode())
+    if is_not_modified(request, etag):
+        response = not_modified(etag)
+    else:
+        response = json_response(body, etag)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return response
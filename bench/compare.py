@@ -0,0 +1,67 @@
+"""Compare two bench.load JSON reports scenario by scenario.
+
+Prints throughput and p50/p95/p99 latency of the candidate run next to the
+baseline, with the relative change.
+
+    python -m bench.compare baseline.json candidate.json
+"""
+
+import argparse
+import json
+from typing import Any, Dict, Optional
+
+
+def _change(baseline: Optional[float], candidate: Optional[float]) -> str:
+    if not baseline or candidate is None:
+        return "     -"
+    return f"{(candidate - baseline) / baseline * 100:+6.1f}%"
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(baseline_path: str, candidate_path: str) -> None:
+    baseline = _load(baseline_path)
+    candidate = _load(candidate_path)
+    print(
+        f"baseline  {baseline['meta'].get('commit')} "
+        f"({baseline['meta'].get('transport')})\n"
+        f"candidate {candidate['meta'].get('commit')} "
+        f"({candidate['meta'].get('transport')})\n"
+    )
+
+    for name, result in candidate["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            print(f"{name}: not in baseline")
+            continue
+
+        print(name)
+        rows = [("req/s", before["throughput_rps"], result["throughput_rps"])]
+        for key in ("p50", "p95", "p99"):
+            rows.append(
+                (
+                    f"{key} ms",
+                    before.get("latency_ms", {}).get(key),
+                    result.get("latency_ms", {}).get(key),
+                )
+            )
+        rows.append(
+            (
+                "sql/req",
+                before.get("statements_per_request", {}).get("mean"),
+                result.get("statements_per_request", {}).get("mean"),
+            )
+        )
+        for label, old, new in rows:
+            print(f"  {label:<8} {old!s:>10} -> {new!s:>10}  {_change(old, new)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    main(args.baseline, args.candidate)
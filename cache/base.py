@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional
+
+
+class CacheBackend(ABC):
+    """Byte-string store with per-entry TTL and tag-based invalidation."""
+
+    name: str
+
+    async def start(self) -> None:
+        """Open connections and background tasks, if the backend has any."""
+
+    async def close(self) -> None:
+        """Release everything acquired in start()."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    async def set(
+        self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()
+    ) -> None: ...
+
+    @abstractmethod
+    async def invalidate(self, tag: str) -> None:
+        """Drop every entry stored with the given tag, for all workers."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]: ...
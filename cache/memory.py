@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from cache.base import CacheBackend
+
+
+class MemoryCache(CacheBackend):
+    """Bounded in-process LRU cache of byte strings with a TTL.
+
+    Entries are evicted least-recently-used first once either max_entries or
+    max_bytes is exceeded. Every entry can carry tags so that all variants of
+    one resource can be dropped together with invalidate(). Each worker holds
+    its own copy, so invalidations are only seen by the worker making them.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+
+        self._entries: "OrderedDict[str, Tuple[bytes, float, Tuple[str, ...]]]" = (
+            OrderedDict()
+        )
+        self._tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.get_nowait(key)
+
+    async def set(
+        self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()
+    ) -> None:
+        self.set_nowait(key, value, ttl, tags)
+
+    async def invalidate(self, tag: str) -> None:
+        self.invalidate_nowait(tag)
+
+    def get_nowait(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set_nowait(
+        self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()
+    ) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if len(value) > self.max_bytes:
+            return
+
+        tags = tuple(tags)
+        self._entries[key] = (value, self._clock() + ttl, tags)
+        self._bytes += len(value)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_nowait(self, tag: str) -> None:
+        """Drop every entry stored with the given tag."""
+        for key in list(self._tags.get(tag, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Drop the given keys if present."""
+        for key in keys:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: str) -> None:
+        value, _, tags = self._entries.pop(key)
+        self._bytes -= len(value)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
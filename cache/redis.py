@@ -0,0 +1,162 @@
+import asyncio
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from cache.base import CacheBackend
+from cache.memory import MemoryCache
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by all workers through a Redis-protocol server.
+
+    Values live in Redis under "<prefix>:v:<key>", and every tag is a set of
+    the keys stored with it. An optional in-process MemoryCache sits in front
+    of Redis for the hottest keys; invalidate() publishes the dropped keys on
+    "<prefix>:invalidate" so every worker evicts them from its local copy. If
+    the subscription is lost, local entries are still bounded by local_ttl.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str,
+        local: Optional[MemoryCache] = None,
+        local_ttl: float = 0,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.local = local
+        self.local_ttl = local_ttl
+        self.channel = f"{prefix}:invalidate"
+
+        self._pubsub: Any = None
+        self._listener: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.broadcasts_received = 0
+
+    @classmethod
+    def from_url(
+        cls,
+        url: str,
+        prefix: str,
+        local: Optional[MemoryCache] = None,
+        local_ttl: float = 0,
+    ) -> "RedisCache":
+        import redis.asyncio
+
+        return cls(redis.asyncio.from_url(url), prefix, local, local_ttl)
+
+    async def start(self) -> None:
+        if self.local is None:
+            return
+
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await self.client.aclose()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self.local is not None:
+            value = self.local.get_nowait(key)
+            if value is not None:
+                self.local_hits += 1
+                return value
+
+        value = await self.client.get(self._value_key(key))
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self.local is not None:
+            self.local.set_nowait(key, value, self.local_ttl)
+        return value
+
+    async def set(
+        self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()
+    ) -> None:
+        ttl_ms = max(int(ttl * 1000), 1)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._value_key(key), value, px=ttl_ms)
+            for tag in tags:
+                # Entries share one TTL, so pushing the tag set's expiry out to
+                # the newest entry keeps it alive as long as any of its keys.
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.pexpire(self._tag_key(tag), ttl_ms)
+            await pipe.execute()
+
+        if self.local is not None:
+            self.local.set_nowait(key, value, min(ttl, self.local_ttl))
+
+    async def invalidate(self, tag: str) -> None:
+        tag_key = self._tag_key(tag)
+
+        async def drop(pipe: Any) -> List[str]:
+            keys = [
+                member.decode() if isinstance(member, bytes) else member
+                for member in await pipe.smembers(tag_key)
+            ]
+            pipe.multi()
+            if keys:
+                pipe.delete(*(self._value_key(key) for key in keys))
+            pipe.delete(tag_key)
+            if keys and self.local is not None:
+                pipe.publish(self.channel, json.dumps(keys))
+            return keys
+
+        # The tag set is WATCHed between reading and deleting it: if set()
+        # adds a key meanwhile, the transaction is dropped and run again, so
+        # no key is removed from the set while its value stays behind.
+        keys = await self.client.transaction(drop, tag_key, value_from_callable=True)
+
+        self.invalidations += 1
+        if self.local is not None:
+            self.local.discard(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "broadcasts_received": self.broadcasts_received,
+        }
+        if self.local is not None:
+            stats["local"] = self.local.stats()
+        return stats
+
+    async def _listen(self) -> None:
+        try:
+            async for message in self._pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                self.broadcasts_received += 1
+                self.local.discard(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation subscription lost: {e}")
+
+    def _value_key(self, key: str) -> str:
+        return f"{self.prefix}:v:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:t:{tag}"
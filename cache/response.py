@@ -0,0 +1,153 @@
+import math
+import random
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from loguru import logger
+
+from cache.base import CacheBackend
+from cache.memory import MemoryCache
+from config import Settings
+from monitoring.metrics import CACHE_ERRORS, CACHE_REQUESTS
+
+# expires_at (wall clock, shared across workers) and the seconds it took to
+# build the value, stored in front of every cached payload.
+_HEADER = struct.Struct("!dd")
+
+
+class ResponseCache:
+    """Read-through cache of serialized responses on top of a CacheBackend.
+
+    Entries are recomputed early with probability rising towards expiry
+    ("XFetch": recompute when now - delta * beta * ln(rand) >= expires_at,
+    delta being how long the value took to build). One request refreshes a
+    hot entry shortly before it expires instead of every request stampeding
+    the database the moment it does. beta = 0 disables early refresh.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: float,
+        beta: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.beta = beta
+        self._clock = clock
+
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        await self.backend.start()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[bytes]]],
+        tags: Union[Iterable[str], Callable[[], Iterable[str]]] = (),
+    ) -> Optional[bytes]:
+        """Return the cached value for key, or build and store it with loader.
+
+        A loader result of None is returned as-is and not cached. tags may be a
+        callable for tags that are only known once the value has been loaded.
+        Backend failures are logged and fall through to the loader.
+        """
+        try:
+            entry = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache get failed for {key}: {e}")
+            self.errors += 1
+            CACHE_ERRORS.inc()
+            entry = None
+
+        if entry is not None:
+            expires_at, delta = _HEADER.unpack_from(entry)
+            if not self._should_refresh(expires_at, delta):
+                self.hits += 1
+                CACHE_REQUESTS.labels("hit").inc()
+                return entry[_HEADER.size :]
+            self.early_refreshes += 1
+            CACHE_REQUESTS.labels("early_refresh").inc()
+        else:
+            self.misses += 1
+            CACHE_REQUESTS.labels("miss").inc()
+
+        start = self._clock()
+        value = await loader()
+        delta = self._clock() - start
+        if value is None:
+            return None
+
+        if callable(tags):
+            tags = tags()
+        header = _HEADER.pack(self._clock() + self.ttl, delta)
+        try:
+            await self.backend.set(key, header + value, self.ttl, tags)
+        except Exception as e:
+            logger.warning(f"Cache set failed for {key}: {e}")
+            self.errors += 1
+            CACHE_ERRORS.inc()
+        return value
+
+    async def invalidate(self, tag: str) -> None:
+        await self.backend.invalidate(tag)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "early_refreshes": self.early_refreshes,
+            "errors": self.errors,
+            "storage": self.backend.stats(),
+        }
+
+    def _should_refresh(self, expires_at: float, delta: float) -> bool:
+        if self.beta <= 0:
+            return False
+        # 1 - random() is in (0, 1], keeping log() finite.
+        jitter = -delta * self.beta * math.log(1.0 - random.random())
+        return self._clock() + jitter >= expires_at
+
+
+def create_response_cache(settings: Settings) -> Optional[ResponseCache]:
+    """Build the response cache configured by the CACHE_* settings."""
+    if not settings.CACHE_ENABLED:
+        return None
+
+    backend: CacheBackend
+    if settings.CACHE_BACKEND == "memory":
+        backend = MemoryCache(
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            max_bytes=settings.CACHE_MAX_BYTES,
+        )
+    elif settings.CACHE_BACKEND == "redis":
+        from cache.redis import RedisCache
+
+        local = None
+        if settings.CACHE_LOCAL_MAX_ENTRIES > 0:
+            local = MemoryCache(
+                max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+                max_bytes=settings.CACHE_MAX_BYTES,
+            )
+        backend = RedisCache.from_url(
+            settings.CACHE_REDIS_URL,
+            prefix=settings.CACHE_REDIS_PREFIX,
+            local=local,
+            local_ttl=settings.CACHE_LOCAL_TTL_SECONDS,
+        )
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND: {settings.CACHE_BACKEND!r}")
+
+    return ResponseCache(
+        backend, ttl=settings.CACHE_TTL_SECONDS, beta=settings.CACHE_EARLY_EXPIRY_BETA
+    )
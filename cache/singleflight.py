@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, TypeVar
+
+from monitoring.metrics import SINGLE_FLIGHT_REQUESTS
+
+T = TypeVar("T")
+
+
+class _Abandoned(Exception):
+    """The leader of a call was cancelled before it produced a result."""
+
+
+class _Call:
+    def __init__(self, tags: Iterable[str]):
+        self.future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self.tags = frozenset(tags)
+
+
+class SingleFlight:
+    """Coalesces identical concurrent reads into one.
+
+    The first caller of do() for a key runs the function; callers arriving
+    while it is in flight wait for it and get the same result, or the same
+    exception, instead of running it again. Nothing is kept once the call
+    completes. Waiters do not hold a database connection, so a burst of
+    requests for one hot row costs one pooled connection rather than one per
+    request.
+
+    If the leading caller is cancelled (its client went away), or fails with
+    an error for which leader_error is true, such as its own deadline running
+    out, a waiting caller takes over and runs the function itself. invalidate() has the
+    interface of ResponseCache.invalidate: calls tagged with the tag are
+    detached, so that readers arriving after a write do not join a read that
+    started before it.
+    """
+
+    def __init__(
+        self, leader_error: Optional[Callable[[BaseException], bool]] = None
+    ) -> None:
+        self._leader_error = leader_error
+        self._calls: Dict[str, _Call] = {}
+        self._tags: Dict[str, Set[str]] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[T]], tags: Iterable[str] = ()
+    ) -> T:
+        while True:
+            call = self._calls.get(key)
+            if call is None:
+                break
+            self.coalesced += 1
+            SINGLE_FLIGHT_REQUESTS.labels("coalesced").inc()
+            try:
+                # Shielded: a waiter being cancelled must not cancel the call.
+                return await asyncio.shield(call.future)
+            except _Abandoned:
+                continue
+
+        call = _Call(tags)
+        self._add(key, call)
+        self.leaders += 1
+        SINGLE_FLIGHT_REQUESTS.labels("leader").inc()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._fail(call, _Abandoned())
+            raise
+        except BaseException as e:
+            if self._leader_error is not None and self._leader_error(e):
+                self._fail(call, _Abandoned())
+            else:
+                self._fail(call, e)
+            raise
+        else:
+            call.future.set_result(result)
+            return result
+        finally:
+            self._remove(key, call)
+
+    async def invalidate(self, tag: str) -> None:
+        for key in self._tags.pop(tag, ()):
+            call = self._calls.pop(key, None)
+            if call is not None:
+                self._untag(key, call, skip=tag)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+    @staticmethod
+    def _fail(call: _Call, exc: BaseException) -> None:
+        call.future.set_exception(exc)
+        # Marks the exception as retrieved: without waiters nobody else will.
+        call.future.exception()
+
+    def _add(self, key: str, call: _Call) -> None:
+        self._calls[key] = call
+        for tag in call.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    def _remove(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+            self._untag(key, call)
+
+    def _untag(self, key: str, call: _Call, skip: str = "") -> None:
+        for tag in call.tags:
+            if tag == skip:
+                continue
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -15,6 +17,122 @@ class Settings(BaseSettings):
     DB_PORT: int
     DB_NAME: str
 
+    # Run migrations on startup; turn off to migrate separately, e.g. once
+    # before a large rollout instead of from every worker.
+    DB_MIGRATE_ON_STARTUP: bool = True
+
+    # Read replicas
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_CHECK_INTERVAL_SECONDS: float = 1.0
+    DB_READ_YOUR_WRITES_SECONDS: float = 10.0
+
+    # SQL instrumentation
+    DB_STATEMENT_BUDGET: int = 0
+    DB_SLOW_QUERY_SECONDS: float = 0.0
+    DB_SLOW_QUERY_EXPLAIN_RATE: float = 0.0
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Request profiling
+    PROFILING_TOKEN: str = ""
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_OUTPUT_DIR: str = ""
+
+    # Question pages: GET /question/ returns QUESTIONS_PAGE_SIZE questions at
+    # a time unless limit asks for another size, up to QUESTIONS_MAX_PAGE_SIZE.
+    QUESTIONS_PAGE_SIZE: int = 100
+    QUESTIONS_MAX_PAGE_SIZE: int = 1000
+
+    # Answer pages: GET /question/{id} returns ANSWERS_PAGE_SIZE answers at a
+    # time unless answers_limit asks for another size, up to
+    # ANSWERS_MAX_PAGE_SIZE.
+    ANSWERS_PAGE_SIZE: int = 100
+    ANSWERS_MAX_PAGE_SIZE: int = 1000
+
+    # Export
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Bulk ingest: larger bodies, or bodies with more items, are refused with
+    # 413 before anything is validated or written.
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    BULK_MAX_ITEMS: int = 10_000
+    BULK_MAX_BODY_BYTES: int = 10 * 1024 * 1024
+
+    # Group commit: POST /question/{id}/answers/ requests are written
+    # together, up to ANSWER_GROUP_COMMIT_MAX_BATCH answers per statement and
+    # commit, waiting at most ANSWER_GROUP_COMMIT_MAX_LINGER_SECONDS for more.
+    ANSWER_GROUP_COMMIT_ENABLED: bool = False
+    ANSWER_GROUP_COMMIT_MAX_BATCH: int = 500
+    ANSWER_GROUP_COMMIT_MAX_LINGER_SECONDS: float = 0.005
+
+    # Batch reads: each question comes with BATCH_ANSWERS_PAGE_SIZE answers
+    # unless answers_limit asks for another number, up to
+    # BATCH_ANSWERS_MAX_PAGE_SIZE.
+    BATCH_MAX_IDS: int = 100
+    BATCH_ANSWERS_PAGE_SIZE: int = 10
+    BATCH_ANSWERS_MAX_PAGE_SIZE: int = 100
+
+    # Search
+    SEARCH_PAGE_SIZE: int = 20
+    # Matches ranked per table and query; a very common term is ranked among
+    # its newest matches only, which keeps its cost bounded.
+    SEARCH_MAX_CANDIDATES: int = 1000
+
+    # Answer feed: GET /question/{id}/stream pushes answer changes, which the
+    # write paths publish with pg_notify. Off by default: notifying
+    # transactions serialize on a global lock at commit.
+    ANSWER_FEED_ENABLED: bool = False
+    ANSWER_FEED_MAX_SUBSCRIBERS: int = 1000
+    ANSWER_FEED_HEARTBEAT_SECONDS: float = 15.0
+    ANSWER_FEED_QUEUE_SIZE: int = 100
+
+    # Read coalescing: concurrent identical question reads share one query.
+    READ_COALESCING_ENABLED: bool = True
+
+    # Request deadlines: REQUEST_TIMEOUT_ROUTES overrides the default for
+    # "<METHOD> <route>" keys, 0 meaning no deadline. Clients may ask for their
+    # own with the X-Request-Timeout header, up to REQUEST_TIMEOUT_MAX_SECONDS.
+    REQUEST_TIMEOUT_SECONDS: float = 30.0
+    REQUEST_TIMEOUT_ROUTES: dict[str, float] = {
+        "POST /question/bulk": 120.0,
+        "POST /question/{id}/answers/bulk": 120.0,
+        "GET /export/questions.ndjson": 0.0,
+        "GET /question/{id}/stream": 0.0,
+    }
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 120.0
+
+    # Admission control, per worker. A concurrency limit of 0 is derived from
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW: writes get ADMISSION_WRITE_SHARE of it and
+    # reads the rest. ADMISSION_MAX_QUEUE of 0 allows as many waiting requests
+    # as the limit. A rate limit of 0 turns per-client rate limiting off.
+    ADMISSION_ENABLED: bool = False
+    ADMISSION_READ_CONCURRENCY: int = 0
+    ADMISSION_WRITE_CONCURRENCY: int = 0
+    ADMISSION_WRITE_SHARE: float = 0.3
+    ADMISSION_MAX_QUEUE: int = 0
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 0.5
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    ADMISSION_RATE_LIMIT_PER_SECOND: float = 0.0
+    ADMISSION_RATE_LIMIT_BURST: int = 20
+    ADMISSION_RATE_LIMIT_KEY: Literal["ip", "user_id"] = "ip"
+    ADMISSION_RATE_LIMIT_MAX_CLIENTS: int = 100_000
+
+    # HTTP caching
+    HTTP_CACHE_MAX_AGE: int = 0
+
+    # Response cache
+    CACHE_ENABLED: bool = True
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    CACHE_MAX_ENTRIES: int = 10_000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_TTL_SECONDS: float = 60.0
+    CACHE_EARLY_EXPIRY_BETA: float = 1.0
+    CACHE_WARMUP_TOP_N: int = 0
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_REDIS_PREFIX: str = "qa"
+    CACHE_LOCAL_MAX_ENTRIES: int = 1000
+    CACHE_LOCAL_TTL_SECONDS: float = 5.0
+
     # CORS Security
     allowed_origins: list[str] = [
         "http://localhost:8000",
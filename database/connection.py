@@ -1,43 +1,179 @@
+import asyncio
+import itertools
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
-
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from typing import AsyncGenerator, List, Optional
+
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 from config import settings
+from database.deadline import apply_statement_timeout
+from monitoring.metrics import InstrumentedPool, instrument_engine
+
+# Set on responses to writes; until it expires, that client reads from the
+# primary so it always sees its own changes.
+READ_PRIMARY_COOKIE = "qa_read_primary_until"
+
+# Seconds the replica is behind; 0 when it has replayed everything it has
+# received, and on a server that is not a standby at all.
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReadReplica:
+    """Engine for one read replica and its last measured replication lag."""
+
+    def __init__(self, url: str, name: str = "replica"):
+        self.url = url
+        self.engine: AsyncEngine = _create_engine(url, name)
+        self.session_maker = async_sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.lag: Optional[float] = None
+        self.healthy = False
+
+    async def check(self) -> None:
+        """Measure replication lag and mark the replica usable if it is
+        within DB_REPLICA_MAX_LAG_SECONDS.
+        """
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(_REPLICA_LAG_SQL)).scalar()
+            self.lag = float(lag or 0)
+            healthy = self.lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            logger.warning(f"Read replica check failed: {e}")
+            self.lag = None
+            healthy = False
+
+        if healthy != self.healthy:
+            state = "in" if healthy else "out of"
+            logger.info(
+                f"Read replica {self.engine.url!r} {state} rotation, lag={self.lag}"
+            )
+        self.healthy = healthy
+
 
 # PostgreSQL
 engine = None
 AsyncSessionLocal = None
+read_replicas: List[ReadReplica] = []
 
+_replica_monitor: Optional[asyncio.Task] = None
+_replica_turn = itertools.count()
 
-async def init_db():
-    """Initialize database connections"""
-    global engine, AsyncSessionLocal
 
-    # PostgreSQL
+def _create_engine(url: str, name: str) -> AsyncEngine:
     engine = create_async_engine(
-        settings.DATABASE_URL,
+        url,
+        poolclass=InstrumentedPool,
         pool_size=settings.DB_POOL_SIZE,
         max_overflow=settings.DB_MAX_OVERFLOW,
         pool_timeout=settings.DB_POOL_TIMEOUT,
         echo=settings.DB_ECHO,
         pool_pre_ping=True,
     )
+    instrument_engine(engine, name)
+    return engine
+
+
+async def init_db():
+    """Initialize database connections"""
+    global engine, AsyncSessionLocal, read_replicas, _replica_monitor
+
+    # PostgreSQL
+    engine = _create_engine(settings.DATABASE_URL, "primary")
 
     AsyncSessionLocal = async_sessionmaker(
         engine, class_=AsyncSession, expire_on_commit=False
     )
 
+    read_replicas = [
+        ReadReplica(url, f"replica{index}")
+        for index, url in enumerate(settings.DB_REPLICA_URLS)
+    ]
+    if read_replicas:
+        await asyncio.gather(*(replica.check() for replica in read_replicas))
+        _replica_monitor = asyncio.create_task(_monitor_replicas())
 
 
 async def close_db():
     """Close database connections"""
-    global engine
+    global engine, _replica_monitor
 
+    if _replica_monitor:
+        _replica_monitor.cancel()
+        _replica_monitor = None
+    for replica in read_replicas:
+        await replica.engine.dispose()
     if engine:
         await engine.dispose()
 
 
+async def _monitor_replicas() -> None:
+    while True:
+        await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL_SECONDS)
+        await asyncio.gather(*(replica.check() for replica in read_replicas))
+
+
+def _pick_replica() -> Optional[ReadReplica]:
+    """Least checked-out connections among healthy replicas, ties broken
+    round-robin.
+    """
+    healthy = [replica for replica in read_replicas if replica.healthy]
+    if not healthy:
+        return None
+
+    start = next(_replica_turn) % len(healthy)
+    rotation = healthy[start:] + healthy[:start]
+    return min(rotation, key=lambda replica: replica.engine.pool.checkedout())
+
+
+def reads_from_primary(request: Optional[Request]) -> bool:
+    """Whether the client wrote recently and is pinned to the primary.
+
+    The cookie comes from the client, so a time further out than a write
+    could have set is ignored rather than pinning the client for good. A
+    second of slack covers the rounding of the cookie value and clock skew
+    between the workers that set and read it.
+    """
+    if request is None:
+        return False
+    try:
+        until = float(request.cookies.get(READ_PRIMARY_COOKIE, ""))
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + settings.DB_READ_YOUR_WRITES_SECONDS + 1
+
+
+def get_read_session_maker(request: Optional[Request] = None) -> async_sessionmaker:
+    """Session factory for a read-only unit of work.
+
+    Uses a replica unless none is configured or healthy, or the client wrote
+    recently (see READ_PRIMARY_COOKIE).
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+
+    if not reads_from_primary(request):
+        replica = _pick_replica()
+        if replica is not None:
+            return replica.session_maker
+
+    return AsyncSessionLocal
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Get PostgreSQL session"""
 
@@ -45,6 +181,7 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         raise RuntimeError("Database not initialized. Call init_db() first.")
 
     async with AsyncSessionLocal() as session:
+        apply_statement_timeout(session)
         try:
             yield session
             await session.commit()
@@ -71,3 +208,33 @@ async def get_db_context():
             raise
         finally:
             await session.close()
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Get PostgreSQL session for reads, from a replica when possible"""
+
+    async with get_read_session_maker(request)() as session:
+        apply_statement_timeout(session)
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+@asynccontextmanager
+async def get_read_db_context():
+    """Context manager for read-only database session"""
+
+    async with get_read_session_maker()() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
@@ -0,0 +1,56 @@
+import time
+from contextvars import ContextVar, Token
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# SQLSTATE query_canceled, raised when statement_timeout runs out.
+_QUERY_CANCELED = "57014"
+
+# time.monotonic() by which the current request has to be answered.
+_deadline: ContextVar[Optional[float]] = ContextVar("qa_deadline", default=None)
+
+
+def set_deadline(deadline: Optional[float]) -> "Token[Optional[float]]":
+    """Set the deadline for the current context and the tasks it spawns."""
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: "Token[Optional[float]]") -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def apply_statement_timeout(session: AsyncSession) -> None:
+    """Limit every transaction the session begins to the time left until the
+    current deadline, so Postgres cancels a statement that would overrun it.
+    Does nothing without a deadline.
+    """
+    if _deadline.get() is None:
+        return
+    event.listen(session.sync_session, "after_begin", _set_statement_timeout)
+
+
+def _set_statement_timeout(session: Any, transaction: Any, connection: Any) -> None:
+    # Runs when a transaction begins; SET LOCAL lasts until it ends, so every
+    # transaction of a session that commits midway gets the time then left.
+    seconds = remaining()
+    if seconds is None:
+        return
+    milliseconds = max(int(seconds * 1000), 1)
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {milliseconds}")
+
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    """Whether exc is Postgres cancelling a statement, as it does once the
+    statement_timeout set from a deadline runs out.
+    """
+    return getattr(getattr(exc, "orig", None), "sqlstate", None) == _QUERY_CANCELED
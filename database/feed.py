@@ -0,0 +1,254 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import asyncpg
+from loguru import logger
+from pydantic_core import to_json
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache.response import ResponseCache
+from database.connection import get_db_context
+from database.storage import ANSWER_FEED_CHANNEL, Storage
+
+# One change to a question's answers as an SSE event, with the question's
+# version after it. None tells a subscriber that its stream has to end.
+FeedEvent = Tuple[int, bytes]
+
+_HEARTBEAT = b": heartbeat\n\n"
+
+
+class FeedFull(Exception):
+    """The worker already has its maximum number of subscribers."""
+
+
+def format_event(version: int, name: str, data: bytes) -> bytes:
+    """An SSE event whose id is the question's version."""
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (version, name.encode(), data)
+
+
+class AnswerFeed:
+    """Changes to answers, pushed to subscribers as SSE events.
+
+    Storage publishes every change to answers with pg_notify on
+    ANSWER_FEED_CHANNEL. The feed LISTENs on a single connection per worker,
+    however many subscribers there are, and renders each notification once
+    for all subscribers of its question: new answers are read in one query,
+    from the primary, which has them once the notification arrives.
+    Notifications are handled one at a time in arrival order, which is
+    commit order, so every subscriber sees changes in order.
+
+    Events carry the question's version as their id. A client resuming with
+    an older Last-Event-ID first gets a snapshot of the question with its
+    first page of answers, as GET /question/{id} returns it, since changes
+    made while it was away are not kept. A subscriber falling queue_size events behind,
+    and every subscriber when the connection is lost, has its stream ended;
+    its client then reconnects and resumes the same way. Deleting the
+    question sends a final question_deleted event and ends its streams.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_subscribers: int,
+        queue_size: int,
+        heartbeat: float,
+        session_context: Callable[[], AsyncContextManager[AsyncSession]] = (
+            get_db_context
+        ),
+        cache: Optional[ResponseCache] = None,
+        connect: Callable[[str], Awaitable[Any]] = asyncpg.connect,
+    ):
+        # asyncpg takes a plain postgresql:// DSN.
+        self._dsn = make_url(url).set(drivername="postgresql").render_as_string(False)
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._session_context = session_context
+        self._cache = cache
+        self._connect = connect
+
+        self._connection: Any = None
+        self._connecting = asyncio.Lock()
+        self._notifications: "asyncio.Queue[str]" = asyncio.Queue()
+        self._dispatcher: Optional["asyncio.Task[None]"] = None
+        self._subscribers: Dict[int, Set["asyncio.Queue[Optional[FeedEvent]]"]] = {}
+        self.subscribers = 0
+
+    @property
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    async def start(self) -> None:
+        """Open the LISTEN connection unless it is open already."""
+        async with self._connecting:
+            if self._connection is not None and not self._connection.is_closed():
+                return
+            connection = await self._connect(self._dsn)
+            await connection.add_listener(ANSWER_FEED_CHANNEL, self._on_notification)
+            connection.add_termination_listener(self._on_termination)
+            self._connection = connection
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            logger.info("Answer feed listening")
+
+    async def close(self) -> None:
+        """End every stream and close the LISTEN connection."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        connection, self._connection = self._connection, None
+        if connection is not None and not connection.is_closed():
+            await connection.close()
+        self._end_all()
+
+    @asynccontextmanager
+    async def subscribe(
+        self, question_id: int
+    ) -> AsyncIterator["asyncio.Queue[Optional[FeedEvent]]"]:
+        """Receive the events of one question while inside the context.
+
+        Raises FeedFull when max_subscribers are subscribed already.
+        """
+        if self.full:
+            raise FeedFull()
+        await self.start()
+
+        queue: "asyncio.Queue[Optional[FeedEvent]]" = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(question_id, set()).add(queue)
+        self.subscribers += 1
+        try:
+            yield queue
+        finally:
+            self.subscribers -= 1
+            queues = self._subscribers[question_id]
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[question_id]
+
+    async def stream(
+        self, question_id: int, last_version: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """SSE stream of a question's answer changes after last_version, or
+        from now on without one, with a comment every heartbeat seconds.
+        """
+        try:
+            async with self.subscribe(question_id) as events:
+                # Subscribed first, so nothing committed after this read is
+                # missed; events up to it are skipped below.
+                snapshot = None
+                async with self._session_context() as session:
+                    storage = Storage(session, cache=self._cache)
+                    version = await storage.get_question_version(question_id)
+                    if version is None:
+                        return
+                    if last_version is not None and last_version < version:
+                        snapshot = await _snapshot(storage, question_id, version)
+
+                yield snapshot[1] if snapshot is not None else _HEARTBEAT
+                while True:
+                    try:
+                        event = await asyncio.wait_for(events.get(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield _HEARTBEAT
+                        continue
+                    if event is None:
+                        return
+                    event_version, data = event
+                    if event_version > version:
+                        version = event_version
+                        yield data
+        except FeedFull:
+            return
+        except Exception as e:
+            logger.error(f"Answer stream of question {question_id} failed: {e}")
+
+    def _on_notification(
+        self, connection: Any, pid: int, channel: str, payload: str
+    ) -> None:
+        self._notifications.put_nowait(payload)
+
+    def _on_termination(self, connection: Any) -> None:
+        if connection is not self._connection:
+            return
+        logger.warning("Answer feed connection lost")
+        self._connection = None
+        # Notifications may have been missed; clients resume on reconnect.
+        self._end_all()
+
+    async def _dispatch(self) -> None:
+        while True:
+            payload = await self._notifications.get()
+            change = json.loads(payload)
+            queues = self._subscribers.get(change["question_id"])
+            if not queues:
+                continue
+
+            try:
+                event = await self._render(change)
+            except Exception as e:
+                logger.error(f"Failed to render answer feed event: {e}")
+                for queue in list(queues):
+                    _end(queue)
+                continue
+            if event is None:
+                continue
+
+            for queue in list(queues):
+                try:
+                    queue.put_nowait(event)
+                    if "question_deleted" in change:
+                        queue.put_nowait(None)
+                except asyncio.QueueFull:
+                    _end(queue)
+
+    async def _render(self, change: Dict[str, Any]) -> Optional[FeedEvent]:
+        question_id, version = change["question_id"], change["version"]
+        if "deleted" in change:
+            data = to_json({"id": change["deleted"]})
+            return version, format_event(version, "deleted", data)
+        if "question_deleted" in change:
+            data = to_json({"id": question_id})
+            return version, format_event(version, "question_deleted", data)
+
+        async with self._session_context() as session:
+            storage = Storage(session, cache=self._cache)
+            if "created" in change:
+                data = await storage.get_answers_json(change["created"])
+                return version, format_event(version, "created", data)
+            # Too many answers to list: the question as it is now.
+            return await _snapshot(storage, question_id, version)
+
+    def _end_all(self) -> None:
+        for queues in self._subscribers.values():
+            for queue in queues:
+                _end(queue)
+
+
+async def _snapshot(
+    storage: Storage, question_id: int, version: int
+) -> Optional[FeedEvent]:
+    loaded = await storage.get_question_answers_json(question_id)
+    if loaded is None:
+        return None
+    return version, format_event(version, "snapshot", loaded[1])
+
+
+def _end(queue: "asyncio.Queue[Optional[FeedEvent]]") -> None:
+    # Whatever is still queued is dropped: the client catches up with a
+    # snapshot when it resumes.
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
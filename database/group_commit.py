@@ -0,0 +1,148 @@
+import asyncio
+from typing import AsyncContextManager, Callable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache.response import ResponseCache
+from cache.singleflight import SingleFlight
+from database.connection import get_db_context
+from database.storage import Storage
+from models.qa import Answer, AnswerCreate
+
+_Pending = Tuple[int, AnswerCreate, "asyncio.Future[Optional[Answer]]"]
+
+
+class AnswerBatcher:
+    """Group commit for single answer inserts.
+
+    add() queues an answer and waits. A background task takes whatever is
+    queued, waits up to max_linger seconds for more while the batch is below
+    max_batch answers, and writes the batch with Storage.add_answers_grouped:
+    one statement and one commit, in one pooled connection, for all of them.
+    While a batch is being written the next one builds up in the queue, so
+    batches grow with the load and the linger only delays answers when the
+    service is quiet.
+
+    A request that goes away before its batch is written is left out of it.
+    If writing a batch fails, it is written again in halves, so only the
+    answers that cannot be written fail, each with its own error.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_linger: float,
+        session_context: Callable[[], AsyncContextManager[AsyncSession]] = (
+            get_db_context
+        ),
+        cache: Optional[ResponseCache] = None,
+        flights: Optional[SingleFlight] = None,
+    ):
+        self.max_batch = max_batch
+        self.max_linger = max_linger
+        self._session_context = session_context
+        self._cache = cache
+        self._flights = flights
+        self._queue: "asyncio.Queue[_Pending]" = asyncio.Queue()
+        self._worker: Optional["asyncio.Task[None]"] = None
+        self._writing: Optional["asyncio.Future[None]"] = None
+
+        self.batches = 0
+        self.answers = 0
+
+    async def add(self, question_id: int, user_id: str, text: str) -> Optional[Answer]:
+        """Insert an answer with the next batch. Returns None if the question
+        does not exist.
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future: "asyncio.Future[Optional[Answer]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._queue.put_nowait(
+            (question_id, AnswerCreate(user_id=user_id, text=text), future)
+        )
+        return await future
+
+    async def close(self) -> None:
+        """Write what is queued and stop the background task."""
+        if self._worker is None:
+            return
+
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._writing is not None:
+            await self._writing
+
+        while not self._queue.empty():
+            await self._write(self._take_queued([]))
+
+    async def _run(self) -> None:
+        batch: List[_Pending] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = asyncio.get_running_loop().time() + self.max_linger
+                while len(batch) < self.max_batch:
+                    self._take_queued(batch)
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if len(batch) >= self.max_batch or timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # Shielded so that close() can let the batch in hand finish.
+                self._writing = asyncio.ensure_future(self._write(batch))
+                batch = []
+                await asyncio.shield(self._writing)
+        except asyncio.CancelledError:
+            # Back in the queue for close() to write.
+            for pending in batch:
+                self._queue.put_nowait(pending)
+            raise
+
+    def _take_queued(self, batch: List[_Pending]) -> List[_Pending]:
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write(self, batch: List[_Pending]) -> None:
+        batch = [pending for pending in batch if not pending[2].done()]
+        if not batch:
+            return
+
+        try:
+            async with self._session_context() as session:
+                storage = Storage(session, cache=self._cache, flights=self._flights)
+                created = await storage.add_answers_grouped(
+                    [(question_id, answer) for question_id, answer, _ in batch]
+                )
+        except Exception as e:
+            if len(batch) > 1:
+                # Written again in halves until the answers that fail are
+                # alone, so that one bad answer does not fail the others.
+                logger.warning(
+                    f"Failed to write batch of {len(batch)} answers, splitting: {e}"
+                )
+                middle = len(batch) // 2
+                await self._write(batch[:middle])
+                await self._write(batch[middle:])
+                return
+            logger.error(f"Failed to write answer: {e}")
+            _, _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.answers += len(batch)
+        for (_, _, future), answer in zip(batch, created):
+            if not future.done():
+                future.set_result(answer)
@@ -0,0 +1,68 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+Keyset = Tuple[Union[datetime, int], int]
+RankKeyset = Tuple[float, str, int]
+
+
+def encode_cursor(
+    position: Union[datetime, int], id: int, order: Optional[str] = None
+) -> str:
+    """Encode a keyset position, (created_at, id) or (count, id), as an
+    opaque cursor. order names the ordering it is a position in, when the
+    same rows can be paged in several.
+    """
+    if isinstance(position, datetime):
+        position = position.isoformat()
+    values = [position, id] if order is None else [position, id, order]
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str], order: Optional[str] = None
+) -> Optional[Keyset]:
+    """Decode a cursor produced by encode_cursor with the same order.
+
+    Raises ValueError if the cursor is malformed or was encoded for another
+    order.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, id, *rest = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if rest != ([] if order is None else [order]):
+            raise ValueError(f"Cursor is not for order {order!r}")
+        if isinstance(position, str):
+            return datetime.fromisoformat(position), int(id)
+        if type(position) is int:
+            return position, int(id)
+        raise TypeError(f"Unexpected cursor position {position!r}")
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def encode_rank_cursor(rank: float, type: str, id: int) -> str:
+    """Encode a (rank, type, id) search result position as an opaque cursor."""
+    raw = json.dumps([rank, type, id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: Optional[str]) -> Optional[RankKeyset]:
+    """Decode a cursor produced by encode_rank_cursor.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, type, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), str(type), int(id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
@@ -0,0 +1,30 @@
+from typing import Optional, Sequence, Tuple
+
+QUESTION_FIELDS = ("id", "text", "created_at", "answer_count", "last_answer_at")
+QUESTION_DETAIL_FIELDS = QUESTION_FIELDS + ("answers",)
+ANSWER_FIELDS = ("id", "question_id", "user_id", "text", "created_at")
+
+Fields = Tuple[str, ...]
+
+
+def parse_fields(fields: Optional[str], available: Sequence[str]) -> Optional[Fields]:
+    """Parse a comma-separated fields= value.
+
+    Returns the requested names in the order of available, so equivalent
+    requests share one representation, or None (all fields) if fields is
+    empty. Raises ValueError on unknown names.
+    """
+    if not fields:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(available)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}; "
+            f"available: {', '.join(available)}"
+        )
+    if not requested:
+        return None
+
+    return tuple(name for name in available if name in requested)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Callable, FrozenSet
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# pg_advisory_lock key held while migrating, so that of several workers
+# starting together only one upgrades and the others wait for it.
+MIGRATION_LOCK_ID = 0x5141_6D67
+
+
+def _upgrade(alembic_cfg: Config) -> None:
+    command.upgrade(alembic_cfg, "head")
+
+
+def head_revisions(alembic_cfg: Config) -> FrozenSet[str]:
+    return frozenset(ScriptDirectory.from_config(alembic_cfg).get_heads())
+
+
+async def current_revisions(conn: AsyncConnection) -> FrozenSet[str]:
+    """Revisions recorded in alembic_version; empty if it does not exist."""
+    try:
+        result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        return frozenset(result.scalars().all())
+    except ProgrammingError:
+        return frozenset()
+    finally:
+        await conn.rollback()
+
+
+async def ensure_schema_current(
+    engine: AsyncEngine,
+    alembic_cfg: Config,
+    upgrade: Callable[[Config], None] = _upgrade,
+) -> bool:
+    """Upgrade the database to the latest migration unless it is already there.
+
+    The common case, a current schema, costs one query. Otherwise the upgrade
+    runs in a thread, keeping the event loop free, while this connection holds
+    MIGRATION_LOCK_ID; whoever gets the lock second re-checks and finds
+    nothing left to do. Returns whether an upgrade ran.
+    """
+    heads = head_revisions(alembic_cfg)
+
+    async with engine.connect() as conn:
+        if await current_revisions(conn) == heads:
+            return False
+
+        await conn.execute(
+            text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}
+        )
+        await conn.commit()
+        try:
+            if await current_revisions(conn) == heads:
+                return False
+            await asyncio.to_thread(upgrade, alembic_cfg)
+            return True
+        finally:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID}
+            )
+            await conn.commit()
@@ -1,18 +1,353 @@
-from typing import List, Optional
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from sqlalchemy import insert, select
+from loguru import logger
+from pydantic_core import to_json
+from sqlalchemy import (
+    Float,
+    Integer,
+    String,
+    Text,
+    any_,
+    bindparam,
+    cast,
+    delete,
+    event,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    text,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
 
-from models.database import Answer, Question
+from cache.response import ResponseCache
+from cache.singleflight import SingleFlight
+from config import settings
+from database.pagination import (
+    decode_cursor,
+    decode_rank_cursor,
+    encode_cursor,
+    encode_rank_cursor,
+)
+from database.projection import Fields
+from models.database import SEARCH_CONFIG, Answer, Question
 from models.qa import Answer as AnswerModel
 from models.qa import Question as QuestionModel
-from models.qa import QuestionWithAnswers
+from models.qa import AnswerCreate, QuestionCreate, QuestionPage, QuestionWithAnswers
+
+T = TypeVar("T")
+
+_pending_invalidations: Set["asyncio.Task[None]"] = set()
+
+# Columns selected for the *_json reads, in the field order of the matching
+# models.qa model: rows are encoded straight from row._asdict() without
+# building ORM entities or Pydantic models, and produce the same bytes.
+_QUESTION_COLUMNS: Dict[str, Any] = {
+    "id": Question.id,
+    "text": Question.text,
+    "created_at": Question.created_at,
+    "answer_count": Question.answer_count,
+    "last_answer_at": Question.last_answer_at,
+}
+_ANSWER_COLUMNS: Dict[str, Any] = {
+    "id": Answer.id,
+    "question_id": Answer.question_id,
+    "user_id": Answer.user_id,
+    "text": Answer.text,
+    "created_at": Answer.created_at,
+}
+# Always selected, whatever fields were asked for: pages are cut on them.
+_KEYSET_FIELDS = ("id", "created_at")
+
+# Orders of the question list: the sort key, whether it descends, and the
+# fields it is computed from. Each is served by an index on (key, id).
+QUESTION_SORTS = ("created", "activity", "answers")
+_QUESTION_SORT_KEYS: Dict[str, Tuple[Any, bool, Tuple[str, ...]]] = {
+    "created": (Question.created_at, False, ("id", "created_at")),
+    # ix_question_activity_id: a question without answers is as recent as
+    # its creation.
+    "activity": (
+        func.coalesce(Question.last_answer_at, Question.created_at),
+        True,
+        ("id", "created_at", "last_answer_at"),
+    ),
+    "answers": (Question.answer_count, True, ("id", "answer_count")),
+}
+
+# Changes to answers are announced on this channel for the answer feed
+# (database.feed), with a JSON payload: question_id, the question's version
+# after the change, and "created" answer ids, a "deleted" answer id, or
+# "question_deleted" when the question itself is gone. Without any of them,
+# the answers changed too much to list and should be read again.
+ANSWER_FEED_CHANNEL = "qa_answer_feed"
+# NOTIFY payloads are limited to 8000 bytes.
+_FEED_MAX_PAYLOAD = 7900
+
+_SEARCH_CONFIG = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+_SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=30, MinWords=10"
+
+
+def _search_hits(entity: Any, question_id: Any, tsquery: Any) -> Any:
+    """The newest rows of entity's table matching tsquery, with their rank."""
+    return (
+        select(
+            literal_column(f"'{entity.__tablename__}'", String).label("type"),
+            entity.id,
+            question_id.label("question_id"),
+            func.ts_rank(entity.search_vector, tsquery, type_=Float).label("rank"),
+            entity.text,
+            entity.created_at,
+        )
+        .where(entity.search_vector.bool_op("@@")(tsquery))
+        .order_by(entity.id.desc())
+        .limit(settings.SEARCH_MAX_CANDIDATES)
+        .subquery(f"{entity.__tablename__}_hits")
+    )
+
+
+def _question_tag(question_id: int) -> str:
+    return f"question:{question_id}"
+
+
+def _question_answers_tag(question_id: int) -> str:
+    return f"question-answers:{question_id}"
+
+
+def _answer_tag(answer_id: int) -> str:
+    return f"answer:{answer_id}"
+
+
+def _columns(
+    columns: Dict[str, Any],
+    fields: Optional[Fields],
+    preview_chars: Optional[int],
+    keyset: Tuple[str, ...] = _KEYSET_FIELDS,
+) -> List[Any]:
+    """The columns to select for fields (all if None) and keyset, with text
+    cut down to its first preview_chars characters by the database.
+    """
+    selected = []
+    for name, column in columns.items():
+        if fields is not None and name not in fields and name not in keyset:
+            continue
+        if name == "text" and preview_chars:
+            column = func.left(column, preview_chars).label(name)
+        selected.append(column)
+    return selected
+
+
+def _answers_added(count: Any) -> Dict[str, Any]:
+    """Question values for an UPDATE recording count new answers; count may
+    be a column of the statement.
+    """
+    values: Dict[str, Any] = {"version": Question.version + 1}
+    if not isinstance(count, int) or count:
+        values["answer_count"] = Question.answer_count + count
+        # The answers' created_at defaults to now() as well; greatest() keeps
+        # the later of two overlapping transactions.
+        values["last_answer_at"] = func.greatest(Question.last_answer_at, func.now())
+    return values
+
+
+def _feed_notify(question_id: Any, version: Any, change: str, value: Any) -> Any:
+    """pg_notify() call announcing a change on the answer feed, for use in
+    the RETURNING clause of the statement making it. Like any NOTIFY it is
+    delivered when, and only if, the transaction commits.
+    """
+    payload = func.json_build_object(
+        literal_column("'question_id'"),
+        question_id,
+        literal_column("'version'"),
+        version,
+        literal_column(f"'{change}'"),
+        value,
+    )
+    return func.pg_notify(
+        literal_column(f"'{ANSWER_FEED_CHANNEL}'"), cast(payload, Text)
+    ).label("notified")
+
+
+def _feed_payload(question_id: int, version: int, created: List[int]) -> str:
+    payload = json.dumps(
+        {"question_id": question_id, "version": version, "created": created}
+    )
+    if len(payload) > _FEED_MAX_PAYLOAD:
+        payload = json.dumps({"question_id": question_id, "version": version})
+    return payload
+
+
+def _sort_position(sort: str, row: Row) -> Any:
+    """Value of the sort key of a question row."""
+    if sort == "answers":
+        return row.answer_count
+    if sort == "activity":
+        return row.last_answer_at or row.created_at
+    return row.created_at
+
+
+def _render(row: Row, fields: Optional[Fields]) -> Dict[str, Any]:
+    if fields is None:
+        return row._asdict()
+    return {name: getattr(row, name) for name in fields}
+
+
+def _representation(
+    answers_limit: Optional[int],
+    answers_cursor: Optional[str],
+    fields: Optional[Fields] = None,
+    answer_fields: Optional[Fields] = None,
+    preview_chars: Optional[int] = None,
+) -> str:
+    """Identify which page and projection of a question is being read."""
+    parts = [str(answers_limit or ""), answers_cursor or ""]
+    if fields or answer_fields or preview_chars:
+        parts += [
+            ",".join(fields or ()),
+            ",".join(answer_fields or ()),
+            str(preview_chars or ""),
+        ]
+    return ":".join(parts)
+
+
+def _question_version(question_id: int, version: int, representation: str) -> str:
+    """Identify one representation of a question with its answers. Changes
+    whenever an answer is added or removed, and differs between pages and
+    projections.
+    """
+    token = f"q{question_id}.{version}"
+    if representation.strip(":"):
+        digest = hashlib.blake2b(representation.encode(), digest_size=8)
+        token += "." + digest.hexdigest()
+    return token
+
+
+def _pack(version: str, body: bytes) -> bytes:
+    return version.encode() + b"\n" + body
+
+
+def _unpack(packed: bytes) -> Tuple[str, bytes]:
+    version, _, body = packed.partition(b"\n")
+    return version.decode(), body
+
+
+def _schedule(loop: asyncio.AbstractEventLoop, coro: Awaitable[None]) -> None:
+    task = loop.create_task(coro)
+    _pending_invalidations.add(task)
+    task.add_done_callback(_pending_invalidations.discard)
+
+
+async def _invalidate(
+    cache: Union[ResponseCache, SingleFlight], tags: Iterable[str], delay: float = 0
+) -> None:
+    if delay:
+        await asyncio.sleep(delay)
+    for tag in tags:
+        try:
+            await cache.invalidate(tag)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cache tag {tag}: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    # A reader can refill an entry from the pre-write snapshot between the
+    # write and its commit, so entries are dropped once more after commit.
+    invalidations = session.info.pop("cache_invalidations", None)
+    if not invalidations:
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    for cache, tags in invalidations.items():
+        _schedule(loop, _invalidate(cache, tags))
+        if settings.DB_REPLICA_URLS:
+            # Replicas may serve the old rows for up to the allowed lag, and
+            # a read from one can put them back in the cache.
+            _schedule(
+                loop,
+                _invalidate(cache, tags, delay=settings.DB_REPLICA_MAX_LAG_SECONDS),
+            )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop("cache_invalidations", None)
 
 
 class Storage:
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        cache: Optional[ResponseCache] = None,
+        flights: Optional[SingleFlight] = None,
+    ):
         self.session = session
+        self.cache = cache
+        self.flights = flights
+
+    async def _invalidate(self, *tags: str) -> None:
+        for target in (self.cache, self.flights):
+            if target is None:
+                continue
+            await _invalidate(target, tags)
+            self.session.info.setdefault("cache_invalidations", {}).setdefault(
+                target, set()
+            ).update(tags)
+
+    async def _coalesce(
+        self, key: str, fn: Callable[[], Awaitable[T]], tags: Iterable[str]
+    ) -> T:
+        """Run fn, sharing its result with identical concurrent reads when
+        single-flight is configured. Reads only coalesce with reads of the
+        same database, so a read pinned to the primary never gets a replica's
+        result.
+        """
+        if self.flights is None:
+            return await fn()
+
+        database = getattr(self.session.bind, "url", "")
+        return await self.flights.do(f"{database}|{key}", fn, tags)
+
+    async def _publish(self, payloads: List[str]) -> None:
+        """Announce answer changes on the answer feed in one statement, for
+        writes whose changes are only known after several statements.
+        """
+        if not settings.ANSWER_FEED_ENABLED or not payloads:
+            return
+        await self.session.execute(
+            text(
+                "SELECT pg_notify(:channel, payload) "
+                "FROM unnest(CAST(:payloads AS text[])) AS payload"
+            ),
+            {"channel": ANSWER_FEED_CHANNEL, "payloads": payloads},
+        )
 
     async def create_question(self, text: str) -> QuestionModel:
         stmt = insert(Question).values(text=text).returning(Question)
@@ -24,72 +359,570 @@ class Storage:
             id=question.id, text=question.text, created_at=question.created_at
         )
 
-    async def get_questions(self, limit: Optional[int]) -> List[QuestionModel]:
-        stmt = select(Question)
-        if limit:
-            stmt = stmt.limit(limit)
+    async def create_questions(
+        self, questions: List[QuestionCreate]
+    ) -> List[QuestionModel]:
+        """Insert many questions, BULK_INSERT_BATCH_SIZE rows per statement.
+
+        Each batch is a single INSERT ... SELECT FROM unnest(...) RETURNING, so
+        a batch costs one round trip and one bound parameter per column no
+        matter how many rows it holds. Rows come back in the order given.
+        """
+        created: List[QuestionModel] = []
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+
+        for start in range(0, len(questions), batch_size):
+            batch = questions[start : start + batch_size]
+            rows = (
+                func.unnest(
+                    bindparam("texts", [q.text for q in batch], type_=ARRAY(String))
+                )
+                .table_valued("text", with_ordinality="ord")
+                .render_derived()
+            )
+            stmt = (
+                insert(Question)
+                .from_select(["text"], select(rows.c.text).order_by(rows.c.ord))
+                .returning(Question.id, Question.text, Question.created_at)
+            )
+            result = await self.session.execute(stmt)
+            # Serial ids are handed out in insertion order.
+            created.extend(
+                QuestionModel(id=row.id, text=row.text, created_at=row.created_at)
+                for row in sorted(result, key=lambda row: row.id)
+            )
+
+        return created
+
+    async def get_questions(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort: str = "created",
+    ) -> QuestionPage:
+        """Return one page of questions in one of QUESTION_SORTS: oldest
+        first by (created_at, id), or most recent activity or most answers
+        first, ties broken by newest id. Pages hold limit questions, or
+        QUESTIONS_PAGE_SIZE without one.
+
+        Pages are addressed by keyset rather than OFFSET so that every page is
+        a single index range scan on the (key, id) index of the sort. Raises
+        ValueError if the cursor is malformed or comes from another sort.
+        """
+        questions, next_cursor = await self._get_questions(
+            limit or settings.QUESTIONS_PAGE_SIZE, cursor, sort
+        )
+
+        return QuestionPage(
+            items=[QuestionModel(**q._asdict()) for q in questions],
+            next_cursor=next_cursor,
+        )
+
+    async def get_questions_json(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort: str = "created",
+        fields: Optional[Fields] = None,
+        preview_chars: Optional[int] = None,
+    ) -> Tuple[bytes, Optional[str]]:
+        """get_questions serialized to a JSON array, with the next cursor.
+
+        Only the given fields are selected and returned, and with
+        preview_chars the text is truncated by the database.
+        """
+        questions, next_cursor = await self._get_questions(
+            limit or settings.QUESTIONS_PAGE_SIZE, cursor, sort, fields, preview_chars
+        )
+
+        return to_json([_render(q, fields) for q in questions]), next_cursor
+
+    async def _get_questions(
+        self,
+        limit: int,
+        cursor: Optional[str],
+        sort: str = "created",
+        fields: Optional[Fields] = None,
+        preview_chars: Optional[int] = None,
+    ) -> Tuple[List[Row], Optional[str]]:
+        if sort not in _QUESTION_SORT_KEYS:
+            raise ValueError(
+                f"Unknown sort: {sort!r}; available: {', '.join(QUESTION_SORTS)}"
+            )
+        key, descending, keyset = _QUESTION_SORT_KEYS[sort]
+        after = decode_cursor(cursor, order=sort)
+        position_type = int if sort == "answers" else datetime
+        if after and not isinstance(after[0], position_type):
+            raise ValueError(f"Invalid cursor for sort {sort!r}: {cursor!r}")
+
+        stmt = select(*_columns(_QUESTION_COLUMNS, fields, preview_chars, keyset))
+        if descending:
+            stmt = stmt.order_by(key.desc(), Question.id.desc())
+            if after:
+                stmt = stmt.where(tuple_(key, Question.id) < after)
+        else:
+            stmt = stmt.order_by(key, Question.id)
+            if after:
+                stmt = stmt.where(tuple_(key, Question.id) > after)
+        # One extra row tells us whether there is a next page.
+        stmt = stmt.limit(limit + 1)
         result = await self.session.execute(stmt)
-        questions = result.scalars().all()
-        return [
-            QuestionModel(id=q.id, text=q.text, created_at=q.created_at)
-            for q in questions
-        ]
+        questions = list(result.all())
+
+        next_cursor = None
+        if len(questions) > limit:
+            questions = questions[:limit]
+            last = questions[-1]
+            next_cursor = encode_cursor(_sort_position(sort, last), last.id, sort)
+
+        return questions, next_cursor
+
+    async def estimate_questions_count(self) -> Optional[int]:
+        """Approximate number of questions from planner statistics.
+
+        Reads pg_class.reltuples instead of running COUNT(*), so the cost does
+        not grow with the table. Returns None if the table has not been
+        analyzed yet.
+        """
+        stmt = text(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+        )
+        result = await self.session.execute(stmt, {"table": Question.__tablename__})
+        estimate = result.scalar_one_or_none()
+        if estimate is None or estimate < 0:
+            return None
+
+        return estimate
 
     async def get_question_answers(
-        self, question_id: int
+        self,
+        question_id: int,
+        answers_limit: Optional[int] = None,
+        answers_cursor: Optional[str] = None,
     ) -> Optional[QuestionWithAnswers]:
-        stmt = (
-            select(Question)
-            .where(Question.id == question_id)
-            .options(selectinload(Question.answers))
-        )
-        result = await self.session.execute(stmt)
-        question = result.scalar_one_or_none()
+        """Return a question with one page of its answers.
 
-        if not question:
+        Answers are ordered by (created_at, id) and read through
+        ix_answer_question_id_created_at_id, so a page costs the same however
+        many answers the question has. Pages hold answers_limit answers, or
+        ANSWERS_PAGE_SIZE without one. Raises ValueError if the cursor is
+        malformed.
+        """
+        loaded = await self._get_question_answers(
+            question_id, answers_limit or settings.ANSWERS_PAGE_SIZE, answers_cursor
+        )
+        if loaded is None:
             return None
 
+        question, answers, answers_next_cursor = loaded
         return QuestionWithAnswers(
             id=question.id,
             text=question.text,
             created_at=question.created_at,
-            answers=[
-                AnswerModel(
-                    id=ans.id,
-                    question_id=ans.question_id,
-                    user_id=ans.user_id,
-                    text=ans.text,
-                    created_at=ans.created_at,
+            answer_count=question.answer_count,
+            last_answer_at=question.last_answer_at,
+            answers=[AnswerModel(**ans._asdict()) for ans in answers],
+            answers_next_cursor=answers_next_cursor,
+        )
+
+    async def _get_question_answers(
+        self,
+        question_id: int,
+        answers_limit: int,
+        answers_cursor: Optional[str],
+        fields: Optional[Fields] = None,
+        answer_fields: Optional[Fields] = None,
+        preview_chars: Optional[int] = None,
+    ) -> Optional[Tuple[Row, List[Row], Optional[str]]]:
+        """The question row (with its version), one page of answer rows and
+        the cursor of the next page. Answers are not read at all when fields
+        leaves them out.
+        """
+        after = decode_cursor(answers_cursor)
+        if after and not isinstance(after[0], datetime):
+            raise ValueError(f"Invalid answers cursor: {answers_cursor!r}")
+
+        stmt = select(
+            *_columns(_QUESTION_COLUMNS, fields, preview_chars), Question.version
+        ).where(Question.id == question_id)
+        result = await self.session.execute(stmt)
+        question = result.one_or_none()
+
+        if not question:
+            return None
+        if fields is not None and "answers" not in fields:
+            return question, [], None
+
+        answers_stmt = (
+            select(*_columns(_ANSWER_COLUMNS, answer_fields, preview_chars))
+            .where(Answer.question_id == question_id)
+            .order_by(Answer.created_at, Answer.id)
+        )
+        if after:
+            answers_stmt = answers_stmt.where(
+                tuple_(Answer.created_at, Answer.id) > after
+            )
+        # One extra row tells us whether there is a next page.
+        answers_stmt = answers_stmt.limit(answers_limit + 1)
+        answers_result = await self.session.execute(answers_stmt)
+        answers = list(answers_result.all())
+
+        answers_next_cursor = None
+        if len(answers) > answers_limit:
+            answers = answers[:answers_limit]
+            last = answers[-1]
+            answers_next_cursor = encode_cursor(last.created_at, last.id)
+
+        return question, answers, answers_next_cursor
+
+    async def get_question_version(self, question_id: int) -> Optional[int]:
+        """The question's version, bumped by every change to its answers.
+        Returns None if the question does not exist.
+        """
+        stmt = select(Question.version).where(Question.id == question_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def get_question_answers_version(
+        self,
+        question_id: int,
+        answers_limit: Optional[int] = None,
+        answers_cursor: Optional[str] = None,
+        fields: Optional[Fields] = None,
+        answer_fields: Optional[Fields] = None,
+        preview_chars: Optional[int] = None,
+    ) -> Optional[str]:
+        """Version of a get_question_answers response, read without loading
+        any answers. Returns None if the question does not exist.
+        """
+        answers_limit = answers_limit or settings.ANSWERS_PAGE_SIZE
+
+        version = await self._coalesce(
+            f"{_question_tag(question_id)}:version",
+            lambda: self.get_question_version(question_id),
+            tags=(_question_tag(question_id),),
+        )
+
+        if version is None:
+            return None
+
+        representation = _representation(
+            answers_limit, answers_cursor, fields, answer_fields, preview_chars
+        )
+        return _question_version(question_id, version, representation)
+
+    async def get_question_answers_json(
+        self,
+        question_id: int,
+        answers_limit: Optional[int] = None,
+        answers_cursor: Optional[str] = None,
+        fields: Optional[Fields] = None,
+        answer_fields: Optional[Fields] = None,
+        preview_chars: Optional[int] = None,
+    ) -> Optional[Tuple[str, bytes]]:
+        """get_question_answers serialized to JSON together with its version,
+        served from the cache when one is configured.
+
+        fields picks the question's fields ("answers" covers the answers and
+        their next cursor) and answer_fields those of each answer; both
+        default to all. With preview_chars every text is truncated by the
+        database.
+        """
+        answers_limit = answers_limit or settings.ANSWERS_PAGE_SIZE
+        representation = _representation(
+            answers_limit, answers_cursor, fields, answer_fields, preview_chars
+        )
+
+        async def load() -> Optional[bytes]:
+            loaded = await self._get_question_answers(
+                question_id,
+                answers_limit,
+                answers_cursor,
+                fields,
+                answer_fields,
+                preview_chars,
+            )
+            if loaded is None:
+                return None
+            question, answers, answers_next_cursor = loaded
+            document = {
+                name: getattr(question, name)
+                for name in fields or _QUESTION_COLUMNS
+                if name != "answers"
+            }
+            if fields is None or "answers" in fields:
+                document["answers"] = [_render(ans, answer_fields) for ans in answers]
+                document["answers_next_cursor"] = answers_next_cursor
+            return _pack(
+                _question_version(question_id, question.version, representation),
+                to_json(document),
+            )
+
+        key = f"{_question_tag(question_id)}:{representation}"
+        tags = (_question_tag(question_id),)
+
+        async def read() -> Optional[bytes]:
+            if self.cache is None:
+                return await load()
+            return await self.cache.get_or_load(key, load, tags=tags)
+
+        # Around the cache too, so that a burst of misses on one entry
+        # makes a single query.
+        packed = await self._coalesce(key, read, tags)
+
+        return _unpack(packed) if packed is not None else None
+
+    async def get_question_answers_batch_json(
+        self, question_ids: List[int], answers_limit: Optional[int] = None
+    ) -> bytes:
+        """Several questions, each with its first page of answers, as a JSON
+        QuestionBatch.
+
+        One statement reads everything: the questions by id = ANY(:ids), and
+        a LATERAL subquery per question walks
+        ix_answer_question_id_created_at_id for at most answers_limit answers,
+        BATCH_ANSWERS_PAGE_SIZE without one. Items follow the order of
+        question_ids, and ids with no question are listed under "missing".
+        """
+        answers_limit = answers_limit or settings.BATCH_ANSWERS_PAGE_SIZE
+        answers = (
+            select(*_ANSWER_COLUMNS.values())
+            .where(Answer.question_id == Question.id)
+            .order_by(Answer.created_at, Answer.id)
+            # One extra row tells us whether there is a next page.
+            .limit(answers_limit + 1)
+            .lateral("answers")
+        )
+
+        stmt = (
+            select(
+                *_QUESTION_COLUMNS.values(),
+                *(column.label(f"answer_{column.key}") for column in answers.c),
+            )
+            .select_from(Question)
+            .outerjoin(answers, true())
+            .where(
+                Question.id
+                == any_(bindparam("ids", question_ids, type_=ARRAY(Integer)))
+            )
+            .order_by(Question.id, answers.c.created_at, answers.c.id)
+        )
+        result = await self.session.execute(stmt)
+
+        documents: Dict[int, Dict[str, Any]] = {}
+        for row in result:
+            document = documents.get(row.id)
+            if document is None:
+                document = documents[row.id] = {
+                    **{name: getattr(row, name) for name in _QUESTION_COLUMNS},
+                    "answers": [],
+                    "answers_next_cursor": None,
+                }
+            if row.answer_id is not None:
+                document["answers"].append(
+                    {name: getattr(row, f"answer_{name}") for name in _ANSWER_COLUMNS}
                 )
-                for ans in question.answers
-            ],
+
+        for document in documents.values():
+            if len(document["answers"]) > answers_limit:
+                del document["answers"][answers_limit:]
+                last = document["answers"][-1]
+                document["answers_next_cursor"] = encode_cursor(
+                    last["created_at"], last["id"]
+                )
+
+        requested = list(dict.fromkeys(question_ids))
+        return to_json(
+            {
+                "items": [documents[id] for id in requested if id in documents],
+                "missing": [id for id in requested if id not in documents],
+            }
+        )
+
+    async def search_json(
+        self,
+        query: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        include_answers: bool = False,
+    ) -> Tuple[bytes, Optional[str]]:
+        """Questions, and with include_answers answers, matching query as a
+        JSON array of SearchResult, best ranked first, with the next cursor.
+
+        query uses web search syntax ("quoted phrases", or, -excluded).
+        Matches are found through the GIN indexes on search_vector, and at
+        most SEARCH_MAX_CANDIDATES of the newest per table are ranked with
+        ts_rank. Pages are cut on (rank, type, id), and snippets are only
+        highlighted for the rows of the page. Raises ValueError if the cursor
+        is malformed.
+        """
+        after = decode_rank_cursor(cursor)
+        tsquery = func.websearch_to_tsquery(
+            _SEARCH_CONFIG, bindparam("query", query, type_=String)
+        )
+
+        hits = _search_hits(Question, Question.id, tsquery)
+        if include_answers:
+            answer_hits = _search_hits(Answer, Answer.question_id, tsquery)
+            hits = union_all(select(hits), select(answer_hits)).subquery("hits")
+
+        page = select(hits).order_by(
+            hits.c.rank.desc(), hits.c.type.desc(), hits.c.id.desc()
         )
+        if after:
+            page = page.where(tuple_(hits.c.rank, hits.c.type, hits.c.id) < after)
+        # One extra row tells us whether there is a next page.
+        page = page.limit(limit + 1).subquery("page")
 
-    async def delete_question(self, question_id: int) -> None:
-        stmt = select(Question).where(Question.id == question_id)
+        stmt = select(
+            page.c.type,
+            page.c.id,
+            page.c.question_id,
+            page.c.rank,
+            func.ts_headline(
+                _SEARCH_CONFIG, page.c.text, tsquery, _SEARCH_HEADLINE_OPTIONS
+            ).label("snippet"),
+            page.c.created_at,
+        ).order_by(page.c.rank.desc(), page.c.type.desc(), page.c.id.desc())
         result = await self.session.execute(stmt)
-        question = result.scalar_one_or_none()
+        rows = list(result.all())
 
-        if question:
-            await self.session.delete(question)
-            await self.session.commit()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_rank_cursor(last.rank, last.type, last.id)
+
+        return to_json([row._asdict() for row in rows]), next_cursor
+
+    async def get_most_answered_question_ids(self, limit: int) -> List[int]:
+        """Ids of the questions with the most answers, read from the top of
+        ix_question_answer_count_id rather than by counting answers.
+        """
+        stmt = (
+            select(Question.id)
+            .where(Question.answer_count > 0)
+            .order_by(Question.answer_count.desc(), Question.id.desc())
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+
+        return list(result.scalars().all())
+
+    async def stream_questions_with_answers(
+        self, batch_size: int
+    ) -> AsyncIterator[QuestionWithAnswers]:
+        """Yield every question with all of its answers, in question id order.
+
+        Rows come from a server-side cursor fetched batch_size rows at a time,
+        so only the question currently being assembled is held in memory.
+        """
+        stmt = (
+            select(
+                *_QUESTION_COLUMNS.values(),
+                Answer.id.label("answer_id"),
+                Answer.user_id.label("answer_user_id"),
+                Answer.text.label("answer_text"),
+                Answer.created_at.label("answer_created_at"),
+            )
+            .outerjoin(Answer, Answer.question_id == Question.id)
+            .order_by(Question.id, Answer.created_at, Answer.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream(stmt)
+
+        current: Optional[QuestionWithAnswers] = None
+        async for row in result:
+            if current is None or current.id != row.id:
+                if current is not None:
+                    yield current
+                current = QuestionWithAnswers(
+                    **{name: getattr(row, name) for name in _QUESTION_COLUMNS}
+                )
+            if row.answer_id is not None:
+                current.answers.append(
+                    AnswerModel(
+                        id=row.answer_id,
+                        question_id=row.id,
+                        user_id=row.answer_user_id,
+                        text=row.answer_text,
+                        created_at=row.answer_created_at,
+                    )
+                )
+
+        if current is not None:
+            yield current
+
+    async def delete_question(self, question_id: int) -> Optional[int]:
+        """Delete a question in one statement; the database cascades to its
+        answers. Returns the deleted id, or None if there was no such question.
+        """
+        stmt = (
+            delete(Question)
+            .where(Question.id == question_id)
+            .returning(Question.id)
+            .execution_options(synchronize_session=False)
+        )
+        if settings.ANSWER_FEED_ENABLED:
+            # Ends the question's streams, after any event they already got.
+            stmt = stmt.returning(
+                _feed_notify(
+                    Question.id, Question.version + 1, "question_deleted", true()
+                )
+            )
+        result = await self.session.execute(stmt)
+        deleted_id = result.scalar_one_or_none()
+
+        if deleted_id is not None:
+            await self._invalidate(
+                _question_tag(deleted_id), _question_answers_tag(deleted_id)
+            )
+
+        return deleted_id
 
     async def add_answer(
         self, question_id: int, text: str, user_id: str
     ) -> Optional[AnswerModel]:
-        check_stmt = select(Question).where(Question.id == question_id)
-        check_result = await self.session.execute(check_stmt)
-        if not check_result.scalar_one_or_none():
-            return None
+        """Insert an answer in one round trip.
 
+        A single statement bumps the question's version and answer counters
+        and inserts the row from the UPDATE's RETURNING, so a missing question
+        inserts nothing instead of needing a separate check. The update also
+        locks the question row, which keeps it from being deleted before the
+        insert lands. Returns None if the question does not exist.
+        """
+        bumped = (
+            update(Question)
+            .where(Question.id == question_id)
+            .values(**_answers_added(1))
+            .returning(Question.id, Question.version)
+            .cte("bumped_question")
+        )
+        returning: List[Any] = [Answer]
+        if settings.ANSWER_FEED_ENABLED:
+            returning.append(
+                _feed_notify(
+                    Answer.question_id,
+                    select(bumped.c.version).scalar_subquery(),
+                    "created",
+                    func.json_build_array(Answer.id),
+                )
+            )
         stmt = (
             insert(Answer)
-            .values(question_id=question_id, text=text, user_id=user_id)
-            .returning(Answer)
+            .from_select(
+                ["question_id", "user_id", "text"],
+                select(bumped.c.id, literal(user_id), literal(text)),
+            )
+            .returning(*returning)
         )
         result = await self.session.execute(stmt)
-        answer_row = result.fetchone()
-        answer = answer_row[0]
+        answer = result.scalars().one_or_none()
+
+        if not answer:
+            return None
+
+        await self._invalidate(_question_tag(question_id))
 
         return AnswerModel(
             id=answer.id,
@@ -99,6 +932,191 @@ class Storage:
             created_at=answer.created_at,
         )
 
+    async def add_answers(
+        self, question_id: int, answers: List[AnswerCreate]
+    ) -> Optional[List[AnswerModel]]:
+        """Insert many answers to one question, batched like create_questions.
+
+        The question's version and answer counters are bumped first, which
+        also locks its row so it cannot be deleted while the batches are
+        written. Returns None if the question does not exist.
+        """
+        if not answers:
+            # Nothing changes, so the version, and the ETags and cache
+            # entries built on it, stay as they are.
+            if await self.get_question_version(question_id) is None:
+                return None
+            return []
+
+        bump_stmt = (
+            update(Question)
+            .where(Question.id == question_id)
+            .values(**_answers_added(len(answers)))
+            .returning(Question.version)
+        )
+        bump_result = await self.session.execute(bump_stmt)
+        version = bump_result.scalar_one_or_none()
+        if version is None:
+            return None
+
+        created: List[AnswerModel] = []
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+
+        for start in range(0, len(answers), batch_size):
+            batch = answers[start : start + batch_size]
+            rows = (
+                func.unnest(
+                    bindparam(
+                        "user_ids", [a.user_id for a in batch], type_=ARRAY(String)
+                    ),
+                    bindparam("texts", [a.text for a in batch], type_=ARRAY(String)),
+                )
+                .table_valued("user_id", "text", with_ordinality="ord")
+                .render_derived()
+            )
+            stmt = (
+                insert(Answer)
+                .from_select(
+                    ["question_id", "user_id", "text"],
+                    select(literal(question_id), rows.c.user_id, rows.c.text).order_by(
+                        rows.c.ord
+                    ),
+                )
+                .returning(
+                    Answer.id,
+                    Answer.question_id,
+                    Answer.user_id,
+                    Answer.text,
+                    Answer.created_at,
+                )
+            )
+            result = await self.session.execute(stmt)
+            created.extend(
+                AnswerModel(
+                    id=row.id,
+                    question_id=row.question_id,
+                    user_id=row.user_id,
+                    text=row.text,
+                    created_at=row.created_at,
+                )
+                for row in sorted(result, key=lambda row: row.id)
+            )
+
+        if created:
+            await self._invalidate(_question_tag(question_id))
+            await self._publish(
+                [_feed_payload(question_id, version, [a.id for a in created])]
+            )
+
+        return created
+
+    async def add_answers_grouped(
+        self, answers: List[Tuple[int, AnswerCreate]]
+    ) -> List[Optional[AnswerModel]]:
+        """Insert answers to any number of questions in one statement, for
+        group commit. answers holds (question_id, answer) pairs; the result
+        has the created answer for each, or None where the question does not
+        exist.
+
+        Like add_answer, the questions' versions and counters are updated by
+        the statement that inserts the rows from its RETURNING. The question
+        rows are locked in id order first, so concurrent batches touching the
+        same questions queue up instead of deadlocking.
+        """
+        if not answers:
+            return []
+
+        rows = (
+            func.unnest(
+                bindparam(
+                    "question_ids", [q for q, _ in answers], type_=ARRAY(Integer)
+                ),
+                bindparam(
+                    "user_ids", [a.user_id for _, a in answers], type_=ARRAY(String)
+                ),
+                bindparam("texts", [a.text for _, a in answers], type_=ARRAY(String)),
+            )
+            .table_valued("question_id", "user_id", "text", with_ordinality="ord")
+            .render_derived()
+        )
+        pending = select(rows).cte("pending")
+        counts = (
+            select(pending.c.question_id, func.count().label("count"))
+            .group_by(pending.c.question_id)
+            .cte("counts")
+        )
+        locked = (
+            select(Question.id)
+            .join(counts, Question.id == counts.c.question_id)
+            .order_by(Question.id)
+            .with_for_update()
+            .cte("locked")
+        )
+        bumped = (
+            update(Question)
+            .where(Question.id == counts.c.question_id)
+            .where(Question.id.in_(select(locked.c.id)))
+            .values(**_answers_added(counts.c.count))
+            .returning(Question.id, Question.version)
+            .cte("bumped_questions")
+        )
+        inserted_answers = (
+            insert(Answer)
+            .from_select(
+                ["question_id", "user_id", "text"],
+                select(pending.c.question_id, pending.c.user_id, pending.c.text)
+                .join(bumped, bumped.c.id == pending.c.question_id)
+                .order_by(pending.c.ord),
+            )
+            .returning(*_ANSWER_COLUMNS.values())
+            .cte("inserted_answers")
+        )
+        stmt = select(inserted_answers, bumped.c.version).join(
+            bumped, bumped.c.id == inserted_answers.c.question_id
+        )
+        result = await self.session.execute(stmt)
+        created = sorted(result, key=lambda row: row.id)
+        versions: Dict[int, int] = {}
+        created_ids: Dict[int, List[int]] = {}
+        for row in created:
+            versions[row.question_id] = row.version
+            created_ids.setdefault(row.question_id, []).append(row.id)
+
+        # Ids follow the insert order, which is the order of answers with the
+        # answers to missing questions left out.
+        rows = iter(created)
+        inserted: List[Optional[AnswerModel]] = [
+            (
+                AnswerModel.model_validate(next(rows), from_attributes=True)
+                if question_id in versions
+                else None
+            )
+            for question_id, _ in answers
+        ]
+
+        if versions:
+            existing = sorted(versions)
+            await self._invalidate(*(_question_tag(id) for id in existing))
+            await self._publish(
+                [_feed_payload(id, versions[id], created_ids[id]) for id in existing]
+            )
+
+        return inserted
+
+    async def get_answers_json(self, answer_ids: List[int]) -> bytes:
+        """The answers with the given ids that exist, as a JSON array in id
+        order.
+        """
+        stmt = (
+            select(*_ANSWER_COLUMNS.values())
+            .where(
+                Answer.id == any_(bindparam("ids", answer_ids, type_=ARRAY(Integer)))
+            )
+            .order_by(Answer.id)
+        )
+        result = await self.session.execute(stmt)
+        return to_json([row._asdict() for row in result])
+
     async def get_answer_by_id(self, answer_id: int) -> Optional[Answer]:
         stmt = select(Answer).where(Answer.id == answer_id)
         result = await self.session.execute(stmt)
@@ -108,11 +1126,78 @@ class Storage:
 
         return answer
 
-    async def delete_answer(self, answer_id: int) -> None:
-        stmt = select(Answer).where(Answer.id == answer_id)
+    async def get_answer_by_id_json(
+        self, answer_id: int
+    ) -> Optional[Tuple[str, bytes]]:
+        """get_answer_by_id serialized to JSON together with its version,
+        served from the cache when one is configured.
+        """
+        question_id: Optional[int] = None
+
+        async def load() -> Optional[bytes]:
+            nonlocal question_id
+            stmt = select(*_ANSWER_COLUMNS.values()).where(Answer.id == answer_id)
+            result = await self.session.execute(stmt)
+            answer = result.one_or_none()
+            if answer is None:
+                return None
+            question_id = answer.question_id
+            # Answers are never modified, so the id alone versions them.
+            return _pack(f"a{answer.id}", to_json(answer._asdict()))
+
+        if self.cache is None:
+            packed = await load()
+        else:
+            packed = await self.cache.get_or_load(
+                _answer_tag(answer_id),
+                load,
+                tags=lambda: (
+                    _answer_tag(answer_id),
+                    _question_answers_tag(question_id),
+                ),
+            )
+
+        return _unpack(packed) if packed is not None else None
+
+    async def delete_answer(self, answer_id: int) -> Optional[int]:
+        """Delete an answer and update its question's version and answer
+        counters in one statement. Returns the id of the question it belonged
+        to, or None if there was no such answer.
+        """
+        deleted = (
+            delete(Answer)
+            .where(Answer.id == answer_id)
+            .returning(Answer.id, Answer.question_id)
+            .cte("deleted_answer")
+        )
+        # The statement still sees the deleted row, hence the id filter; the
+        # newest remaining answer is one step on
+        # ix_answer_question_id_created_at_id.
+        last_answer_at = (
+            select(func.max(Answer.created_at))
+            .where(Answer.question_id == deleted.c.question_id)
+            .where(Answer.id != deleted.c.id)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(Question)
+            .where(Question.id == deleted.c.question_id)
+            .values(
+                version=Question.version + 1,
+                answer_count=Question.answer_count - 1,
+                last_answer_at=last_answer_at,
+            )
+            .returning(Question.id)
+            .execution_options(synchronize_session=False)
+        )
+        if settings.ANSWER_FEED_ENABLED:
+            stmt = stmt.returning(
+                _feed_notify(Question.id, Question.version, "deleted", deleted.c.id)
+            )
         result = await self.session.execute(stmt)
-        answer = result.scalar_one_or_none()
+        question_id = result.scalar_one_or_none()
+
+        if question_id is not None:
+            await self._invalidate(_question_tag(question_id), _answer_tag(answer_id))
 
-        if answer:
-            await self.session.delete(answer)
-            await self.session.commit()
+        return question_id
@@ -1,43 +1,103 @@
+import os
 import time
 import traceback
 from contextlib import asynccontextmanager
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-from alembic import command
 from alembic.config import Config
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
 
+from api.admission import STREAM_ROUTES, AdmissionControl, admission_control_options
+from api.deadline import RequestDeadlines
 from api.answers import router as answers_router
+from api.export import router as export_router
 from api.questions import router as questions_router
+from api.search import router as search_router
+from cache.response import ResponseCache, create_response_cache
+from cache.singleflight import SingleFlight
 from config import settings
-from database.connection import close_db, init_db
+import database.connection
+from database.connection import (
+    READ_PRIMARY_COOKIE,
+    close_db,
+    get_db_context,
+    init_db,
+)
+from database.deadline import is_statement_timeout
+from database.feed import AnswerFeed
+from database.group_commit import AnswerBatcher
+from database.schema import ensure_schema_current
+from database.storage import Storage
+from monitoring.metrics import (
+    REQUEST_DB_DURATION,
+    REQUEST_DB_QUERIES,
+    REQUEST_DURATION,
+    REQUESTS_IN_PROGRESS,
+    RESPONSES,
+    mark_process_dead,
+    render_metrics,
+    route_template,
+)
+from monitoring.profiling import RequestProfiler
+from monitoring.queries import server_timing, track_request
+
+_READ_METHODS = {"GET", "HEAD", "OPTIONS"}
 
 
 async def _run_migrations() -> None:
-    """Run Alembic migrations."""
+    """Run Alembic migrations unless disabled or already applied."""
+    if not settings.DB_MIGRATE_ON_STARTUP:
+        logger.info("Database migrations on startup are disabled")
+        return
+
+    start = time.perf_counter()
     try:
-        logger.info("Running database migrations...")
-        alembic_cfg = Config("alembic.ini")
-        command.upgrade(alembic_cfg, "head")
-        logger.info("Database migrations completed successfully")
+        upgraded = await ensure_schema_current(
+            database.connection.engine, Config("alembic.ini")
+        )
     except Exception as e:
         logger.error(f"Failed to run migrations: {e}")
         raise
 
+    elapsed = time.perf_counter() - start
+    if upgraded:
+        logger.info(f"Database migrations completed in {elapsed:.2f}s")
+    else:
+        logger.info(f"Database schema is current, checked in {elapsed:.3f}s")
+
 
 async def _startup_db() -> None:
     try:
-        await _run_migrations()
         await init_db()
         logger.info("Database connections initialized")
+        await _run_migrations()
     except Exception as e:
         logger.error(f"Failed to initialize databases: {e}")
         raise
 
 
+async def _warm_up_cache(cache: Optional[ResponseCache]) -> None:
+    """Preload the most answered questions into the response cache."""
+    if cache is None or settings.CACHE_WARMUP_TOP_N <= 0:
+        return
+
+    try:
+        async with get_db_context() as session:
+            storage = Storage(session, cache=cache)
+            question_ids = await storage.get_most_answered_question_ids(
+                settings.CACHE_WARMUP_TOP_N
+            )
+            for question_id in question_ids:
+                await storage.get_question_answers_json(question_id)
+        logger.info(f"Cache warmed up with {len(question_ids)} questions")
+    except Exception as e:
+        logger.warning(f"Failed to warm up cache: {e}")
+
+
 async def _shutdown_db() -> None:
     """Close database connections."""
     await close_db()
@@ -49,13 +109,25 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager."""
 
     logger.info("Starting application...")
+    start = time.perf_counter()
     await _startup_db()
+    if app.state.cache is not None:
+        await app.state.cache.start()
+        await _warm_up_cache(app.state.cache)
+    logger.info(f"Application started in {time.perf_counter() - start:.2f}s")
 
     yield
 
     logger.info("Shutting down application...")
 
+    if app.state.answer_feed is not None:
+        await app.state.answer_feed.close()
+    if app.state.answer_batcher is not None:
+        await app.state.answer_batcher.close()
+    if app.state.cache is not None:
+        await app.state.cache.close()
     await _shutdown_db()
+    mark_process_dead(os.getpid())
 
 
 def create_app() -> FastAPI:
@@ -67,6 +139,32 @@ def create_app() -> FastAPI:
         description="Question and Answer application",
         version="1.0.0",
     )
+    app.state.cache = create_response_cache(settings)
+    # A read cancelled by the leader's own deadline is rerun by the requests
+    # waiting for it, whose deadlines may be further out.
+    app.state.flights = (
+        SingleFlight(leader_error=is_statement_timeout)
+        if settings.READ_COALESCING_ENABLED
+        else None
+    )
+    app.state.answer_batcher = None
+    if settings.ANSWER_GROUP_COMMIT_ENABLED:
+        app.state.answer_batcher = AnswerBatcher(
+            max_batch=settings.ANSWER_GROUP_COMMIT_MAX_BATCH,
+            max_linger=settings.ANSWER_GROUP_COMMIT_MAX_LINGER_SECONDS,
+            cache=app.state.cache,
+            flights=app.state.flights,
+        )
+
+    app.state.answer_feed = None
+    if settings.ANSWER_FEED_ENABLED:
+        app.state.answer_feed = AnswerFeed(
+            settings.DATABASE_URL,
+            max_subscribers=settings.ANSWER_FEED_MAX_SUBSCRIBERS,
+            queue_size=settings.ANSWER_FEED_QUEUE_SIZE,
+            heartbeat=settings.ANSWER_FEED_HEARTBEAT_SECONDS,
+            cache=app.state.cache,
+        )
 
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
@@ -77,35 +175,99 @@ def create_app() -> FastAPI:
             status_code=500, content={"detail": "Internal server error"}
         )
 
+    admission = admission_control_options(settings)
+    if admission is not None:
+        # Added first so it runs innermost: shed requests still show up in
+        # the request metrics and get CORS headers.
+        app.add_middleware(AdmissionControl, **admission)
+
+    # Outside admission control, so that time spent queued counts against the
+    # deadline and a client hanging up while queued gives up its place.
+    app.add_middleware(
+        RequestDeadlines,
+        default_timeout=settings.REQUEST_TIMEOUT_SECONDS,
+        route_timeouts=settings.REQUEST_TIMEOUT_ROUTES,
+        max_timeout=settings.REQUEST_TIMEOUT_MAX_SECONDS,
+    )
+
     @app.middleware("http")
     async def monitoring_middleware(request: Request, call_next):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        route = route_template(request.scope)
+        in_progress = REQUESTS_IN_PROGRESS.labels(request.method, route)
+        queries = track_request(route)
+        status_code = 500
 
         logger.debug(f"Request started: {request.method} {request.url.path}")
 
+        in_progress.inc()
         try:
             response = await call_next(request)
-
-            process_time = time.time() - start_time
-            if process_time > 5:
+            status_code = response.status_code
+
+            process_time = time.perf_counter() - start_time
+            if settings.SERVER_TIMING_ENABLED:
+                response.headers["Server-Timing"] = server_timing(queries, process_time)
+            if settings.DB_STATEMENT_BUDGET and (
+                queries.count > settings.DB_STATEMENT_BUDGET
+            ):
                 logger.warning(
-                    f"Slow request: {request.method} {request.url.path} "
-                    f"took {process_time:.2f}s"
+                    f"Statement budget exceeded: {request.method} {route} issued "
+                    f"{queries.count} SQL statements "
+                    f"(budget {settings.DB_STATEMENT_BUDGET}) - possible N+1"
+                )
+            if status_code == 504:
+                logger.warning(
+                    f"Request timed out: {request.method} {request.url.path} "
+                    f"after {process_time:.2f}s"
                 )
             elif process_time > 30:
                 logger.error(
                     f"Very slow request: {request.method} {request.url.path} "
                     f"took {process_time:.2f}s - consider optimizing"
                 )
+            elif process_time > 5:
+                logger.warning(
+                    f"Slow request: {request.method} {request.url.path} "
+                    f"took {process_time:.2f}s"
+                )
 
             return response
         except Exception as e:
-            process_time = time.time() - start_time
+            process_time = time.perf_counter() - start_time
             logger.error(
                 f"Request failed: {request.method} {request.url.path} "
                 f"after {process_time:.2f}s - Error: {e}"
             )
             raise
+        finally:
+            in_progress.dec()
+            REQUEST_DURATION.labels(request.method, route).observe(
+                time.perf_counter() - start_time
+            )
+            RESPONSES.labels(request.method, route, str(status_code)).inc()
+            REQUEST_DB_QUERIES.labels(request.method, route).observe(queries.count)
+            REQUEST_DB_DURATION.labels(request.method, route).observe(queries.seconds)
+
+    @app.middleware("http")
+    async def read_your_writes_middleware(request: Request, call_next):
+        response = await call_next(request)
+
+        if (
+            settings.DB_REPLICA_URLS
+            and request.method not in _READ_METHODS
+            and response.status_code < 400
+        ):
+            window = settings.DB_READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                READ_PRIMARY_COOKIE,
+                f"{time.time() + window:.3f}",
+                max_age=max(int(window), 1),
+                httponly=True,
+                samesite="lax",
+            )
+
+        return response
 
     _configure_middleware(app)
     _register_routes(app)
@@ -116,20 +278,50 @@ def create_app() -> FastAPI:
 def _configure_middleware(app: FastAPI) -> None:
     """Configure application middleware."""
 
+    if settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE > 0:
+        # Only installed when enabled, so it costs nothing otherwise.
+        app.add_middleware(
+            BaseHTTPMiddleware,
+            dispatch=RequestProfiler(
+                token=settings.PROFILING_TOKEN,
+                sample_rate=settings.PROFILING_SAMPLE_RATE,
+                output_dir=settings.PROFILING_OUTPUT_DIR,
+                skip_routes=(*STREAM_ROUTES, "GET /export/questions.ndjson"),
+            ),
+        )
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.allowed_origins,
         allow_credentials=True,
         allow_methods=["GET", "POST", "OPTIONS"],
-        allow_headers=["Content-Type", "X-Requested-With", "Accept", "Origin"],
+        allow_headers=[
+            "Content-Type",
+            "X-Requested-With",
+            "X-Request-Timeout",
+            "Accept",
+            "Origin",
+            "If-None-Match",
+        ],
+        expose_headers=[
+            "ETag",
+            "X-Next-Cursor",
+            "X-Total-Count-Estimate",
+            "Server-Timing",
+            "Retry-After",
+        ],
     )
 
 
 def _register_routes(app: FastAPI) -> None:
     """Register application routes."""
     app.add_api_route("/health", health_check, methods=["GET"])
+    app.add_api_route("/cache/stats", cache_stats, methods=["GET"])
+    app.add_api_route("/metrics", metrics, methods=["GET"])
     app.include_router(questions_router)
     app.include_router(answers_router)
+    app.include_router(export_router)
+    app.include_router(search_router)
 
 
 async def health_check() -> Dict[str, Any]:
@@ -139,4 +331,19 @@ async def health_check() -> Dict[str, Any]:
     }
 
 
+async def cache_stats(request: Request) -> Dict[str, Any]:
+    """Response cache counters."""
+    cache: Optional[ResponseCache] = request.app.state.cache
+    if cache is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **cache.stats()}
+
+
+async def metrics() -> Response:
+    """Prometheus metrics, aggregated across workers in multiprocess mode."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 app = create_app()
@@ -0,0 +1,30 @@
+"""Question version
+
+Revision ID: 1239bbdacb93
+Revises: 6ffef66b72d4
+Create Date: 2026-10-17 13:48:52.106733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1239bbdacb93'
+down_revision: Union[str, Sequence[str], None] = '6ffef66b72d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default is stored in the catalog, so existing rows are not
+    # rewritten.
+    op.add_column('question', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('question', 'version')
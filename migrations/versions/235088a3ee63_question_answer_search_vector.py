@@ -0,0 +1,35 @@
+"""Question answer search vector
+
+Revision ID: 235088a3ee63
+Revises: 1239bbdacb93
+Create Date: 2026-10-17 15:02:37.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '235088a3ee63'
+down_revision: Union[str, Sequence[str], None] = '1239bbdacb93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the table under an exclusive
+    # lock; on a large database, run this in a maintenance window.
+    for table in ('question', 'answer'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('english'::regconfig, text)", persisted=True), nullable=True))
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('answer', 'question'):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table, postgresql_using='gin')
+        op.drop_column(table, 'search_vector')
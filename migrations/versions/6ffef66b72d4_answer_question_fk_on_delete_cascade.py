@@ -0,0 +1,30 @@
+"""Answer question FK on delete cascade
+
+Revision ID: 6ffef66b72d4
+Revises: f8dd69ac4a45
+Create Date: 2026-10-17 11:26:05.817342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6ffef66b72d4'
+down_revision: Union[str, Sequence[str], None] = 'f8dd69ac4a45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('answer_question_id_fkey', 'answer', type_='foreignkey')
+    op.create_foreign_key('answer_question_id_fkey', 'answer', 'question', ['question_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('answer_question_id_fkey', 'answer', type_='foreignkey')
+    op.create_foreign_key('answer_question_id_fkey', 'answer', 'question', ['question_id'], ['id'])
@@ -0,0 +1,48 @@
+"""Question answer count and last answer at
+
+Revision ID: b771db061458
+Revises: 235088a3ee63
+Create Date: 2026-10-17 16:21:08.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b771db061458'
+down_revision: Union[str, Sequence[str], None] = '235088a3ee63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('question', sa.Column('answer_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('question', sa.Column('last_answer_at', sa.DateTime(), nullable=True))
+    # Backfill from the answers in one pass; from here on the statements
+    # that add and delete answers keep both columns current.
+    op.execute(
+        """
+        UPDATE question
+        SET answer_count = counts.answer_count, last_answer_at = counts.last_answer_at
+        FROM (
+            SELECT question_id, count(*) AS answer_count, max(created_at) AS last_answer_at
+            FROM answer
+            GROUP BY question_id
+        ) AS counts
+        WHERE question.id = counts.question_id
+        """
+    )
+    op.create_index('ix_question_answer_count_id', 'question', ['answer_count', 'id'], unique=False)
+    op.create_index('ix_question_activity_id', 'question', [sa.text('coalesce(last_answer_at, created_at)'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_question_activity_id', table_name='question')
+    op.drop_index('ix_question_answer_count_id', table_name='question')
+    op.drop_column('question', 'last_answer_at')
+    op.drop_column('question', 'answer_count')
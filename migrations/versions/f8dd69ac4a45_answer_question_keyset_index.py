@@ -0,0 +1,28 @@
+"""Answer question keyset index
+
+Revision ID: f8dd69ac4a45
+Revises: fdbcdaa0b7bf
+Create Date: 2026-10-17 10:03:17.284601
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8dd69ac4a45'
+down_revision: Union[str, Sequence[str], None] = 'fdbcdaa0b7bf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_answer_question_id_created_at_id', 'answer', ['question_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_answer_question_id_created_at_id', table_name='answer')
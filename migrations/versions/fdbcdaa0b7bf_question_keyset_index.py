@@ -0,0 +1,28 @@
+"""Question keyset index
+
+Revision ID: fdbcdaa0b7bf
+Revises: 4496c48aeb04
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fdbcdaa0b7bf'
+down_revision: Union[str, Sequence[str], None] = '4496c48aeb04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_question_created_at_id', 'question', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_question_created_at_id', table_name='question')
@@ -1,16 +1,36 @@
 from sqlalchemy import (
     Column,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# Text search configuration of the search_vector columns. Queries have to use
+# the same one for the GIN indexes to apply.
+SEARCH_CONFIG = "english"
+
+
+def _search_vector() -> Column:
+    # Stored and kept up to date by Postgres; deferred so that loading an
+    # entity does not drag it along.
+    return deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"to_tsvector('{SEARCH_CONFIG}'::regconfig, text)", persisted=True
+            ),
+        )
+    )
+
 
 class Question(Base):
     __tablename__ = "question"
@@ -18,9 +38,30 @@ class Question(Base):
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    # Bumped whenever an answer is added or removed; drives ETags.
+    version = Column(Integer, nullable=False, server_default="1")
+    # Maintained by the statements that add and delete answers, so list views
+    # need no COUNT(*) or MAX() over answer.
+    answer_count = Column(Integer, nullable=False, server_default="0")
+    last_answer_at = Column(DateTime, nullable=True)
+    search_vector = _search_vector()
 
     answers = relationship(
-        "Answer", back_populates="question", cascade="all, delete-orphan"
+        "Answer",
+        back_populates="question",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        Index("ix_question_created_at_id", "created_at", "id"),
+        Index("ix_question_answer_count_id", "answer_count", "id"),
+        Index(
+            "ix_question_activity_id",
+            func.coalesce(last_answer_at, created_at),
+            "id",
+        ),
+        Index("ix_question_search_vector", "search_vector", postgresql_using="gin"),
     )
 
 
@@ -28,9 +69,17 @@ class Answer(Base):
     __tablename__ = "answer"
 
     id = Column(Integer, primary_key=True, index=True)
-    question_id = Column(Integer, ForeignKey("question.id"), nullable=False)
+    question_id = Column(
+        Integer, ForeignKey("question.id", ondelete="CASCADE"), nullable=False
+    )
     user_id = Column(String, nullable=False)
     text = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+    search_vector = _search_vector()
 
     question = relationship("Question", back_populates="answers")
+
+    __table_args__ = (
+        Index("ix_answer_question_id_created_at_id", "question_id", "created_at", "id"),
+        Index("ix_answer_search_vector", "search_vector", postgresql_using="gin"),
+    )
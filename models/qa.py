@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Literal, Optional
 
 from pydantic import BaseModel
 
@@ -7,6 +8,8 @@ class Question(BaseModel):
     id: int
     text: str
     created_at: datetime
+    answer_count: int = 0
+    last_answer_at: Optional[datetime] = None
 
 
 class Answer(BaseModel):
@@ -19,3 +22,47 @@ class Answer(BaseModel):
 
 class QuestionWithAnswers(Question):
     answers: list[Answer] = []
+    answers_next_cursor: Optional[str] = None
+
+
+class QuestionBatch(BaseModel):
+    items: list[QuestionWithAnswers] = []
+    missing: list[int] = []
+
+
+class QuestionPage(BaseModel):
+    items: list[Question] = []
+    next_cursor: Optional[str] = None
+
+
+class SearchResult(BaseModel):
+    type: Literal["question", "answer"]
+    id: int
+    question_id: int
+    rank: float
+    snippet: str
+    created_at: datetime
+
+
+class QuestionCreate(BaseModel):
+    text: str
+
+
+class AnswerCreate(BaseModel):
+    user_id: str
+    text: str
+
+
+class BulkItemError(BaseModel):
+    index: int
+    error: str
+
+
+class QuestionBulkResult(BaseModel):
+    created: list[Question] = []
+    errors: list[BulkItemError] = []
+
+
+class AnswerBulkResult(BaseModel):
+    created: list[Answer] = []
+    errors: list[BulkItemError] = []
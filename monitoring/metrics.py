@@ -0,0 +1,208 @@
+import os
+import time
+from typing import Any, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.routing import Match
+from starlette.types import Scope
+
+from monitoring.queries import record_statement
+
+# With PROMETHEUS_MULTIPROC_DIR set before start-up, every worker writes its
+# samples to mmap'ed files in that directory and /metrics, served by any one
+# of them, aggregates all of them. Without it, values live in this process.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_DURATION = Histogram(
+    "qa_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "qa_http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+RESPONSES = Counter(
+    "qa_http_responses_total",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "qa_http_request_db_queries",
+    "SQL statements issued per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_DURATION = Histogram(
+    "qa_http_request_db_seconds",
+    "Time spent executing SQL per request",
+    ["method", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+
+DB_QUERIES = Counter("qa_db_queries_total", "SQL statements executed", ["database"])
+DB_QUERY_ERRORS = Counter(
+    "qa_db_query_errors_total", "SQL statements that raised", ["database"]
+)
+DB_QUERY_DURATION = Histogram(
+    "qa_db_query_duration_seconds",
+    "SQL statement execution time",
+    ["database"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "qa_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "qa_db_pool_overflow",
+    "Connections open beyond DB_POOL_SIZE",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "qa_db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["database"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+CACHE_REQUESTS = Counter(
+    "qa_cache_requests_total",
+    "Response cache lookups by result (hit, miss, early_refresh)",
+    ["result"],
+)
+CACHE_ERRORS = Counter("qa_cache_errors_total", "Response cache backend failures")
+
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "qa_single_flight_requests_total",
+    "Coalesced reads by result (leader ran the read, coalesced shared its result)",
+    ["result"],
+)
+
+ADMISSION_REJECTED = Counter(
+    "qa_admission_rejected_total",
+    "Requests shed by admission control, by route class and reason "
+    "(queue_full, timeout, rate_limited)",
+    ["route_class", "reason"],
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "qa_admission_queue_wait_seconds",
+    "Time requests waited for an admission slot",
+    ["route_class"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+_UNMATCHED_ROUTE = "<unmatched>"
+_UNLABELLED_DATABASE = "unknown"
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited. The database
+    label is set by instrument_engine().
+    """
+
+    database = _UNLABELLED_DATABASE
+
+    def recreate(self) -> "InstrumentedPool":
+        pool = super().recreate()
+        pool.database = self.database
+        return pool
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self.database).observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine, database: str) -> None:
+    """Count statements and track pool usage of engine under the given
+    database label.
+    """
+    sync_engine = engine.sync_engine
+    if isinstance(sync_engine.pool, InstrumentedPool):
+        sync_engine.pool.database = database
+    checked_out = DB_POOL_CHECKED_OUT.labels(database)
+    overflow = DB_POOL_OVERFLOW.labels(database)
+    queries = DB_QUERIES.labels(database)
+    errors = DB_QUERY_ERRORS.labels(database)
+    duration = DB_QUERY_DURATION.labels(database)
+
+    def record_checkout(*args: Any) -> None:
+        checked_out.inc()
+        # Read through the engine: dispose() replaces its pool.
+        overflow.set(max(sync_engine.pool.overflow(), 0))
+
+    def record_checkin(*args: Any) -> None:
+        # Fires before the connection is back in the pool, so the pool's own
+        # counts would still include it.
+        checked_out.dec()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        context._qa_query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - context._qa_query_start
+        queries.inc()
+        duration.observe(elapsed)
+        record_statement(conn, statement, parameters, many, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        queries.inc()
+        errors.inc()
+
+    event.listen(sync_engine, "checkout", record_checkout)
+    event.listen(sync_engine, "checkin", record_checkin)
+
+
+def route_template(scope: Scope) -> str:
+    """The path template of the route that will handle scope, e.g.
+    "/question/{id}", so that labels do not grow with every id requested.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", _UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial is None:
+            partial = route
+    # Same path, other method: answered with 405 by that route.
+    return getattr(partial, "path", _UNMATCHED_ROUTE)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop the live gauges of a worker that is exiting."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
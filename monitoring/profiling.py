@@ -0,0 +1,129 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from loguru import logger
+
+from monitoring.metrics import route_template
+
+PROFILE_HEADER = "X-Profile"
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    """Middleware running selected requests under cProfile.
+
+    A request is profiled when it carries PROFILE_HEADER set to token, or at
+    random with probability sample_rate. With output_dir set the profile is
+    saved there as a .pstats file (open it with pstats, snakeviz, or convert
+    it for speedscope) and named in the X-Profile-File response header;
+    without it, a header-triggered request gets the report instead of its
+    body, which is handy locally.
+
+    cProfile sees the whole event loop, so requests running concurrently show
+    up in the profile too, and only one request is profiled at a time.
+
+    Profiling reads the whole body before sending it, so streamed responses
+    are never profiled: routes in skip_routes ("GET /export/questions.ndjson")
+    are passed through, and so is any text/event-stream response, whose
+    profile is dropped.
+    """
+
+    def __init__(
+        self,
+        token: str = "",
+        sample_rate: float = 0.0,
+        output_dir: str = "",
+        skip_routes: Iterable[str] = (),
+    ):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.skip_routes = frozenset(skip_routes)
+        self._active = asyncio.Lock()
+
+    async def __call__(
+        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        requested = self._requested(request)
+        sampled = (
+            not requested
+            and self.output_dir
+            and self.sample_rate > 0
+            and random.random() < self.sample_rate
+        )
+        if not (requested or sampled) or self._active.locked():
+            return await call_next(request)
+        if f"{request.method} {route_template(request.scope)}" in self.skip_routes:
+            return await call_next(request)
+
+        async with self._active:
+            return await self._profile(request, call_next, inline=not self.output_dir)
+
+    def _requested(self, request: Request) -> bool:
+        header: Optional[str] = request.headers.get(PROFILE_HEADER)
+        return bool(self.token and header) and hmac.compare_digest(
+            header.encode(), self.token.encode()
+        )
+
+    async def _profile(
+        self,
+        request: Request,
+        call_next: Callable[[Request], Awaitable[Response]],
+        inline: bool,
+    ) -> Response:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await call_next(request)
+            if response.headers.get("content-type", "").startswith("text/event-stream"):
+                # Never ends, so it cannot be drained into the profile.
+                return response
+            # Drain the body inside the profile: streamed responses do their
+            # work while it is being read.
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            profiler.disable()
+
+        if inline:
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+            return Response(
+                content=report.getvalue(),
+                media_type="text/plain",
+                headers={"X-Profiled-Status": str(response.status_code)},
+            )
+
+        path = os.path.join(self.output_dir, self._filename(request))
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            profiler.dump_stats(path)
+            logger.info(f"Profiled {request.method} {request.url.path} into {path}")
+        except OSError as e:
+            logger.warning(f"Failed to write profile {path}: {e}")
+            path = ""
+
+        profiled = Response(content=body, status_code=response.status_code)
+        profiled.raw_headers = [
+            (name, value)
+            for name, value in response.raw_headers
+            if name != b"content-length"
+        ] + [(b"content-length", str(len(body)).encode())]
+        if path:
+            profiled.headers["X-Profile-File"] = os.path.basename(path)
+        return profiled
+
+    @staticmethod
+    def _filename(request: Request) -> str:
+        route = _UNSAFE_FILENAME.sub("_", route_template(request.scope)).strip("_")
+        return f"{time.time():.6f}-{request.method}-{route or 'root'}.pstats"
@@ -0,0 +1,117 @@
+import random
+import re
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from loguru import logger
+
+from config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Calls to volatile functions whose effects outlive a rolled back savepoint,
+# or that should not happen twice: EXPLAIN ANALYZE would run them again.
+_SIDE_EFFECTS = re.compile(
+    r"\b(?:pg_(?:try_)?advisory\w*|pg_notify|nextval|setval|set_config|pg_sleep"
+    r"|pg_cancel_backend|pg_terminate_backend|lo_\w+|dblink\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+class RequestQueries:
+    """SQL statements issued on behalf of one request."""
+
+    __slots__ = ("route", "count", "seconds")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "qa_request_queries", default=None
+)
+
+
+def track_request(route: str) -> RequestQueries:
+    """Attribute statements run from the current context (and the tasks it
+    spawns, such as the endpoint behind call_next) to a new RequestQueries.
+    """
+    queries = RequestQueries(route)
+    _current.set(queries)
+    return queries
+
+
+def server_timing(queries: RequestQueries, total_seconds: float) -> str:
+    """Server-Timing header value for a finished request."""
+    return (
+        f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries", '
+        f"total;dur={total_seconds * 1000:.2f}"
+    )
+
+
+def record_statement(
+    conn: Any, statement: str, parameters: Any, many: bool, seconds: float
+) -> None:
+    """Account a finished statement to the current request and log it if it
+    was slow. Runs in after_cursor_execute, inside the connection's greenlet.
+    """
+    queries = _current.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += seconds
+
+    if not settings.DB_SLOW_QUERY_SECONDS or seconds < settings.DB_SLOW_QUERY_SECONDS:
+        return
+
+    route = queries.route if queries is not None else "-"
+    logger.warning(
+        f"Slow query: {seconds * 1000:.1f} ms during {route}: "
+        f"{_WHITESPACE.sub(' ', statement).strip()}"
+    )
+    if (
+        queries is not None
+        and not many
+        and settings.DB_SLOW_QUERY_EXPLAIN_RATE > 0
+        and random.random() < settings.DB_SLOW_QUERY_EXPLAIN_RATE
+        and _explainable(statement)
+    ):
+        plan = _explain(conn, statement, parameters)
+        if plan:
+            logger.warning(f"Slow query plan:\n{plan}")
+
+
+def _explainable(statement: str) -> bool:
+    """Whether statement can safely be run again by EXPLAIN ANALYZE: a
+    SELECT calling no function with lasting side effects.
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    return _SIDE_EFFECTS.search(statement) is None
+
+
+def _explain(conn: Any, statement: str, parameters: Any) -> Optional[str]:
+    """EXPLAIN (ANALYZE, BUFFERS) statement on the same connection.
+
+    Only statements passing _explainable get here, since ANALYZE runs the
+    statement again. It goes through a separate DBAPI cursor, so the caller's
+    results and the engine events are left alone, and inside a savepoint that
+    is always rolled back, so neither a failure nor anything the second run
+    changed reaches the caller's transaction.
+    """
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT qa_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT qa_explain")
+            cursor.execute("RELEASE SAVEPOINT qa_explain")
+        return plan
+    except Exception as e:
+        logger.warning(f"Failed to explain slow query: {e}")
+        return None
+    finally:
+        cursor.close()
@@ -0,0 +1,338 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from httpx import AsyncClient
+
+from api.admission import AdmissionControl, ConcurrencyLimit, TokenBuckets
+from config import settings
+from database.connection import get_db, get_read_db
+from database.storage import Storage
+from main import create_app
+
+
+@asynccontextmanager
+async def _client(db_session):
+    app = create_app()
+
+    async def override_get_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+
+
+class Streaming:
+    """An ASGI app sending its first chunk, then the rest once finished is set."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.started = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"1", "more_body": True})
+        self.started.set()
+        await self.finished.wait()
+        if self.error is not None:
+            raise self.error
+        await send({"type": "http.response.body", "body": b"2"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _discard(message):
+    pass
+
+
+def _scope(app, path):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 1234),
+        "app": app,
+    }
+
+
+class Clock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.unit
+class TestConcurrencyLimit:
+    """Test the bounded concurrency limit."""
+
+    @pytest.mark.asyncio
+    async def test_acquire_below_limit(self):
+        """Test slots below the limit are taken without waiting."""
+        limit = ConcurrencyLimit(2, max_queue=0)
+
+        assert await limit.acquire(timeout=0) is None
+        assert await limit.acquire(timeout=0) is None
+        assert await limit.acquire(timeout=1) == "queue_full"
+        assert limit.in_use == 2
+
+    @pytest.mark.asyncio
+    async def test_waiters_served_in_order(self):
+        """Test a released slot goes to the longest waiting caller."""
+        limit = ConcurrencyLimit(1, max_queue=2)
+        await limit.acquire(timeout=0)
+        order = []
+
+        async def wait(name):
+            assert await limit.acquire(timeout=5) is None
+            order.append(name)
+
+        first = asyncio.create_task(wait("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(wait("second"))
+        await asyncio.sleep(0)
+        assert limit.queued == 2
+        assert await limit.acquire(timeout=5) == "queue_full"
+
+        limit.release()
+        await first
+        limit.release()
+        await second
+
+        assert order == ["first", "second"]
+        assert limit.in_use == 1
+        assert limit.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_wait_times_out(self):
+        """Test a caller gives up after the timeout and leaves the queue."""
+        limit = ConcurrencyLimit(1, max_queue=1)
+        await limit.acquire(timeout=0)
+
+        assert await limit.acquire(timeout=0.01) == "timeout"
+        assert limit.queued == 0
+
+        limit.release()
+        assert limit.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test a cancelled waiter is not handed a slot."""
+        limit = ConcurrencyLimit(1, max_queue=1)
+        await limit.acquire(timeout=0)
+
+        waiter = asyncio.create_task(limit.acquire(timeout=5))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limit.release()
+
+        assert limit.in_use == 0
+        assert limit.queued == 0
+
+
+@pytest.mark.unit
+class TestTokenBuckets:
+    """Test the per-client token buckets."""
+
+    def test_burst_then_refill(self):
+        """Test a client gets burst requests at once, then one per refill."""
+        clock = Clock()
+        buckets = TokenBuckets(rate=2, burst=3, max_clients=10, clock=clock)
+
+        assert [buckets.take("a") for _ in range(3)] == [0, 0, 0]
+        assert buckets.take("a") == pytest.approx(0.5)
+
+        clock.now += 0.5
+        assert buckets.take("a") == 0
+        assert buckets.take("a") > 0
+
+    def test_clients_limited_separately(self):
+        """Test one client using up its tokens does not limit another."""
+        buckets = TokenBuckets(rate=1, burst=1, max_clients=10, clock=Clock())
+
+        assert buckets.take("a") == 0
+        assert buckets.take("a") > 0
+        assert buckets.take("b") == 0
+
+    def test_least_recent_client_forgotten(self):
+        """Test only max_clients buckets are kept."""
+        buckets = TokenBuckets(rate=1, burst=1, max_clients=2, clock=Clock())
+
+        buckets.take("a")
+        buckets.take("b")
+        buckets.take("c")
+
+        assert buckets.take("a") == 0
+        assert buckets.take("c") > 0
+
+
+@pytest.mark.api
+class TestAdmissionControl:
+    """Test admission control of API requests."""
+
+    def test_disabled_by_default(self, app):
+        """Test no admission middleware is installed unless configured."""
+        assert not any(
+            middleware.cls is AdmissionControl for middleware in app.user_middleware
+        )
+
+    def test_limits_derived_from_pool(self, monkeypatch):
+        """Test reads and writes share the pool connections between them."""
+        monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+        monkeypatch.setattr(settings, "DB_POOL_SIZE", 15)
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 5)
+        monkeypatch.setattr(settings, "ADMISSION_WRITE_SHARE", 0.3)
+
+        app = create_app()
+        options = next(
+            middleware.kwargs
+            for middleware in app.user_middleware
+            if middleware.cls is AdmissionControl
+        )
+
+        assert options["write_limit"].limit == 6
+        assert options["read_limit"].limit == 14
+        assert options["read_limit"].max_queue == 14
+        assert options["rate_limit"] is None
+
+    @pytest.mark.asyncio
+    async def test_slot_held_until_body_sent(self, app):
+        """Test a streamed response keeps its slot until its last chunk."""
+        limit = ConcurrencyLimit(1, max_queue=0)
+        streaming = Streaming()
+        admission = AdmissionControl(
+            streaming,
+            read_limit=limit,
+            write_limit=None,
+            queue_timeout=0,
+            retry_after=1,
+            stream_routes=["GET /question/{id}/stream"],
+        )
+
+        request = asyncio.create_task(
+            admission(_scope(app, "/export/questions.ndjson"), _receive, _discard)
+        )
+        await streaming.started.wait()
+        assert limit.in_use == 1
+        streaming.finished.set()
+        await request
+        assert limit.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_route_releases_after_first_chunk(self, app):
+        """Test a long-lived stream gives its slot back once it has started."""
+        limit = ConcurrencyLimit(1, max_queue=0)
+        streaming = Streaming()
+        admission = AdmissionControl(
+            streaming,
+            read_limit=limit,
+            write_limit=None,
+            queue_timeout=0,
+            retry_after=1,
+            stream_routes=["GET /question/{id}/stream"],
+        )
+
+        request = asyncio.create_task(
+            admission(_scope(app, "/question/1/stream"), _receive, _discard)
+        )
+        await streaming.started.wait()
+        assert limit.in_use == 0
+        streaming.finished.set()
+        await request
+
+    @pytest.mark.asyncio
+    async def test_slot_released_on_error(self, app):
+        """Test a request failing mid-body gives its slot back."""
+        limit = ConcurrencyLimit(1, max_queue=0)
+        streaming = Streaming(error=RuntimeError("boom"))
+        admission = AdmissionControl(
+            streaming,
+            read_limit=limit,
+            write_limit=None,
+            queue_timeout=0,
+            retry_after=1,
+        )
+        streaming.finished.set()
+
+        with pytest.raises(RuntimeError):
+            await admission(_scope(app, "/export/questions.ndjson"), _receive, _discard)
+        assert limit.in_use == 0
+
+    @pytest.mark.asyncio
+    async def test_writes_shed_without_starving_reads(
+        self, db_session, monkeypatch
+    ):
+        """Test excess writes get 503 while reads are still served."""
+        monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+        monkeypatch.setattr(settings, "ADMISSION_WRITE_CONCURRENCY", 1)
+        monkeypatch.setattr(settings, "ADMISSION_READ_CONCURRENCY", 1)
+        monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 1)
+        monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_SECONDS", 5.0)
+        monkeypatch.setattr(settings, "ADMISSION_RETRY_AFTER_SECONDS", 2)
+
+        async with _client(db_session) as client:
+            response = await client.post("/question/", params={"text": "Existing"})
+            question_id = response.json()["id"]
+
+            released = asyncio.Event()
+            create = Storage.create_question
+
+            async def gated_create(self, text):
+                await released.wait()
+                return await create(self, text)
+
+            monkeypatch.setattr(Storage, "create_question", gated_create)
+            writes = [
+                asyncio.create_task(
+                    client.post("/question/", params={"text": f"Question {i}"})
+                )
+                for i in range(2)
+            ]
+            await asyncio.sleep(0.05)
+
+            shed = await client.post("/question/", params={"text": "Shed"})
+            read = await client.get(f"/question/{question_id}")
+            health = await client.get("/health")
+
+            released.set()
+            written = await asyncio.gather(*writes)
+
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "2"
+        assert read.status_code == 200
+        assert health.status_code == 200
+        assert [response.status_code for response in written] == [200, 200]
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_per_user(self, db_session, monkeypatch):
+        """Test a user over their rate gets 429 while others are served."""
+        monkeypatch.setattr(settings, "ADMISSION_RATE_LIMIT_PER_SECOND", 0.5)
+        monkeypatch.setattr(settings, "ADMISSION_RATE_LIMIT_BURST", 2)
+        monkeypatch.setattr(settings, "ADMISSION_RATE_LIMIT_KEY", "user_id")
+
+        async with _client(db_session) as client:
+            statuses = [
+                (await client.get("/question/", params={"user_id": "a"})).status_code
+                for _ in range(3)
+            ]
+            limited = await client.get("/question/", params={"user_id": "a"})
+            other = await client.get("/question/", params={"user_id": "b"})
+
+        assert statuses == [200, 200, 429]
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+        assert other.status_code == 200
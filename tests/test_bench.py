@@ -0,0 +1,192 @@
+import random
+from functools import partial
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from bench.add_answer import _check_then_insert, _measure, _report, _single_statement
+from bench.load import SCENARIOS, Context, _clean_up, _run, _summary
+from bench.serialize import _check_same_answers, _column_rows, _orm_models
+from config import settings
+from database.storage import Storage
+from models.database import Answer, Question
+from models.qa import AnswerCreate
+from tests.conftest import TEST_DATABASE_URL
+
+
+async def _context(async_client: AsyncClient) -> Context:
+    question_ids = []
+    for i in range(3):
+        response = await async_client.post(
+            "/question/",
+            params={"text": f"postgres cache latency question {i}"}
+        )
+        question_ids.append(response.json()["id"])
+    answer_ids = []
+    for question_id in question_ids:
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "python index query answer", "user_id": "user123"}
+        )
+        answer_ids.append(response.json()["id"])
+
+    return Context(
+        rng=random.Random(42),
+        max_question_id=max(question_ids),
+        max_answer_id=max(answer_ids),
+        hot_question_ids=question_ids[:1],
+    )
+
+
+@pytest.mark.unit
+class TestLoadSummary:
+    """Test load-test results are summarized."""
+
+    def test_summary(self):
+        """Test percentiles, throughput and statements per request."""
+        latencies = [i / 1000 for i in range(100, 0, -1)]
+
+        summary = _summary(latencies, [2, 3, 4], errors=1, elapsed=2.0)
+
+        assert summary["requests"] == 100
+        assert summary["errors"] == 1
+        assert summary["throughput_rps"] == 50.0
+        assert summary["latency_ms"] == {
+            "mean": 50.5,
+            "p50": 51.0,
+            "p95": 96.0,
+            "p99": 100.0,
+            "max": 100.0,
+        }
+        assert summary["statements_per_request"] == {"mean": 3.0, "max": 4}
+
+    def test_summary_without_responses(self):
+        """Test a scenario whose requests all failed still summarizes."""
+        summary = _summary([], [], errors=3, elapsed=0.0)
+
+        assert summary == {
+            "requests": 0, "errors": 3, "seconds": 0.0, "throughput_rps": 0
+        }
+
+
+@pytest.mark.api
+class TestLoadScenarios:
+    """Test the load-test scenarios against the app."""
+
+    @pytest.mark.asyncio
+    async def test_every_scenario_succeeds(self, async_client: AsyncClient):
+        """Test each scenario, run in order, succeeds and reports its statements."""
+        ctx = await _context(async_client)
+
+        for name, scenario in SCENARIOS.items():
+            result = await _run(async_client, ctx, scenario, requests=2, concurrency=1)
+
+            assert result["requests"] == 2, name
+            assert result["errors"] == 0, name
+            assert result["statements_per_request"]["mean"] >= 0, name
+
+        # Both bulk creates are left for the clean-up.
+        assert len(ctx.created_question_ids) == 2 + 200 - 2
+        assert len(ctx.created_answer_ids) == 2 + 200 - 2
+
+    @pytest.mark.asyncio
+    async def test_clean_up(self, session_factory):
+        """Test rows the run left are deleted and answer counts restored."""
+        async with session_factory() as session:
+            storage = Storage(session)
+            kept = await storage.create_question("Dataset question")
+            await storage.add_answer(kept.id, "Dataset answer", "user1")
+            created = await storage.create_question("Bench question")
+            await storage.add_answer(created.id, "Bench answer", "bench")
+            left = await storage.add_answer(kept.id, "Bench answer", "bench")
+            await session.commit()
+        ctx = Context(
+            rng=random.Random(42),
+            max_question_id=kept.id,
+            max_answer_id=left.id,
+            hot_question_ids=[],
+            created_question_ids=[created.id],
+            created_answer_ids=[left.id],
+        )
+
+        deleted = await _clean_up(TEST_DATABASE_URL, ctx)
+
+        async with session_factory() as session:
+            questions = (await session.execute(select(Question))).scalars().all()
+            answers = await Storage(session).get_question_answers(kept.id)
+        assert deleted == (1, 1)
+        assert [q.id for q in questions] == [kept.id]
+        assert questions[0].answer_count == 1
+        assert [a.text for a in answers.answers] == ["Dataset answer"]
+        assert answers.last_answer_at == answers.answers[0].created_at
+        assert ctx.created_question_ids == ctx.created_answer_ids == []
+
+
+@pytest.mark.api
+class TestAddAnswerBenchmark:
+    """Test the add_answer benchmark compares two working insert paths."""
+
+    @pytest.mark.asyncio
+    async def test_both_paths_insert(self, session_factory, capsys):
+        """Test each path adds an answer per iteration and skips missing questions."""
+        async with session_factory() as session:
+            question = await Storage(session).create_question("Benchmark question")
+            await session.commit()
+
+        for name, add in (
+            ("check-then-insert", _check_then_insert),
+            ("single-statement", _single_statement),
+        ):
+            timings = await _measure(session_factory, question.id, add, 3)
+            await _measure(session_factory, 999999, add, 1)
+            _report(name, timings)
+            assert len(timings) == 3
+
+        async with session_factory() as session:
+            answers = (await session.execute(select(Answer))).scalars().all()
+        assert len(answers) == 6
+        assert {a.question_id for a in answers} == {question.id}
+        report = capsys.readouterr().out.splitlines()
+        assert [line.split()[0] for line in report] == [
+            "check-then-insert", "single-statement"
+        ]
+        assert all("p95" in line for line in report)
+
+
+@pytest.mark.api
+class TestSerializeBenchmark:
+    """Test the serialization benchmark compares bodies of the same size."""
+
+    @pytest.mark.asyncio
+    async def test_paths_return_every_answer(self, session_factory):
+        """Test both paths return all answers, beyond the default page size."""
+        answers = settings.ANSWERS_PAGE_SIZE + 5
+        async with session_factory() as session:
+            storage = Storage(session)
+            question = await storage.create_question("Benchmark question")
+            await storage.add_answers(
+                question.id,
+                [AnswerCreate(user_id="user1", text=f"Answer {i}") for i in range(answers)],
+            )
+            await session.commit()
+
+        count = await _check_same_answers(
+            session_factory,
+            question.id,
+            {
+                "orm-models": _orm_models,
+                "column-rows": partial(_column_rows, answers_limit=answers),
+            },
+        )
+        assert count == answers
+
+        with pytest.raises(AssertionError):
+            await _check_same_answers(
+                session_factory,
+                question.id,
+                {
+                    "orm-models": _orm_models,
+                    "column-rows": partial(_column_rows, answers_limit=1),
+                },
+            )
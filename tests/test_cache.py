@@ -0,0 +1,316 @@
+import asyncio
+import random
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from redis.asyncio.client import Pipeline
+
+from cache.memory import MemoryCache
+from cache.redis import RedisCache
+from cache.response import ResponseCache
+from config import settings
+from main import _warm_up_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.unit
+class TestMemoryCache:
+    """Test the in-process cache backend."""
+
+    @pytest.mark.asyncio
+    async def test_get_set(self):
+        """Test a stored value is returned and counted as a hit."""
+        cache = MemoryCache(max_entries=10, max_bytes=1024)
+        assert await cache.get("a") is None
+        await cache.set("a", b"value", ttl=60)
+        assert await cache.get("a") == b"value"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self):
+        """Test the entry limit evicts the least recently used entry."""
+        cache = MemoryCache(max_entries=2, max_bytes=1024)
+        await cache.set("a", b"1", ttl=60)
+        await cache.set("b", b"2", ttl=60)
+        await cache.get("a")
+        await cache.set("c", b"3", ttl=60)
+        assert await cache.get("b") is None
+        assert await cache.get("a") == b"1"
+        assert cache.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicts_over_byte_limit(self):
+        """Test the byte limit evicts entries and skips oversized values."""
+        cache = MemoryCache(max_entries=10, max_bytes=10)
+        await cache.set("a", b"12345", ttl=60)
+        await cache.set("b", b"123456", ttl=60)
+        assert await cache.get("a") is None
+        assert cache.stats()["bytes"] == 6
+
+        await cache.set("c", b"x" * 11, ttl=60)
+        assert await cache.get("c") is None
+
+    @pytest.mark.asyncio
+    async def test_expires_after_ttl(self):
+        """Test entries are not served after their TTL."""
+        clock = FakeClock()
+        cache = MemoryCache(max_entries=10, max_bytes=1024, clock=clock)
+        await cache.set("a", b"value", ttl=5)
+        clock.now = 5
+        assert await cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_tag(self):
+        """Test invalidating a tag drops every entry stored with it."""
+        cache = MemoryCache(max_entries=10, max_bytes=1024)
+        await cache.set("q1:a", b"1", ttl=60, tags=["q1"])
+        await cache.set("q1:b", b"2", ttl=60, tags=["q1"])
+        await cache.set("q2:a", b"3", ttl=60, tags=["q2"])
+        await cache.invalidate("q1")
+        assert await cache.get("q1:a") is None
+        assert await cache.get("q1:b") is None
+        assert await cache.get("q2:a") == b"3"
+
+
+@pytest.mark.unit
+class TestRedisCache:
+    """Test the Redis cache backend against fakeredis."""
+
+    @pytest_asyncio.fixture
+    async def server(self):
+        return fakeredis.FakeServer()
+
+    def _worker(self, server) -> RedisCache:
+        return RedisCache(
+            fakeredis.aioredis.FakeRedis(server=server),
+            prefix="test",
+            local=MemoryCache(max_entries=10, max_bytes=1024),
+            local_ttl=60,
+        )
+
+    @pytest.mark.asyncio
+    async def test_shared_between_workers(self, server):
+        """Test a value stored by one worker is served to another."""
+        first, second = self._worker(server), self._worker(server)
+        await first.set("a", b"value", ttl=60, tags=["t"])
+        assert await second.get("a") == b"value"
+        assert second.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidation_is_broadcast(self, server):
+        """Test invalidating on one worker evicts other workers' local copies."""
+        first, second = self._worker(server), self._worker(server)
+        await first.start()
+        await second.start()
+        try:
+            await first.set("a", b"value", ttl=60, tags=["t"])
+            assert await second.get("a") == b"value"
+            assert second.local.get_nowait("a") == b"value"
+
+            await first.invalidate("t")
+            for _ in range(100):
+                if second.stats()["broadcasts_received"]:
+                    break
+                await asyncio.sleep(0.01)
+
+            assert second.local.get_nowait("a") is None
+            assert await second.get("a") is None
+        finally:
+            await first.close()
+            await second.close()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_races_set(self, server, monkeypatch):
+        """Test a key tagged while its tag is being invalidated is dropped too."""
+        first, second = self._worker(server), self._worker(server)
+        await first.set("a", b"value", ttl=60, tags=["t"])
+        smembers = Pipeline.smembers
+        raced = False
+
+        async def racing_smembers(pipe, name):
+            # Another worker tags a key between the read and the delete.
+            nonlocal raced
+            members = await smembers(pipe, name)
+            if not raced:
+                raced = True
+                await second.set("b", b"value", ttl=60, tags=["t"])
+            return members
+
+        monkeypatch.setattr(Pipeline, "smembers", racing_smembers)
+        await first.invalidate("t")
+
+        assert raced
+        assert await first.client.exists("test:v:a", "test:v:b", "test:t:t") == 0
+
+
+@pytest.mark.unit
+class TestResponseCache:
+    """Test the read-through response cache."""
+
+    @pytest.mark.asyncio
+    async def test_get_or_load(self):
+        """Test the loader runs once and its result is reused."""
+        cache = ResponseCache(MemoryCache(max_entries=10, max_bytes=1024), ttl=60)
+        calls = []
+
+        async def load():
+            calls.append(1)
+            return b"value"
+
+        assert await cache.get_or_load("a", load) == b"value"
+        assert await cache.get_or_load("a", load) == b"value"
+        assert len(calls) == 1
+        assert cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_early_refresh_near_expiry(self, monkeypatch):
+        """Test entries are refreshed before they expire, but not long before."""
+        monkeypatch.setattr(random, "random", lambda: 0.5)
+        clock = FakeClock()
+        cache = ResponseCache(
+            MemoryCache(max_entries=10, max_bytes=1024), ttl=60, clock=clock
+        )
+        calls = []
+
+        async def load():
+            calls.append(1)
+            clock.now += 1
+            return b"value"
+
+        await cache.get_or_load("a", load)
+        await cache.get_or_load("a", load)
+        assert len(calls) == 1
+
+        # Loading took 1s and expires at 61s; with random() = 0.5 the refresh
+        # window opens ln(2) seconds before expiry.
+        clock.now = 60.5
+        await cache.get_or_load("a", load)
+        assert len(calls) == 2
+        assert cache.stats()["early_refreshes"] == 1
+
+
+@pytest.mark.api
+class TestCachedEndpoints:
+    """Test caching of question and answer responses."""
+
+    @pytest.mark.asyncio
+    async def test_question_served_from_cache(self, async_client: AsyncClient):
+        """Test repeated reads hit the cache."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        first = await async_client.get(f"/question/{question_id}")
+        second = await async_client.get(f"/question/{question_id}")
+        assert first.json() == second.json()
+
+        stats = (await async_client.get("/cache/stats")).json()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_add_answer_invalidates(self, async_client: AsyncClient):
+        """Test adding and deleting answers invalidates the cached question."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        await async_client.get(f"/question/{question_id}")
+
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Test answer", "user_id": "user123"}
+        )
+        answer_id = response.json()["id"]
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert len(response.json()["answers"]) == 1
+
+        await async_client.delete(f"/answers/{answer_id}")
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.json()["answers"] == []
+
+    @pytest.mark.asyncio
+    async def test_delete_question_invalidates(self, async_client: AsyncClient):
+        """Test deleting a question invalidates the cached question."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        await async_client.get(f"/question/{question_id}")
+
+        await async_client.delete(f"/question/{question_id}")
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_delete_question_invalidates_answers(
+        self, async_client: AsyncClient
+    ):
+        """Test deleting a question invalidates its cached answers."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Test answer", "user_id": "user123"}
+        )
+        answer_id = response.json()["id"]
+
+        response = await async_client.get(f"/answers/{answer_id}")
+        assert response.status_code == 200
+        response = await async_client.get(f"/answers/{answer_id}")
+        assert response.json()["text"] == "Test answer"
+
+        await async_client.delete(f"/question/{question_id}")
+        response = await async_client.get(f"/answers/{answer_id}")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_warm_up(
+        self, async_client: AsyncClient, db_session, session_factory, monkeypatch
+    ):
+        """Test warm-up preloads the most answered questions."""
+        question_ids = []
+        for i in range(3):
+            response = await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+            question_ids.append(response.json()["id"])
+        for question_id, answers in zip(question_ids, [1, 3, 2]):
+            for i in range(answers):
+                await async_client.post(
+                    f"/question{question_id}/answers/",
+                    params={"text": f"Answer {i}", "user_id": "user123"}
+                )
+        await db_session.commit()
+
+        monkeypatch.setattr(settings, "CACHE_WARMUP_TOP_N", 2)
+        backend = MemoryCache(max_entries=10, max_bytes=1024 * 1024)
+        await _warm_up_cache(ResponseCache(backend, ttl=60))
+
+        assert backend.stats()["entries"] == 2
+        assert backend.get_nowait(
+            f"question:{question_ids[1]}:{settings.ANSWERS_PAGE_SIZE}:"
+        ) is not None
+        assert backend.get_nowait(
+            f"question:{question_ids[2]}:{settings.ANSWERS_PAGE_SIZE}:"
+        ) is not None
@@ -0,0 +1,249 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger
+from sqlalchemy import event, text
+
+from api.deadline import CLIENT_CLOSED_REQUEST, DEADLINE_HEADER, RequestDeadlines
+from database.deadline import remaining
+from database.storage import Storage
+
+
+class Handler:
+    """An ASGI app that waits until released, noting if it was cancelled."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.cancelled = False
+        self.released = asyncio.Event()
+        self.remaining = None
+
+    async def __call__(self, scope, receive, send):
+        self.remaining = remaining()
+        try:
+            await self.released.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"done"})
+
+
+class Client:
+    """The receive and send ends of one request."""
+
+    def __init__(self):
+        self.sent = []
+        self.gone = asyncio.Event()
+
+    async def receive(self):
+        if not hasattr(self, "_requested"):
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    @property
+    def status(self):
+        return next(
+            message["status"]
+            for message in self.sent
+            if message["type"] == "http.response.start"
+        )
+
+
+def _scope(app, path="/question/1", headers=()):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "app": app,
+    }
+
+
+@pytest.fixture
+def warnings():
+    """Collect messages logged at WARNING and above."""
+    messages = []
+    handler_id = logger.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    logger.remove(handler_id)
+
+
+@pytest.mark.unit
+class TestRequestDeadlines:
+    """Test the request deadline middleware."""
+
+    def test_timeout_from_route_and_header(self, app):
+        """Test route defaults apply and the header overrides them up to the cap."""
+        deadlines = RequestDeadlines(
+            Handler(),
+            default_timeout=5,
+            route_timeouts={"GET /export/questions.ndjson": 0},
+            max_timeout=10,
+        )
+
+        assert deadlines.timeout(_scope(app)) == 5
+        assert deadlines.timeout(_scope(app, "/export/questions.ndjson")) is None
+        assert deadlines.timeout(_scope(app, headers=[(DEADLINE_HEADER, "0.5")])) == 0.5
+        assert deadlines.timeout(_scope(app, headers=[(DEADLINE_HEADER, "60")])) == 10
+        assert deadlines.timeout(_scope(app, headers=[(DEADLINE_HEADER, "soon")])) == 5
+
+    @pytest.mark.asyncio
+    async def test_handler_sees_deadline(self, app):
+        """Test the handler runs with the request's deadline set."""
+        handler = Handler()
+        handler.released.set()
+        client = Client()
+        deadlines = RequestDeadlines(
+            handler, default_timeout=5, route_timeouts={}, max_timeout=10
+        )
+
+        await deadlines(_scope(app), client.receive, client.send)
+
+        assert client.status == 200
+        assert 4 < handler.remaining <= 5
+        assert remaining() is None
+
+    @pytest.mark.asyncio
+    async def test_deadline_cancels_handler(self, app, warnings):
+        """Test a handler still running at its deadline is cancelled with 504."""
+        handler = Handler()
+        client = Client()
+        deadlines = RequestDeadlines(
+            handler, default_timeout=0.05, route_timeouts={}, max_timeout=10
+        )
+
+        await deadlines(_scope(app), client.receive, client.send)
+
+        assert handler.cancelled
+        assert client.status == 504
+        assert any("Deadline of 0.05s exceeded" in message for message in warnings)
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_handler(self, app):
+        """Test the handler is cancelled when the client goes away."""
+        handler = Handler()
+        client = Client()
+        deadlines = RequestDeadlines(
+            handler, default_timeout=5, route_timeouts={}, max_timeout=10
+        )
+
+        request = asyncio.create_task(
+            deadlines(_scope(app), client.receive, client.send)
+        )
+        await asyncio.sleep(0.01)
+        client.gone.set()
+        await asyncio.wait_for(request, 1)
+
+        assert handler.cancelled
+        assert client.status == CLIENT_CLOSED_REQUEST
+
+    @pytest.mark.asyncio
+    async def test_error_before_deadline_raised(self, app):
+        """Test handler errors within the deadline are left to the app."""
+        handler = Handler(error=RuntimeError("boom"))
+        handler.released.set()
+        client = Client()
+        deadlines = RequestDeadlines(
+            handler, default_timeout=5, route_timeouts={}, max_timeout=10
+        )
+
+        with pytest.raises(RuntimeError):
+            await deadlines(_scope(app), client.receive, client.send)
+
+
+@pytest.mark.api
+class TestStatementTimeout:
+    """Test request deadlines reach Postgres."""
+
+    @pytest.mark.asyncio
+    async def test_slow_query_cancelled_with_504(
+        self, app, session_factory, test_engine, monkeypatch, warnings
+    ):
+        """Test a query overrunning the deadline is cancelled by Postgres."""
+        statements = []
+        errors = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        def record_error(context):
+            errors.append(context.original_exception)
+
+        get_questions_json = Storage.get_questions_json
+
+        async def slow_questions(self, **kwargs):
+            await self.session.execute(text("SELECT pg_sleep(5)"))
+
+        monkeypatch.setattr(Storage, "get_questions_json", slow_questions)
+        event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+        event.listen(test_engine.sync_engine, "handle_error", record_error)
+        try:
+            async with AsyncClient(app=app, base_url="http://test") as client:
+                start = time.perf_counter()
+                response = await client.get(
+                    "/question/", headers={DEADLINE_HEADER: "0.2"}
+                )
+                elapsed = time.perf_counter() - start
+
+                monkeypatch.setattr(Storage, "get_questions_json", get_questions_json)
+                after = await client.get("/question/")
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+            event.remove(test_engine.sync_engine, "handle_error", record_error)
+
+        assert response.status_code == 504
+        assert response.json() == {"detail": "Request deadline exceeded"}
+        assert elapsed < 2
+        assert any(s.startswith("SET LOCAL statement_timeout = ") for s in statements)
+        assert any("canceling statement due to statement timeout" in str(e) for e in errors)
+        assert any(m.startswith("Request timed out: GET /question/") for m in warnings)
+        # The pooled connection is usable again.
+        assert after.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_query(
+        self, app, session_factory, monkeypatch
+    ):
+        """Test a client hanging up cancels the query running for it."""
+        started = asyncio.Event()
+
+        async def slow_questions(self, **kwargs):
+            started.set()
+            await self.session.execute(text("SELECT pg_sleep(5)"))
+
+        monkeypatch.setattr(Storage, "get_questions_json", slow_questions)
+        client = Client()
+        scope = {
+            **_scope(app, "/question/"),
+            "http_version": "1.1",
+            "scheme": "http",
+            "server": ("test", 80),
+        }
+
+        request = asyncio.create_task(app(scope, client.receive, client.send))
+        await asyncio.wait_for(started.wait(), 5)
+        await asyncio.sleep(0.1)
+        client.gone.set()
+        await asyncio.wait_for(request, 2)
+
+        assert client.status == CLIENT_CLOSED_REQUEST
+        async with session_factory() as session:
+            sleeping = await session.scalar(
+                text(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE state = 'active' AND query = 'SELECT pg_sleep(5)'"
+                )
+            )
+        assert sleeping == 0
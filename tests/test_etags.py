@@ -0,0 +1,118 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.api
+class TestConditionalRequests:
+    """Test ETag / If-None-Match handling."""
+
+    @pytest.mark.asyncio
+    async def test_question_not_modified(self, async_client: AsyncClient):
+        """Test a question revalidates until an answer changes it."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert "must-revalidate" in response.headers["Cache-Control"]
+
+        response = await async_client.get(
+            f"/question/{question_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Test answer", "user_id": "user123"}
+        )
+        answer_id = response.json()["id"]
+
+        response = await async_client.get(
+            f"/question/{question_id}", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert len(response.json()["answers"]) == 1
+        new_etag = response.headers["ETag"]
+        assert new_etag != etag
+
+        await async_client.delete(f"/answers/{answer_id}")
+        response = await async_client.get(
+            f"/question/{question_id}", headers={"If-None-Match": new_etag}
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_question_pages_have_distinct_etags(self, async_client: AsyncClient):
+        """Test different answer pages of one question get different ETags."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        full = await async_client.get(f"/question/{question_id}")
+        page = await async_client.get(
+            f"/question/{question_id}", params={"answers_limit": 1}
+        )
+        assert full.headers["ETag"] != page.headers["ETag"]
+
+        response = await async_client.get(
+            f"/question/{question_id}",
+            params={"answers_limit": 1},
+            headers={"If-None-Match": full.headers["ETag"]},
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_answer_not_modified(self, async_client: AsyncClient):
+        """Test an answer revalidates with its ETag."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Test answer", "user_id": "user123"}
+        )
+        answer_id = response.json()["id"]
+
+        response = await async_client.get(f"/answers/{answer_id}")
+        etag = response.headers["ETag"]
+
+        response = await async_client.get(
+            f"/answers/{answer_id}", headers={"If-None-Match": f"W/{etag}"}
+        )
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_questions_list_not_modified(self, async_client: AsyncClient):
+        """Test the question list revalidates until a question is added."""
+        await async_client.post(
+            "/question/",
+            params={"text": "Question 0"}
+        )
+
+        response = await async_client.get("/question/")
+        etag = response.headers["ETag"]
+
+        response = await async_client.get(
+            "/question/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        await async_client.post(
+            "/question/",
+            params={"text": "Question 1"}
+        )
+        response = await async_client.get(
+            "/question/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert len(response.json()) == 2
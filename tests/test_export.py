@@ -0,0 +1,48 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.api
+class TestExport:
+    """Test export endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_export_questions_ndjson(
+        self, async_client: AsyncClient, db_session, session_factory
+    ):
+        """Test exporting questions with their answers as NDJSON."""
+        question_ids = []
+        for i in range(3):
+            response = await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+            question_ids.append(response.json()["id"])
+
+        for i in range(2):
+            await async_client.post(
+                f"/question{question_ids[0]}/answers/",
+                params={"text": f"Answer {i}", "user_id": "user123"}
+            )
+        await db_session.commit()
+
+        response = await async_client.get(
+            "/export/questions.ndjson", params={"batch_size": 1}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [q["id"] for q in lines] == question_ids
+        assert [a["text"] for a in lines[0]["answers"]] == ["Answer 0", "Answer 1"]
+        assert lines[1]["answers"] == []
+        assert lines[2]["answers"] == []
+
+    @pytest.mark.asyncio
+    async def test_export_empty(self, async_client: AsyncClient, session_factory):
+        """Test exporting an empty database."""
+        response = await async_client.get("/export/questions.ndjson")
+        assert response.status_code == 200
+        assert response.text == ""
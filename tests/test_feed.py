@@ -0,0 +1,430 @@
+import asyncio
+import json
+
+import asyncpg
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from config import settings
+from database.feed import AnswerFeed, FeedFull
+from database.storage import ANSWER_FEED_CHANNEL, Storage
+from main import create_app
+from models.qa import AnswerCreate
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture(autouse=True)
+def feed_enabled(monkeypatch):
+    """Publish answer changes, and serve the stream from apps created next."""
+    monkeypatch.setattr(settings, "ANSWER_FEED_ENABLED", True)
+
+
+@pytest_asyncio.fixture
+async def feed(session_factory):
+    """An answer feed reading through the test database."""
+    feeds = []
+
+    def create(**options) -> AnswerFeed:
+        options = {"max_subscribers": 10, "queue_size": 10, "heartbeat": 5, **options}
+        feed = AnswerFeed(TEST_DATABASE_URL, **options)
+        feeds.append(feed)
+        return feed
+
+    yield create
+
+    for feed in feeds:
+        await feed.close()
+
+
+@pytest_asyncio.fixture
+async def notifications(test_engine):
+    """Payloads published on the answer feed channel."""
+    received: "asyncio.Queue[dict]" = asyncio.Queue()
+    connection = await asyncpg.connect(TEST_DATABASE_URL.replace("+asyncpg", ""))
+    await connection.add_listener(
+        ANSWER_FEED_CHANNEL,
+        lambda conn, pid, channel, payload: received.put_nowait(json.loads(payload)),
+    )
+    yield received
+    await connection.close()
+
+
+async def _committed(session_factory, write):
+    async with session_factory() as session:
+        result = await write(Storage(session))
+        await session.commit()
+    return result
+
+
+async def _question(session_factory) -> int:
+    question = await _committed(
+        session_factory, lambda storage: storage.create_question("Question")
+    )
+    return question.id
+
+
+async def _answer(session_factory, question_id: int, text: str = "Answer"):
+    return await _committed(
+        session_factory,
+        lambda storage: storage.add_answer(question_id, text, "user1"),
+    )
+
+
+async def _next(queue: asyncio.Queue, timeout: float = 5):
+    return await asyncio.wait_for(queue.get(), timeout)
+
+
+async def _pull(stream, timeout: float = 5) -> bytes:
+    return await asyncio.wait_for(stream.__anext__(), timeout)
+
+
+@pytest.mark.api
+class TestAnswerNotifications:
+    """Test changes to answers are published with pg_notify."""
+
+    @pytest.mark.asyncio
+    async def test_single_writes_published(self, session_factory, notifications):
+        """Test adding and deleting an answer each publish their change."""
+        question_id = await _question(session_factory)
+
+        answer = await _answer(session_factory, question_id)
+        created = await _next(notifications)
+        await _committed(session_factory, lambda s: s.delete_answer(answer.id))
+        deleted = await _next(notifications)
+
+        assert created == {
+            "question_id": question_id, "version": 2, "created": [answer.id]
+        }
+        assert deleted == {
+            "question_id": question_id, "version": 3, "deleted": answer.id
+        }
+
+    @pytest.mark.asyncio
+    async def test_question_deletion_published(self, session_factory, notifications):
+        """Test deleting a question publishes that it is gone."""
+        question_id = await _question(session_factory)
+
+        await _committed(session_factory, lambda s: s.delete_question(question_id))
+
+        assert await _next(notifications) == {
+            "question_id": question_id, "version": 2, "question_deleted": True
+        }
+
+    @pytest.mark.asyncio
+    async def test_nothing_published_when_disabled(
+        self, session_factory, notifications, monkeypatch
+    ):
+        """Test writes publish nothing with the feed turned off."""
+        monkeypatch.setattr(settings, "ANSWER_FEED_ENABLED", False)
+        question_id = await _question(session_factory)
+        answer = await _answer(session_factory, question_id)
+        await _committed(session_factory, lambda s: s.delete_answer(answer.id))
+        await _committed(session_factory, lambda s: s.delete_question(question_id))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await _next(notifications, timeout=0.2)
+
+    @pytest.mark.asyncio
+    async def test_many_answers_published_once(
+        self, session_factory, notifications
+    ):
+        """Test bulk and grouped inserts publish one change per question."""
+        first = await _question(session_factory)
+        second = await _question(session_factory)
+        answer = AnswerCreate(user_id="user1", text="Answer")
+
+        bulk = await _committed(
+            session_factory, lambda s: s.add_answers(first, [answer, answer])
+        )
+        grouped = await _committed(
+            session_factory,
+            lambda s: s.add_answers_grouped(
+                [(first, answer), (second, answer), (first, answer)]
+            ),
+        )
+        changes = [await _next(notifications) for _ in range(3)]
+
+        assert changes[0] == {
+            "question_id": first, "version": 2, "created": [a.id for a in bulk]
+        }
+        assert sorted(changes[1:], key=lambda c: c["question_id"]) == [
+            {
+                "question_id": first,
+                "version": 3,
+                "created": [grouped[0].id, grouped[2].id],
+            },
+            {"question_id": second, "version": 2, "created": [grouped[1].id]},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_nothing_published_on_rollback(
+        self, session_factory, notifications
+    ):
+        """Test a rolled back write publishes nothing."""
+        question_id = await _question(session_factory)
+
+        async with session_factory() as session:
+            await Storage(session).add_answer(question_id, "Answer", "user1")
+            await session.rollback()
+        await _answer(session_factory, question_id, "Kept")
+
+        change = await _next(notifications)
+        assert change["version"] == 2
+        assert notifications.empty()
+
+
+@pytest.mark.api
+class TestAnswerFeed:
+    """Test the answer feed fans notifications out to subscribers."""
+
+    @pytest.mark.asyncio
+    async def test_subscribers_get_their_questions_answers(
+        self, session_factory, feed
+    ):
+        """Test subscribers get created answers of their question only."""
+        feed = feed()
+        question_id = await _question(session_factory)
+        other_id = await _question(session_factory)
+
+        async with feed.subscribe(question_id) as first, feed.subscribe(
+            question_id
+        ) as second, feed.subscribe(other_id) as other:
+            answer = await _answer(session_factory, question_id, "Live answer")
+            events = [await _next(first), await _next(second)]
+
+            assert other.empty()
+            assert events[0] == events[1]
+            version, data = events[0]
+            assert version == 2
+            assert data.startswith(b"id: 2\nevent: created\ndata: [")
+            payload = json.loads(data.split(b"data: ", 1)[1])
+            assert [a["id"] for a in payload] == [answer.id]
+            assert payload[0]["text"] == "Live answer"
+            assert feed.subscribers == 3
+
+        assert feed.subscribers == 0
+
+    @pytest.mark.asyncio
+    async def test_question_deletion_ends_streams(self, session_factory, feed):
+        """Test deleting a question sends a last event and ends its streams."""
+        feed = feed(heartbeat=5)
+        question_id = await _question(session_factory)
+
+        stream = feed.stream(question_id)
+        await _pull(stream)
+        await _committed(session_factory, lambda s: s.delete_question(question_id))
+        event = await _pull(stream)
+
+        assert event == (
+            b'id: 2\nevent: question_deleted\ndata: {"id":%d}\n\n' % question_id
+        )
+        with pytest.raises(StopAsyncIteration):
+            await _pull(stream)
+        assert feed.subscribers == 0
+
+    @pytest.mark.asyncio
+    async def test_subscriber_cap(self, session_factory, feed):
+        """Test subscribing beyond max_subscribers fails."""
+        feed = feed(max_subscribers=1)
+        question_id = await _question(session_factory)
+
+        async with feed.subscribe(question_id):
+            assert feed.full
+            with pytest.raises(FeedFull):
+                async with feed.subscribe(question_id):
+                    pass
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_ended(self, session_factory, feed):
+        """Test a subscriber that falls behind has its stream ended."""
+        feed = feed(queue_size=1)
+        question_id = await _question(session_factory)
+        first = await _answer(session_factory, question_id)
+        second = await _answer(session_factory, question_id)
+
+        async with feed.subscribe(question_id) as events:
+            for answer in (first, second):
+                await _committed(session_factory, lambda s: s.delete_answer(answer.id))
+            # Notifications arrive ahead of this query's result.
+            await feed._connection.execute("SELECT 1")
+            await asyncio.sleep(0.05)
+
+            assert events.get_nowait() is None
+            assert events.empty()
+
+    @pytest.mark.asyncio
+    async def test_connection_loss_ends_streams(self, session_factory, feed):
+        """Test subscribers are ended when the LISTEN connection is lost."""
+        feed = feed()
+        question_id = await _question(session_factory)
+
+        async with feed.subscribe(question_id) as events:
+            pid = feed._connection.get_server_pid()
+            async with session_factory() as session:
+                await session.execute(
+                    text("SELECT pg_terminate_backend(:pid)"), {"pid": pid}
+                )
+            assert await _next(events) is None
+
+        # The next subscriber listens on a new connection.
+        async with feed.subscribe(question_id) as events:
+            await _answer(session_factory, question_id)
+            assert (await _next(events))[0] == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_resumes_with_snapshot(self, session_factory, feed):
+        """Test a stream resumed from an older version starts with a snapshot."""
+        feed = feed(heartbeat=0.05)
+        question_id = await _question(session_factory)
+        await _answer(session_factory, question_id, "Missed")
+
+        stream = feed.stream(question_id, last_version=1)
+        snapshot = await _pull(stream)
+        heartbeat = await _pull(stream)
+        answer = await _answer(session_factory, question_id, "Live")
+        created = await _pull(stream)
+        await stream.aclose()
+
+        assert snapshot.startswith(b"id: 2\nevent: snapshot\ndata: {")
+        document = json.loads(snapshot.split(b"data: ", 1)[1])
+        assert [a["text"] for a in document["answers"]] == ["Missed"]
+        assert heartbeat == b": heartbeat\n\n"
+        assert created.startswith(b"id: 3\nevent: created\n")
+        assert str(answer.id).encode() in created
+        assert feed.subscribers == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_current_version_not_replayed(
+        self, session_factory, feed
+    ):
+        """Test a stream resumed at the current version gets no snapshot."""
+        feed = feed(heartbeat=5)
+        question_id = await _question(session_factory)
+        await _answer(session_factory, question_id)
+
+        stream = feed.stream(question_id, last_version=2)
+        first = await _pull(stream)
+        await stream.aclose()
+
+        assert first == b": heartbeat\n\n"
+
+
+class Client:
+    """The receive and send ends of one streaming request."""
+
+    def __init__(self):
+        self.messages: "asyncio.Queue[dict]" = asyncio.Queue()
+        self.gone = asyncio.Event()
+        self._requested = False
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.put_nowait(message)
+
+
+def _stream_scope(app, question_id: int, headers=()):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "scheme": "http",
+        "server": ("test", 80),
+        "method": "GET",
+        "path": f"/question/{question_id}/stream",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "app": app,
+    }
+
+
+@pytest.mark.api
+class TestAnswerStream:
+    """Test GET /question/{id}/stream."""
+
+    @pytest.mark.asyncio
+    async def test_stream_pushes_new_answers(self, app, session_factory):
+        """Test new answers are pushed as server-sent events."""
+        question_id = await _question(session_factory)
+        client = Client()
+
+        request = asyncio.create_task(
+            app(_stream_scope(app, question_id), client.receive, client.send)
+        )
+        start = await _next(client.messages)
+        heartbeat = await _next(client.messages)
+        answer = await _answer(session_factory, question_id, "Pushed")
+        event = await _next(client.messages)
+        client.gone.set()
+        await asyncio.wait_for(request, 5)
+
+        headers = dict(start["headers"])
+        assert start["status"] == 200
+        assert headers[b"content-type"].startswith(b"text/event-stream")
+        assert headers[b"cache-control"] == b"no-cache"
+        assert heartbeat["body"] == b": heartbeat\n\n"
+        assert event["body"].startswith(b"id: 2\nevent: created\n")
+        assert b'"text":"Pushed"' in event["body"]
+        assert str(answer.id).encode() in event["body"]
+        assert app.state.answer_feed.subscribers == 0
+        await app.state.answer_feed.close()
+
+    @pytest.mark.asyncio
+    async def test_stream_resumes_from_last_event_id(self, app, session_factory):
+        """Test Last-Event-ID resumes the stream with a snapshot."""
+        question_id = await _question(session_factory)
+        await _answer(session_factory, question_id, "Missed")
+        client = Client()
+
+        request = asyncio.create_task(
+            app(
+                _stream_scope(app, question_id, [("last-event-id", "1")]),
+                client.receive,
+                client.send,
+            )
+        )
+        await _next(client.messages)
+        snapshot = await _next(client.messages)
+        client.gone.set()
+        await asyncio.wait_for(request, 5)
+
+        assert snapshot["body"].startswith(b"id: 2\nevent: snapshot\n")
+        assert b'"text":"Missed"' in snapshot["body"]
+        await app.state.answer_feed.close()
+
+    @pytest.mark.asyncio
+    async def test_missing_question(self, async_client):
+        """Test streaming a missing question returns 404."""
+        response = await async_client.get("/question/999999/stream")
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, session_factory, monkeypatch):
+        """Test the stream is not served with the feed turned off."""
+        monkeypatch.setattr(settings, "ANSWER_FEED_ENABLED", False)
+
+        async with AsyncClient(app=create_app(), base_url="http://test") as client:
+            response = await client.get("/question/1/stream")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Answer feed is disabled"}
+
+    @pytest.mark.asyncio
+    async def test_subscribers_capped(self, app, async_client):
+        """Test 503 with Retry-After once the worker is full."""
+        response = await async_client.post("/question/", params={"text": "Q"})
+        question_id = response.json()["id"]
+        app.state.answer_feed.max_subscribers = 0
+
+        response = await async_client.get(f"/question/{question_id}/stream")
+
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
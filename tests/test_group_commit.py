@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from database.group_commit import AnswerBatcher
+
+
+@pytest_asyncio.fixture
+async def questions(async_client: AsyncClient, db_session, session_factory):
+    """Two committed questions, so the batcher's own session sees them."""
+    ids = []
+    for i in range(2):
+        response = await async_client.post(
+            "/question/",
+            params={"text": f"Question {i}"}
+        )
+        ids.append(response.json()["id"])
+    await db_session.commit()
+    return ids
+
+
+@pytest_asyncio.fixture
+async def batcher(app):
+    """Install a batcher on the app and close it afterwards."""
+    installed = []
+
+    def install(max_batch: int, max_linger: float) -> AnswerBatcher:
+        batcher = AnswerBatcher(max_batch=max_batch, max_linger=max_linger)
+        app.state.answer_batcher = batcher
+        installed.append(batcher)
+        return batcher
+
+    yield install
+
+    for batcher in installed:
+        await batcher.close()
+
+
+def _post_answer(async_client: AsyncClient, question_id: int, i: int):
+    return async_client.post(
+        f"/question{question_id}/answers/",
+        params={"text": f"Answer {i}", "user_id": f"user{i}"}
+    )
+
+
+@pytest.mark.api
+class TestGroupCommit:
+    """Test group commit of single answer inserts."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_answers_written_together(
+        self, async_client: AsyncClient, questions, batcher, test_engine
+    ):
+        """Test concurrent answers are written by one INSERT with their own ids."""
+        batcher = batcher(max_batch=20, max_linger=5)
+        inserts = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("WITH") and "INSERT INTO answer" in statement:
+                inserts.append(statement)
+
+        targets = [questions[i % 2] for i in range(18)] + [999999, 999998]
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+        responses = await asyncio.gather(
+            *(_post_answer(async_client, question_id, i)
+              for i, question_id in enumerate(targets))
+        )
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+        assert len(inserts) == 1
+        assert batcher.batches == 1
+        assert [r.status_code for r in responses] == [200] * 18 + [404] * 2
+        created = [r.json() for r in responses[:18]]
+        assert len({answer["id"] for answer in created}) == 18
+        for i, answer in enumerate(created):
+            assert answer["question_id"] == targets[i]
+            assert answer["text"] == f"Answer {i}"
+            assert answer["user_id"] == f"user{i}"
+            assert answer["created_at"]
+
+        for question_id in questions:
+            response = await async_client.get(f"/question/{question_id}")
+            data = response.json()
+            assert data["answer_count"] == 9
+            assert len(data["answers"]) == 9
+
+    @pytest.mark.asyncio
+    async def test_batches_capped(
+        self, async_client: AsyncClient, questions, batcher
+    ):
+        """Test batches hold at most max_batch answers."""
+        batcher = batcher(max_batch=5, max_linger=0.05)
+
+        responses = await asyncio.gather(
+            *(_post_answer(async_client, questions[0], i) for i in range(12))
+        )
+
+        assert {r.status_code for r in responses} == {200}
+        assert batcher.batches == 3
+        assert batcher.answers == 12
+
+    @pytest.mark.asyncio
+    async def test_close_writes_queued_answers(self, questions, batcher):
+        """Test answers still lingering are written on close."""
+        batcher = batcher(max_batch=100, max_linger=60)
+
+        pending = asyncio.create_task(batcher.add(questions[0], "user1", "Answer"))
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+
+        await batcher.close()
+
+        answer = await pending
+        assert answer.question_id == questions[0]
+        assert answer.text == "Answer"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_left_out(self, questions, batcher):
+        """Test an answer whose request went away before the write is skipped."""
+        batcher = batcher(max_batch=100, max_linger=0.1)
+
+        cancelled = asyncio.create_task(batcher.add(questions[0], "user1", "Gone"))
+        kept = asyncio.create_task(batcher.add(questions[0], "user2", "Kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        assert (await kept).text == "Kept"
+        assert batcher.answers == 1
+
+    @pytest.mark.asyncio
+    async def test_failing_answer_fails_alone(
+        self, async_client: AsyncClient, questions, batcher
+    ):
+        """Test an answer the database rejects does not fail its batch."""
+        batcher = batcher(max_batch=100, max_linger=0.1)
+        texts = [f"Answer {i}" for i in range(6)]
+        texts[3] = "Poisoned \x00 answer"
+
+        results = await asyncio.gather(
+            *(batcher.add(questions[0], "user1", text) for text in texts),
+            return_exceptions=True
+        )
+
+        assert isinstance(results[3], Exception)
+        written = [r for i, r in enumerate(results) if i != 3]
+        assert [answer.text for answer in written] == texts[:3] + texts[4:]
+        assert batcher.answers == 5
+
+        response = await async_client.get(f"/question/{questions[0]}")
+        data = response.json()
+        assert data["answer_count"] == 5
+        assert len(data["answers"]) == 5
@@ -0,0 +1,243 @@
+import re
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import settings
+from monitoring.metrics import InstrumentedPool, instrument_engine
+from monitoring.queries import track_request
+from tests.conftest import TEST_DATABASE_URL
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.api
+class TestMetricsEndpoint:
+    """Test request, cache and database metrics."""
+
+    @pytest.mark.asyncio
+    async def test_request_metrics_by_route(self, async_client: AsyncClient):
+        """Test requests are recorded under their route template."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        labels = {"method": "GET", "route": "/question/{id}"}
+        count = _sample("qa_http_request_duration_seconds_count", **labels)
+        ok = _sample("qa_http_responses_total", status="200", **labels)
+        missing = _sample("qa_http_responses_total", status="404", **labels)
+
+        await async_client.get(f"/question/{question_id}")
+        await async_client.get("/question/999999")
+
+        assert _sample("qa_http_request_duration_seconds_count", **labels) == count + 2
+        assert _sample("qa_http_responses_total", status="200", **labels) == ok + 1
+        assert _sample("qa_http_responses_total", status="404", **labels) == missing + 1
+        assert _sample("qa_http_requests_in_progress", **labels) == 0
+
+    @pytest.mark.asyncio
+    async def test_unmatched_route(self, async_client: AsyncClient):
+        """Test unknown paths share one label instead of one per path."""
+        labels = {"method": "GET", "route": "<unmatched>", "status": "404"}
+        before = _sample("qa_http_responses_total", **labels)
+
+        await async_client.get("/no/such/path/1")
+        await async_client.get("/no/such/path/2")
+
+        assert _sample("qa_http_responses_total", **labels) == before + 2
+
+    @pytest.mark.asyncio
+    async def test_cache_metrics(self, async_client: AsyncClient):
+        """Test response cache lookups are counted by result."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        hits = _sample("qa_cache_requests_total", result="hit")
+        misses = _sample("qa_cache_requests_total", result="miss")
+
+        await async_client.get(f"/question/{question_id}")
+        await async_client.get(f"/question/{question_id}")
+
+        assert _sample("qa_cache_requests_total", result="miss") == misses + 1
+        assert _sample("qa_cache_requests_total", result="hit") == hits + 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, async_client: AsyncClient):
+        """Test /metrics serves the Prometheus text format."""
+        await async_client.get("/health")
+
+        response = await async_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'qa_http_responses_total{method="GET",route="/health",status="200"}'
+            in response.text
+        )
+
+
+@pytest.fixture
+def warnings():
+    """Collect messages logged at WARNING and above."""
+    messages = []
+    handler_id = logger.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    logger.remove(handler_id)
+
+
+@pytest.mark.api
+class TestQueryInstrumentation:
+    """Test per-request SQL statement accounting."""
+
+    @pytest.mark.asyncio
+    async def test_server_timing(self, async_client: AsyncClient):
+        """Test responses report the statements their request issued."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        labels = {"method": "GET", "route": "/question/{id}"}
+        before = _sample("qa_http_request_db_queries_sum", **labels)
+
+        response = await async_client.get(f"/question/{question_id}")
+
+        timing = response.headers["Server-Timing"]
+        assert re.match(r'db;dur=[\d.]+;desc="2 queries", total;dur=[\d.]+$', timing)
+        assert _sample("qa_http_request_db_queries_sum", **labels) == before + 2
+
+        # Served from the response cache.
+        response = await async_client.get(f"/question/{question_id}")
+        assert 'desc="0 queries"' in response.headers["Server-Timing"]
+
+    @pytest.mark.asyncio
+    async def test_server_timing_disabled(self, async_client: AsyncClient, monkeypatch):
+        """Test the Server-Timing header can be turned off."""
+        monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", False)
+
+        response = await async_client.get("/question/")
+
+        assert "Server-Timing" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_statement_budget(
+        self, async_client: AsyncClient, monkeypatch, warnings
+    ):
+        """Test requests issuing more statements than the budget are logged."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        monkeypatch.setattr(settings, "DB_STATEMENT_BUDGET", 1)
+
+        await async_client.get("/question/")
+        assert not any("Statement budget" in message for message in warnings)
+
+        await async_client.get(f"/question/{question_id}")
+        assert any(
+            "Statement budget exceeded: GET /question/{id} issued 2" in message
+            for message in warnings
+        )
+
+    @pytest.mark.asyncio
+    async def test_slow_query_explain(
+        self, async_client: AsyncClient, monkeypatch, warnings
+    ):
+        """Test slow statements are logged with a sampled query plan."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 1e-9)
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN_RATE", 1.0)
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.status_code == 200
+        assert response.json()["id"] == question_id
+
+        assert any(
+            message.startswith("Slow query:") and "/question/{id}" in message
+            for message in warnings
+        )
+        assert any(
+            "Execution Time" in message and "Buffers" in message
+            for message in warnings
+        )
+
+        # The session is still usable after explaining.
+        response = await async_client.delete(f"/question/{question_id}")
+        assert response.status_code == 204
+
+    @pytest.mark.asyncio
+    async def test_slow_query_explain_skips_side_effects(
+        self, monkeypatch, warnings
+    ):
+        """Test only side-effect free SELECTs run for a request are explained."""
+        engine = create_async_engine(
+            TEST_DATABASE_URL, poolclass=InstrumentedPool, pool_size=1
+        )
+        instrument_engine(engine, "explain-test")
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 1e-9)
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_EXPLAIN_RATE", 1.0)
+
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                track_request("GET /test")
+                await conn.execute(text("SELECT pg_advisory_lock(42)"))
+                await conn.execute(text("SELECT pg_advisory_unlock(42)"))
+                locks = await conn.scalar(
+                    text(
+                        "SELECT count(*) FROM pg_locks "
+                        "WHERE locktype = 'advisory' AND pid = pg_backend_pid()"
+                    )
+                )
+        finally:
+            await engine.dispose()
+
+        assert locks == 0
+        # Only the pg_locks query, run for the request, was explained.
+        assert len([m for m in warnings if m.startswith("Slow query plan")]) == 1
+
+
+@pytest.mark.unit
+class TestEngineMetrics:
+    """Test statement and pool metrics recorded for an engine."""
+
+    @pytest.mark.asyncio
+    async def test_instrument_engine(self):
+        """Test statements, pool checkouts and waits are recorded."""
+        engine = create_async_engine(
+            TEST_DATABASE_URL, poolclass=InstrumentedPool, pool_size=1
+        )
+        instrument_engine(engine, "metrics-test")
+        queries = _sample("qa_db_queries_total", database="metrics-test")
+        waits = _sample("qa_db_pool_wait_seconds_count", database="metrics-test")
+
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                assert _sample("qa_db_pool_checked_out", database="metrics-test") == 1
+                with pytest.raises(Exception):
+                    await conn.execute(text("SELECT missing_column"))
+        finally:
+            await engine.dispose()
+
+        assert _sample("qa_db_queries_total", database="metrics-test") >= queries + 2
+        assert _sample("qa_db_query_errors_total", database="metrics-test") == 1
+        assert (
+            _sample("qa_db_pool_wait_seconds_count", database="metrics-test")
+            == waits + 1
+        )
+        assert _sample("qa_db_pool_checked_out", database="metrics-test") == 0
@@ -0,0 +1,90 @@
+import os
+import pstats
+from contextlib import asynccontextmanager
+
+import pytest
+from httpx import AsyncClient
+
+from config import settings
+from database.connection import get_db, get_read_db
+from main import create_app
+from monitoring.profiling import PROFILE_HEADER, RequestProfiler
+
+
+@asynccontextmanager
+async def _client(db_session):
+    app = create_app()
+
+    async def override_get_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.api
+class TestRequestProfiling:
+    """Test the opt-in request profiling hook."""
+
+    def test_disabled_by_default(self, app):
+        """Test no profiling middleware is installed unless configured."""
+        assert not any(
+            isinstance(middleware.kwargs.get("dispatch"), RequestProfiler)
+            for middleware in app.user_middleware
+        )
+
+    @pytest.mark.asyncio
+    async def test_header_returns_report_inline(self, db_session, monkeypatch):
+        """Test a request with the profiling token gets the profile back."""
+        monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+
+        async with _client(db_session) as client:
+            response = await client.get("/question/", headers={PROFILE_HEADER: "secret"})
+            assert response.status_code == 200
+            assert response.headers["X-Profiled-Status"] == "200"
+            assert "function calls" in response.text
+
+            response = await client.get("/question/", headers={PROFILE_HEADER: "guess"})
+            assert response.status_code == 200
+            assert response.json() == []
+
+    @pytest.mark.asyncio
+    async def test_sampled_profile_written(self, db_session, monkeypatch, tmp_path):
+        """Test sampled requests are saved as pstats files."""
+        monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(settings, "PROFILING_OUTPUT_DIR", str(tmp_path))
+
+        async with _client(db_session) as client:
+            response = await client.post(
+                "/question/",
+                params={"text": "Test question"}
+            )
+            question_id = response.json()["id"]
+
+            response = await client.get(f"/question/{question_id}")
+
+        assert response.status_code == 200
+        assert response.json()["id"] == question_id
+        assert "ETag" in response.headers
+        filename = response.headers["X-Profile-File"]
+        assert filename.endswith("-GET-question_id.pstats")
+        assert pstats.Stats(os.path.join(tmp_path, filename)).total_calls > 0
+
+    @pytest.mark.asyncio
+    async def test_streamed_response_not_profiled(
+        self, db_session, session_factory, monkeypatch
+    ):
+        """Test streamed responses are passed through instead of drained."""
+        monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+
+        async with _client(db_session) as client:
+            response = await client.get(
+                "/export/questions.ndjson", headers={PROFILE_HEADER: "secret"}
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert "X-Profiled-Status" not in response.headers
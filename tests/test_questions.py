@@ -1,5 +1,12 @@
+import json
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import event, text
+
+from config import settings
+from database.pagination import encode_cursor
+from database.storage import Storage
 
 
 @pytest.mark.api
@@ -135,4 +142,675 @@ class TestQuestions:
         
         # Verify it's gone
         response = await async_client.get(f"/question/{question_id}")
-        assert response.status_code == 404
\ No newline at end of file
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_delete_question_cascades_to_answers(self, async_client: AsyncClient):
+        """Test that deleting a question removes its answers."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Question to delete"}
+        )
+        question_id = response.json()["id"]
+
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Answer", "user_id": "user123"}
+        )
+        answer_id = response.json()["id"]
+
+        response = await async_client.delete(f"/question/{question_id}")
+        assert response.status_code == 204
+
+        response = await async_client.get(f"/answers/{answer_id}")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_get_questions_cursor_pagination(self, async_client: AsyncClient):
+        """Test paging through questions with the keyset cursor."""
+        for i in range(5):
+            await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = await async_client.get("/question/", params=params)
+            assert response.status_code == 200
+            seen.extend(q["text"] for q in response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"limit": 2, "cursor": next_cursor}
+
+        assert seen == [f"Question {i}" for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_get_questions_default_page(
+        self, async_client: AsyncClient, monkeypatch
+    ):
+        """Test questions are paged even without limit, up to a maximum."""
+        monkeypatch.setattr(settings, "QUESTIONS_PAGE_SIZE", 2)
+        for i in range(3):
+            await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+
+        response = await async_client.get("/question/")
+        assert [q["text"] for q in response.json()] == ["Question 0", "Question 1"]
+        next_cursor = response.headers["X-Next-Cursor"]
+
+        response = await async_client.get("/question/", params={"cursor": next_cursor})
+        assert [q["text"] for q in response.json()] == ["Question 2"]
+        assert "X-Next-Cursor" not in response.headers
+
+        response = await async_client.get(
+            "/question/",
+            params={"limit": settings.QUESTIONS_MAX_PAGE_SIZE + 1}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_get_questions_invalid_cursor(self, async_client: AsyncClient):
+        """Test that a malformed cursor is rejected."""
+        response = await async_client.get("/question/", params={"cursor": "garbage"})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_get_questions_with_total_estimate(
+        self, async_client: AsyncClient, db_session
+    ):
+        """Test the approximate total count header."""
+        for i in range(3):
+            await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+        await db_session.commit()
+        await db_session.execute(text("ANALYZE question"))
+
+        response = await async_client.get("/question/", params={"with_total": True})
+        assert response.status_code == 200
+        assert response.headers["X-Total-Count-Estimate"] == "3"
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_pagination(self, async_client: AsyncClient):
+        """Test paging through a question's answers."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        for i in range(5):
+            await async_client.post(
+                f"/question{question_id}/answers/",
+                params={"text": f"Answer {i}", "user_id": "user123"}
+            )
+
+        seen = []
+        params = {"answers_limit": 2}
+        while True:
+            response = await async_client.get(
+                f"/question/{question_id}", params=params
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["answers"]) <= 2
+            seen.extend(a["text"] for a in data["answers"])
+            if not data["answers_next_cursor"]:
+                break
+            params = {
+                "answers_limit": 2,
+                "answers_cursor": data["answers_next_cursor"],
+            }
+
+        assert seen == [f"Answer {i}" for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_default_page(
+        self, async_client: AsyncClient, monkeypatch
+    ):
+        """Test answers are paged even without answers_limit, up to a maximum."""
+        monkeypatch.setattr(settings, "ANSWERS_PAGE_SIZE", 2)
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        for i in range(3):
+            await async_client.post(
+                f"/question{question_id}/answers/",
+                params={"text": f"Answer {i}", "user_id": "user123"}
+            )
+
+        response = await async_client.get(f"/question/{question_id}")
+        data = response.json()
+        assert [a["text"] for a in data["answers"]] == ["Answer 0", "Answer 1"]
+        assert data["answers_next_cursor"]
+
+        response = await async_client.get(
+            f"/question/{question_id}",
+            params={"answers_cursor": data["answers_next_cursor"]}
+        )
+        data = response.json()
+        assert [a["text"] for a in data["answers"]] == ["Answer 2"]
+        assert data["answers_next_cursor"] is None
+
+        response = await async_client.get(
+            f"/question/{question_id}",
+            params={"answers_limit": settings.ANSWERS_MAX_PAGE_SIZE + 1}
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_cursor_of_wrong_type(
+        self, async_client: AsyncClient
+    ):
+        """Test an answers cursor with a count position is rejected."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        response = await async_client.get(
+            f"/question/{question_id}",
+            params={"answers_cursor": encode_cursor(3, 1)}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_create_questions_bulk(self, async_client: AsyncClient):
+        """Test bulk creating questions from a JSON array."""
+        response = await async_client.post(
+            "/question/bulk",
+            json=[{"text": "Question 0"}, {"body": "no text"}, {"text": "Question 2"}]
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [q["text"] for q in data["created"]] == ["Question 0", "Question 2"]
+        assert [e["index"] for e in data["errors"]] == [1]
+
+        response = await async_client.get("/question/")
+        assert len(response.json()) == 2
+
+    @pytest.mark.asyncio
+    async def test_create_questions_bulk_not_array(self, async_client: AsyncClient):
+        """Test that a bulk body must be an array."""
+        response = await async_client.post("/question/bulk", json={"text": "Q"})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_add_answers_bulk_ndjson(self, async_client: AsyncClient):
+        """Test bulk adding answers from an NDJSON body."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        body = "\n".join([
+            '{"user_id": "user1", "text": "Answer 0"}',
+            "not json",
+            '{"user_id": "user2", "text": "Answer 2"}',
+        ])
+        response = await async_client.post(
+            f"/question/{question_id}/answers/bulk",
+            content=body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [a["text"] for a in data["created"]] == ["Answer 0", "Answer 2"]
+        assert all(a["question_id"] == question_id for a in data["created"])
+        assert [e["index"] for e in data["errors"]] == [1]
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert len(response.json()["answers"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_add_answers_bulk_empty(
+        self, async_client: AsyncClient, db_session
+    ):
+        """Test an empty bulk add leaves the question's version unchanged."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        storage = Storage(db_session)
+        version = await storage.get_question_version(question_id)
+
+        response = await async_client.post(
+            f"/question/{question_id}/answers/bulk", json=[]
+        )
+        assert response.status_code == 200
+        assert response.json()["created"] == []
+        assert await storage.get_question_version(question_id) == version
+
+        response = await async_client.post("/question/999999/answers/bulk", json=[])
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_add_answers_bulk_to_nonexistent_question(
+        self, async_client: AsyncClient
+    ):
+        """Test bulk adding answers to a non-existent question."""
+        response = await async_client.post(
+            "/question/999999/answers/bulk",
+            json=[{"user_id": "user1", "text": "Answer"}]
+        )
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_bulk_too_many_items(self, async_client: AsyncClient, monkeypatch):
+        """Test bulk bodies with more than BULK_MAX_ITEMS items are refused."""
+        monkeypatch.setattr(settings, "BULK_MAX_ITEMS", 2)
+
+        response = await async_client.post(
+            "/question/bulk",
+            json=[{"text": f"Question {i}"} for i in range(3)]
+        )
+        assert response.status_code == 413
+
+        response = await async_client.post(
+            "/question/bulk",
+            content="\n".join(['{"text": "Question"}'] * 3),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 413
+
+        response = await async_client.get("/question/")
+        assert response.json() == []
+
+        response = await async_client.post(
+            "/question/bulk",
+            json=[{"text": f"Question {i}"} for i in range(2)]
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_bulk_body_too_large(self, async_client: AsyncClient, monkeypatch):
+        """Test bulk bodies larger than BULK_MAX_BODY_BYTES are refused."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        monkeypatch.setattr(settings, "BULK_MAX_BODY_BYTES", 64)
+        answers = [{"user_id": "user1", "text": "Answer"} for _ in range(3)]
+
+        response = await async_client.post(
+            f"/question/{question_id}/answers/bulk", json=answers
+        )
+        assert response.status_code == 413
+
+        async def chunks():
+            # No Content-Length: the limit is enforced while reading.
+            for answer in answers:
+                yield (json.dumps(answer) + "\n").encode()
+
+        response = await async_client.post(
+            f"/question/{question_id}/answers/bulk",
+            content=chunks(),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 413
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.json()["answers"] == []
+
+    @pytest.mark.asyncio
+    async def test_get_questions_fields_and_preview(self, async_client: AsyncClient):
+        """Test sparse fieldsets and text previews on the question list."""
+        await async_client.post(
+            "/question/",
+            params={"text": "A rather long question text"}
+        )
+
+        response = await async_client.get(
+            "/question/", params={"fields": "text,id", "preview_chars": 6}
+        )
+        assert response.status_code == 200
+        assert response.json() == [{"id": response.json()[0]["id"], "text": "A rath"}]
+
+        response = await async_client.get("/question/", params={"fields": "id,votes"})
+        assert response.status_code == 400
+        assert "votes" in response.json()["detail"]
+
+    @pytest.mark.asyncio
+    async def test_get_question_fields_and_preview(self, async_client: AsyncClient):
+        """Test sparse fieldsets and text previews on a single question."""
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+        await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Test answer", "user_id": "user123"}
+        )
+
+        full = await async_client.get(f"/question/{question_id}")
+
+        response = await async_client.get(
+            f"/question/{question_id}", params={"fields": "id"}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"id": question_id}
+        assert response.headers["ETag"] != full.headers["ETag"]
+
+        response = await async_client.get(
+            f"/question/{question_id}",
+            params={
+                "fields": "id,answers",
+                "answer_fields": "id,text",
+                "preview_chars": 4,
+            }
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert list(data) == ["id", "answers", "answers_next_cursor"]
+        assert data["answers"] == [
+            {"id": full.json()["answers"][0]["id"], "text": "Test"}
+        ]
+
+        response = await async_client.get(
+            f"/question/{question_id}", params={"answer_fields": "question"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_batch(
+        self, async_client: AsyncClient, test_engine
+    ):
+        """Test fetching several questions with their answers at once."""
+        question_ids = []
+        for i in range(2):
+            response = await async_client.post(
+                "/question/",
+                params={"text": f"Question {i}"}
+            )
+            question_ids.append(response.json()["id"])
+        for i in range(3):
+            await async_client.post(
+                f"/question{question_ids[0]}/answers/",
+                params={"text": f"Answer {i}", "user_id": "user123"}
+            )
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(test_engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            response = await async_client.get(
+                "/question/batch",
+                params={
+                    "ids": f"{question_ids[1]},999999,{question_ids[0]}",
+                    "answers_limit": 2,
+                }
+            )
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", listener)
+
+        assert response.status_code == 200
+        assert len(statements) == 1
+        data = response.json()
+        assert [item["id"] for item in data["items"]] == question_ids[::-1]
+        assert data["missing"] == [999999]
+        assert data["items"][0]["answers"] == []
+        assert data["items"][0]["answers_next_cursor"] is None
+
+        first = data["items"][1]
+        assert [a["text"] for a in first["answers"]] == ["Answer 0", "Answer 1"]
+        response = await async_client.get(
+            f"/question/{question_ids[0]}",
+            params={"answers_cursor": first["answers_next_cursor"]}
+        )
+        assert [a["text"] for a in response.json()["answers"]] == ["Answer 2"]
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_batch_default_page(
+        self, async_client: AsyncClient, monkeypatch
+    ):
+        """Test batch items are paged even without answers_limit, up to a maximum."""
+        monkeypatch.setattr(settings, "BATCH_ANSWERS_PAGE_SIZE", 1)
+        response = await async_client.post(
+            "/question/",
+            params={"text": "Question"}
+        )
+        question_id = response.json()["id"]
+        for i in range(2):
+            await async_client.post(
+                f"/question{question_id}/answers/",
+                params={"text": f"Answer {i}", "user_id": "user123"}
+            )
+
+        response = await async_client.get(
+            "/question/batch", params={"ids": str(question_id)}
+        )
+        item = response.json()["items"][0]
+        assert [a["text"] for a in item["answers"]] == ["Answer 0"]
+        assert item["answers_next_cursor"]
+
+        response = await async_client.get(
+            "/question/batch",
+            params={
+                "ids": str(question_id),
+                "answers_limit": settings.BATCH_ANSWERS_MAX_PAGE_SIZE + 1,
+            }
+        )
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_get_question_answers_batch_invalid_ids(
+        self, async_client: AsyncClient, monkeypatch
+    ):
+        """Test malformed and oversized id lists are rejected."""
+        monkeypatch.setattr(settings, "BATCH_MAX_IDS", 2)
+
+        response = await async_client.get("/question/batch", params={"ids": "1,x"})
+        assert response.status_code == 400
+
+        response = await async_client.get("/question/batch", params={"ids": "1,2,3"})
+        assert response.status_code == 400
+
+
+@pytest.mark.unit
+class TestSerialization:
+    """Test the column-projection JSON reads match the model path."""
+
+    @pytest.mark.asyncio
+    async def test_question_answers_json_matches_model(self, storage):
+        """Test get_question_answers_json encodes like the Pydantic models."""
+        question = await storage.create_question("Test question \"quoted\" é")
+        for i in range(3):
+            await storage.add_answer(question.id, text=f"Answer {i}", user_id="user123")
+
+        for limit in (None, 2):
+            model = await storage.get_question_answers(question.id, answers_limit=limit)
+            _, body = await storage.get_question_answers_json(
+                question.id, answers_limit=limit
+            )
+            assert body == model.model_dump_json().encode()
+
+    @pytest.mark.asyncio
+    async def test_questions_json_matches_model(self, storage):
+        """Test get_questions_json encodes like the Pydantic models."""
+        for i in range(3):
+            await storage.create_question(f"Question {i}")
+
+        page = await storage.get_questions(limit=2)
+        body, next_cursor = await storage.get_questions_json(limit=2)
+
+        assert next_cursor == page.next_cursor
+        assert body == b"[" + b",".join(
+            q.model_dump_json().encode() for q in page.items
+        ) + b"]"
+
+    @pytest.mark.asyncio
+    async def test_answer_json_matches_model(self, storage):
+        """Test get_answer_by_id_json encodes like the Pydantic model."""
+        question = await storage.create_question("Test question")
+        answer = await storage.add_answer(question.id, text="Answer", user_id="user123")
+
+        version, body = await storage.get_answer_by_id_json(answer.id)
+
+        assert version == f"a{answer.id}"
+        assert body == answer.model_dump_json().encode()
+
+
+@pytest.mark.api
+class TestAnswerCounters:
+    """Test answer_count and last_answer_at, and sorting by them."""
+
+    async def _question(self, async_client: AsyncClient, text: str) -> int:
+        response = await async_client.post("/question/", params={"text": text})
+        return response.json()["id"]
+
+    async def _answers(self, async_client: AsyncClient, question_id: int, count: int):
+        response = await async_client.post(
+            f"/question/{question_id}/answers/bulk",
+            json=[{"user_id": "user1", "text": f"Answer {i}"} for i in range(count)],
+        )
+        return response.json()["created"]
+
+    @pytest.mark.asyncio
+    async def test_counters_maintained(self, async_client: AsyncClient):
+        """Test adding and deleting answers keeps the counters current."""
+        question_id = await self._question(async_client, "Test question")
+
+        response = await async_client.get(f"/question/{question_id}")
+        assert response.json()["answer_count"] == 0
+        assert response.json()["last_answer_at"] is None
+
+        created = await self._answers(async_client, question_id, 2)
+        response = await async_client.post(
+            f"/question{question_id}/answers/",
+            params={"text": "Single answer", "user_id": "user2"}
+        )
+        single = response.json()
+
+        data = (await async_client.get(f"/question/{question_id}")).json()
+        assert data["answer_count"] == 3
+        assert data["last_answer_at"] == single["created_at"]
+
+        await async_client.delete(f"/answers/{single['id']}")
+        await async_client.delete(f"/answers/{created[0]['id']}")
+        data = (await async_client.get(f"/question/{question_id}")).json()
+        assert data["answer_count"] == 1
+        assert data["last_answer_at"] == created[1]["created_at"]
+
+        await async_client.delete(f"/answers/{created[1]['id']}")
+        data = (await async_client.get(f"/question/{question_id}")).json()
+        assert data["answer_count"] == 0
+        assert data["last_answer_at"] is None
+
+    @pytest.mark.asyncio
+    async def test_counters_in_list(self, async_client: AsyncClient):
+        """Test the counters are returned and selectable in the list."""
+        question_id = await self._question(async_client, "Test question")
+        await self._answers(async_client, question_id, 2)
+
+        response = await async_client.get("/question/")
+        assert response.json()[0]["answer_count"] == 2
+        assert response.json()[0]["last_answer_at"] is not None
+
+        response = await async_client.get(
+            "/question/", params={"fields": "id,answer_count"}
+        )
+        assert response.json() == [{"id": question_id, "answer_count": 2}]
+
+    @pytest.mark.asyncio
+    async def test_sort_by_answers(self, async_client: AsyncClient):
+        """Test paging through questions by answer count, most first."""
+        ids = {}
+        for count in (1, 3, 0, 3, 2):
+            question_id = await self._question(async_client, f"{count} answers")
+            await self._answers(async_client, question_id, count)
+            ids[question_id] = count
+
+        seen = []
+        params = {"sort": "answers", "limit": 2}
+        while True:
+            response = await async_client.get("/question/", params=params)
+            assert response.status_code == 200
+            seen.extend(q["id"] for q in response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"sort": "answers", "limit": 2, "cursor": next_cursor}
+
+        assert seen == sorted(ids, key=lambda id: (ids[id], id), reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_sort_by_activity(self, async_client: AsyncClient, db_session):
+        """Test paging through questions by latest activity, most recent first."""
+        # Every request shares one transaction here, and now() is fixed per
+        # transaction; commit to move it on.
+        old = await self._question(async_client, "Old question")
+        quiet = await self._question(async_client, "Quiet question")
+        await db_session.commit()
+        new = await self._question(async_client, "New question")
+        await db_session.commit()
+        await self._answers(async_client, old, 1)
+        await db_session.commit()
+
+        seen = []
+        params = {"sort": "activity", "limit": 1}
+        while True:
+            response = await async_client.get("/question/", params=params)
+            seen.extend(q["id"] for q in response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"sort": "activity", "limit": 1, "cursor": next_cursor}
+
+        assert seen == [old, new, quiet]
+
+    @pytest.mark.asyncio
+    async def test_sort_cursor_mismatch(self, async_client: AsyncClient):
+        """Test that a cursor from another sort is rejected."""
+        for i in range(2):
+            await self._question(async_client, f"Question {i}")
+
+        response = await async_client.get("/question/", params={"limit": 1})
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = await async_client.get(
+            "/question/", params={"sort": "answers", "cursor": cursor}
+        )
+        assert response.status_code == 400
+
+        # Both are positions in time, but not in the same order.
+        response = await async_client.get(
+            "/question/", params={"sort": "activity", "cursor": cursor}
+        )
+        assert response.status_code == 400
+        response = await async_client.get(
+            "/question/", params={"sort": "activity", "limit": 1}
+        )
+        response = await async_client.get(
+            "/question/", params={"cursor": response.headers["X-Next-Cursor"]}
+        )
+        assert response.status_code == 400
+
+        response = await async_client.get("/question/", params={"sort": "views"})
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_most_answered_question_ids(self, async_client: AsyncClient, storage):
+        """Test the most answered questions come from the answer counts."""
+        ids = {}
+        for count in (1, 3, 0, 2):
+            question_id = await self._question(async_client, f"{count} answers")
+            await self._answers(async_client, question_id, count)
+            ids[count] = question_id
+
+        assert await storage.get_most_answered_question_ids(2) == [ids[3], ids[2]]
+        assert await storage.get_most_answered_question_ids(10) == [
+            ids[3], ids[2], ids[1]
+        ]
@@ -0,0 +1,126 @@
+import pytest
+from httpx import AsyncClient
+
+
+async def _question(async_client: AsyncClient, text: str) -> int:
+    response = await async_client.post("/question/", params={"text": text})
+    return response.json()["id"]
+
+
+async def _answer(async_client: AsyncClient, question_id: int, text: str) -> int:
+    response = await async_client.post(
+        f"/question/{question_id}/answers/bulk",
+        json=[{"user_id": "user1", "text": text}],
+    )
+    return response.json()["created"][0]["id"]
+
+
+@pytest.mark.api
+class TestSearch:
+    """Test search endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_search_questions_ranked(self, async_client: AsyncClient):
+        """Test that matching questions come back best ranked first."""
+        once = await _question(async_client, "How do I tune the postgres planner?")
+        twice = await _question(
+            async_client, "Postgres indexes: when does postgres use them?"
+        )
+        await _question(async_client, "What is Python?")
+
+        response = await async_client.get("/search", params={"q": "postgres"})
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["id"] for item in data] == [twice, once]
+        assert all(item["type"] == "question" for item in data)
+        assert data[0]["question_id"] == twice
+        assert data[0]["rank"] > data[1]["rank"]
+        assert "<b>postgres</b>" in data[0]["snippet"].lower()
+
+    @pytest.mark.asyncio
+    async def test_search_stems_words(self, async_client: AsyncClient):
+        """Test that search matches other forms of a word."""
+        question_id = await _question(async_client, "Indexing large tables")
+
+        response = await async_client.get("/search", params={"q": "indexes"})
+        assert [item["id"] for item in response.json()] == [question_id]
+
+    @pytest.mark.asyncio
+    async def test_search_include_answers(self, async_client: AsyncClient):
+        """Test that answers are only searched when asked for."""
+        question_id = await _question(async_client, "Why is my query slow?")
+        answer_id = await _answer(async_client, question_id, "Add a vacuum job.")
+
+        response = await async_client.get("/search", params={"q": "vacuum"})
+        assert response.json() == []
+
+        response = await async_client.get(
+            "/search", params={"q": "vacuum", "include_answers": True}
+        )
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["type"] == "answer"
+        assert data[0]["id"] == answer_id
+        assert data[0]["question_id"] == question_id
+
+    @pytest.mark.asyncio
+    async def test_search_web_syntax(self, async_client: AsyncClient):
+        """Test that phrases and exclusions are supported."""
+        wanted = await _question(async_client, "connection pool timeout")
+        await _question(async_client, "pool connection timeout")
+        await _question(async_client, "connection pool exhausted")
+
+        response = await async_client.get(
+            "/search", params={"q": '"connection pool" -exhausted'}
+        )
+        assert [item["id"] for item in response.json()] == [wanted]
+
+    @pytest.mark.asyncio
+    async def test_search_pagination(self, async_client: AsyncClient):
+        """Test that pages cover all matches once, in rank order."""
+        for i in range(5):
+            question_id = await _question(async_client, f"cache question {i}")
+            await _answer(async_client, question_id, f"cache answer {i}")
+
+        seen = []
+        ranks = []
+        cursor = None
+        while True:
+            params = {"q": "cache", "include_answers": True, "limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = await async_client.get("/search", params=params)
+            assert response.status_code == 200
+            data = response.json()
+            seen += [(item["type"], item["id"]) for item in data]
+            ranks += [item["rank"] for item in data]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        assert len(seen) == 10
+        assert len(set(seen)) == 10
+        assert ranks == sorted(ranks, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_search_invalid_cursor(self, async_client: AsyncClient):
+        """Test that a malformed cursor is rejected."""
+        response = await async_client.get(
+            "/search", params={"q": "postgres", "cursor": "not-a-cursor"}
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_search_requires_query(self, async_client: AsyncClient):
+        """Test that an empty query is rejected."""
+        response = await async_client.get("/search", params={"q": ""})
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_search_stop_words_only(self, async_client: AsyncClient):
+        """Test that a query of stop words only matches nothing."""
+        await _question(async_client, "What is the answer?")
+
+        response = await async_client.get("/search", params={"q": "the"})
+        assert response.status_code == 200
+        assert response.json() == []
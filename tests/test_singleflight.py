@@ -0,0 +1,293 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+from cache.singleflight import SingleFlight
+from database.deadline import is_statement_timeout
+from database.storage import Storage
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class QueryCanceled(Exception):
+    """What the driver raises when statement_timeout runs out."""
+
+    sqlstate = "57014"
+
+
+def _statement_timeout() -> DBAPIError:
+    return DBAPIError("SELECT 1", {}, QueryCanceled("canceling statement"))
+
+
+class Gate:
+    """A function that counts its calls and returns once released."""
+
+    def __init__(self, result="value"):
+        self.result = result
+        self.calls = 0
+        self.released = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.released.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Test coalescing of concurrent identical calls."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_result(self):
+        """Test concurrent calls for one key run the function once."""
+        flights = SingleFlight()
+        fn = Gate()
+        coalesced = _sample("qa_single_flight_requests_total", result="coalesced")
+
+        tasks = [asyncio.create_task(flights.do("a", fn)) for _ in range(10)]
+        await asyncio.sleep(0)
+        fn.released.set()
+
+        assert await asyncio.gather(*tasks) == ["value"] * 10
+        assert fn.calls == 1
+        assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 9}
+        assert (
+            _sample("qa_single_flight_requests_total", result="coalesced")
+            == coalesced + 9
+        )
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        """Test calls for different keys are not coalesced."""
+        flights = SingleFlight()
+        fn = Gate()
+
+        tasks = [asyncio.create_task(flights.do(key, fn)) for key in "ab"]
+        await asyncio.sleep(0)
+        fn.released.set()
+
+        await asyncio.gather(*tasks)
+        assert fn.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_nothing_kept_after_completion(self):
+        """Test a call after the previous one completed runs again."""
+        flights = SingleFlight()
+        fn = Gate()
+        fn.released.set()
+
+        await flights.do("a", fn)
+        await flights.do("a", fn)
+        assert fn.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_exception_shared(self):
+        """Test waiters get the exception of the call they joined."""
+        flights = SingleFlight()
+        fn = Gate(result=RuntimeError("boom"))
+
+        tasks = [asyncio.create_task(flights.do("a", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        fn.released.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert fn.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_hands_over(self):
+        """Test a waiter runs the call itself when the leader is cancelled."""
+        flights = SingleFlight()
+        fn = Gate()
+
+        leader = asyncio.create_task(flights.do("a", fn))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("a", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        fn.released.set()
+
+        assert await waiter == "value"
+        assert fn.calls == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    @pytest.mark.asyncio
+    async def test_leader_timeout_hands_over(self):
+        """Test waiters rerun a call that failed on the leader's own deadline."""
+        flights = SingleFlight(leader_error=is_statement_timeout)
+        timed_out = Gate(result=_statement_timeout())
+        fn = Gate()
+
+        leader = asyncio.create_task(flights.do("a", timed_out))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flights.do("a", fn)) for _ in range(5)]
+        await asyncio.sleep(0)
+        timed_out.released.set()
+
+        with pytest.raises(DBAPIError):
+            await leader
+        await asyncio.sleep(0)
+        fn.released.set()
+        assert await asyncio.gather(*waiters) == ["value"] * 5
+        assert fn.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_call_running(self):
+        """Test cancelling a waiter does not cancel the call."""
+        flights = SingleFlight()
+        fn = Gate()
+
+        leader = asyncio.create_task(flights.do("a", fn))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("a", fn))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        fn.released.set()
+
+        assert await leader == "value"
+        assert fn.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_detaches_call(self):
+        """Test calls arriving after invalidation do not join earlier calls."""
+        flights = SingleFlight()
+        before = Gate(result="before")
+        after = Gate(result="after")
+
+        first = asyncio.create_task(flights.do("a", before, tags=("t",)))
+        await asyncio.sleep(0)
+        await flights.invalidate("t")
+        second = asyncio.create_task(flights.do("a", after, tags=("t",)))
+        await asyncio.sleep(0)
+        before.released.set()
+        after.released.set()
+
+        assert await first == "before"
+        assert await second == "after"
+        assert flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.api
+class TestCoalescedReads:
+    """Test concurrent question reads share one query."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reads_run_one_query(
+        self, app, async_client: AsyncClient, test_engine, monkeypatch
+    ):
+        """Test 1000 concurrent reads of a question execute its read once."""
+        response = await async_client.post(
+            "/question/", params={"text": "Viral question"}
+        )
+        question_id = response.json()["id"]
+        await async_client.post(
+            f"/question/{question_id}/answers/bulk",
+            json=[{"user_id": "user1", "text": "Answer"}],
+        )
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+        await async_client.get(f"/question/{question_id}", params={"answers_limit": 1})
+        single_read = len(statements)
+        statements.clear()
+
+        flights = app.state.flights
+        read = Storage._get_question_answers
+        loads = 0
+
+        async def gated_read(self, *args, **kwargs):
+            # Holds the read until every other request has joined it.
+            nonlocal loads
+            loads += 1
+            for _ in range(3000):
+                if flights.stats()["coalesced"] >= 999:
+                    break
+                await asyncio.sleep(0.01)
+            return await read(self, *args, **kwargs)
+
+        monkeypatch.setattr(Storage, "_get_question_answers", gated_read)
+        responses = await asyncio.gather(
+            *(async_client.get(f"/question/{question_id}") for _ in range(1000))
+        )
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+        assert {response.status_code for response in responses} == {200}
+        assert len({response.content for response in responses}) == 1
+        assert loads == 1
+        assert len(statements) == single_read
+
+    @pytest.mark.asyncio
+    async def test_read_after_write_not_coalesced(
+        self, app, async_client: AsyncClient
+    ):
+        """Test a read after an answer is added sees the answer."""
+        response = await async_client.post(
+            "/question/", params={"text": "Test question"}
+        )
+        question_id = response.json()["id"]
+
+        await async_client.get(f"/question/{question_id}")
+        await async_client.post(
+            f"/question/{question_id}/answers/bulk",
+            json=[{"user_id": "user1", "text": "Answer"}],
+        )
+        response = await async_client.get(f"/question/{question_id}")
+
+        assert len(response.json()["answers"]) == 1
+
+    @pytest.mark.asyncio
+    async def test_short_deadline_does_not_fail_waiters(
+        self, app, async_client: AsyncClient, monkeypatch
+    ):
+        """Test a read cancelled by one client's deadline is rerun for the rest."""
+        response = await async_client.post(
+            "/question/", params={"text": "Viral question"}
+        )
+        question_id = response.json()["id"]
+
+        flights = app.state.flights
+        read = Storage._get_question_answers
+        loads = 0
+
+        async def leader_times_out(self, *args, **kwargs):
+            # The first read waits for the others to join, then is cancelled
+            # as its X-Request-Timeout would have it.
+            nonlocal loads
+            loads += 1
+            if loads == 1:
+                for _ in range(300):
+                    if flights.stats()["coalesced"] >= 5:
+                        break
+                    await asyncio.sleep(0.01)
+                raise _statement_timeout()
+            return await read(self, *args, **kwargs)
+
+        monkeypatch.setattr(Storage, "_get_question_answers", leader_times_out)
+        leader = asyncio.create_task(
+            async_client.get(
+                f"/question/{question_id}", headers={"X-Request-Timeout": "0.1"}
+            )
+        )
+        await asyncio.sleep(0.01)
+        responses = await asyncio.gather(
+            *(async_client.get(f"/question/{question_id}") for _ in range(5))
+        )
+
+        assert (await leader).status_code in (500, 504)
+        assert [response.status_code for response in responses] == [200] * 5
+        assert loads == 2
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.schema import MIGRATION_LOCK_ID, ensure_schema_current, head_revisions
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """Engine with room for concurrent startups and no alembic_version table."""
+    engine = create_async_engine(TEST_DATABASE_URL, pool_size=5)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+    yield engine
+
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    await engine.dispose()
+
+
+@pytest.fixture
+def alembic_cfg():
+    return Config("alembic.ini")
+
+
+async def _stamp(engine, revision: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS alembic_version "
+                "(version_num VARCHAR(32) PRIMARY KEY)"
+            )
+        )
+        await conn.execute(text("DELETE FROM alembic_version"))
+        await conn.execute(
+            text("INSERT INTO alembic_version VALUES (:revision)"),
+            {"revision": revision},
+        )
+
+
+async def _lock_held(engine) -> bool:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' "
+                "AND objid = :id AND granted"
+            ),
+            {"id": MIGRATION_LOCK_ID},
+        )
+        return result.scalar() > 0
+
+
+class FakeUpgrade:
+    """Stands in for alembic's upgrade, stamping head from its thread."""
+
+    def __init__(self, engine, alembic_cfg):
+        self.engine = engine
+        self.head = next(iter(head_revisions(alembic_cfg)))
+        self.loop = asyncio.get_running_loop()
+        self.calls = 0
+        self.lock_held = []
+
+    def __call__(self, alembic_cfg) -> None:
+        self.calls += 1
+        self.lock_held.append(self._run(_lock_held(self.engine)))
+        self._run(asyncio.sleep(0.1))
+        self._run(_stamp(self.engine, self.head))
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+@pytest.mark.unit
+class TestEnsureSchemaCurrent:
+    """Test the startup migration check."""
+
+    @pytest.mark.asyncio
+    async def test_upgrades_missing_schema_under_lock(self, engine, alembic_cfg):
+        """Test that a database without alembic_version is upgraded under the advisory lock."""
+        upgrade = FakeUpgrade(engine, alembic_cfg)
+
+        assert await ensure_schema_current(engine, alembic_cfg, upgrade) is True
+
+        assert upgrade.calls == 1
+        assert upgrade.lock_held == [True]
+        assert not await _lock_held(engine)
+
+    @pytest.mark.asyncio
+    async def test_skips_current_schema(self, engine, alembic_cfg):
+        """Test that no upgrade runs when alembic_version is at head."""
+        upgrade = FakeUpgrade(engine, alembic_cfg)
+        await _stamp(engine, upgrade.head)
+
+        assert await ensure_schema_current(engine, alembic_cfg, upgrade) is False
+
+        assert upgrade.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_upgrades_outdated_schema(self, engine, alembic_cfg):
+        """Test that a schema behind head is upgraded."""
+        upgrade = FakeUpgrade(engine, alembic_cfg)
+        await _stamp(engine, "outdated")
+
+        assert await ensure_schema_current(engine, alembic_cfg, upgrade) is True
+
+        assert upgrade.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_startups_upgrade_once(self, engine, alembic_cfg):
+        """Test that of several workers starting together only one upgrades."""
+        upgrade = FakeUpgrade(engine, alembic_cfg)
+
+        results = await asyncio.gather(
+            *(ensure_schema_current(engine, alembic_cfg, upgrade) for _ in range(3))
+        )
+
+        assert sorted(results) == [False, False, True]
+        assert upgrade.calls == 1